@@ -0,0 +1,158 @@
+"""
+공유 임베딩 계층
+모든 RAG 시스템이 같은 임베딩 객체를 쓰도록 하고, 텍스트 해시 → 벡터를 SQLite에 저장하여
+같은 문서/질문은 다시 API를 호출하지 않습니다. 캐시에 없는 텍스트는 큰 배치로 묶어
+제한된 개수만큼 동시에 요청합니다.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from langchain_core.embeddings import Embeddings
+
+# 임베딩 캐시 파일 (벡터스토어 캐시 폴더 안에 함께 둠)
+EMBEDDING_CACHE_PATH = os.path.join("vectorstore_cache", "embeddings.sqlite3")
+
+# 한 번의 API 요청에 넣을 텍스트 수 / 동시에 보낼 요청 수
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_MAX_CONCURRENCY = 4
+
+
+class CachedEmbeddings(Embeddings):
+    """SQLite 캐시를 앞에 둔 임베딩 래퍼 (LangChain Embeddings 인터페이스)"""
+
+    def __init__(self, underlying: Embeddings, model_name: str,
+                 db_path: str = EMBEDDING_CACHE_PATH,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
+        """
+        Args:
+            underlying: 실제 임베딩을 계산하는 객체 (OpenAIEmbeddings 등)
+            model_name: 캐시 키에 포함할 모델 이름 (모델이 다르면 벡터도 다름)
+            db_path: SQLite 캐시 파일 경로
+            batch_size: 한 요청에 묶을 텍스트 수
+            max_concurrency: 동시에 보낼 최대 요청 수
+        """
+        self.underlying = underlying
+        self.model_name = model_name
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        # 여러 워커 프로세스가 동시에 읽고 쓸 수 있도록 WAL 모드 사용
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode('utf-8')).hexdigest()
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            # SQLite 변수 개수 제한을 피하기 위해 나눠서 조회
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array('f', blob).tolist()
+        return found
+
+    def _store(self, items: Dict[str, List[float]]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, array('f', vector).tobytes()) for key, vector in items.items()]
+            )
+            self._conn.commit()
+
+    def _embed_missing(self, texts: List[str]) -> List[List[float]]:
+        """캐시에 없는 텍스트를 배치로 나눠 동시에 임베딩"""
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) == 1:
+            return self.underlying.embed_documents(batches[0])
+
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as executor:
+            results = list(executor.map(self.underlying.embed_documents, batches))
+        return [vector for batch in results for vector in batch]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """문서 임베딩 (캐시에 없는 텍스트만 API 호출)"""
+        keys = [self._key(text) for text in texts]
+        cached = self._lookup(list(set(keys)))
+
+        # 같은 텍스트가 여러 번 나와도 한 번만 요청
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            vectors = self._embed_missing(list(missing.values()))
+            # 캐시에서 읽은 값과 똑같도록 float32로 맞춤
+            new_items = {key: array('f', vector).tolist() for key, vector in zip(missing.keys(), vectors)}
+            self._store(new_items)
+            cached.update(new_items)
+
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        """질문 임베딩 (같은 질문이 반복되면 네트워크를 타지 않음)"""
+        key = self._key(text)
+        cached = self._lookup([key])
+        if key in cached:
+            self.hits += 1
+            return cached[key]
+
+        self.misses += 1
+        vector = array('f', self.underlying.embed_query(text)).tolist()
+        self._store({key: vector})
+        return vector
+
+
+# 프로세스 전체에서 공유하는 임베딩 객체 (provider, model, 추가 인자)별 1개
+_shared_embeddings: Dict[tuple, CachedEmbeddings] = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_embeddings(model: str, provider: str = "openai", **kwargs) -> CachedEmbeddings:
+    """
+    공유 캐시 임베딩 객체 반환
+
+    Args:
+        model: 임베딩 모델 이름
+        provider: "openai" 또는 "huggingface"
+        **kwargs: 실제 임베딩 클래스에 넘길 추가 인자 (api_key 등, 인자가 다르면 다른 객체를 만듦)
+    """
+    cache_key = (provider, model, tuple(sorted((name, repr(value)) for name, value in kwargs.items())))
+    with _shared_lock:
+        if cache_key not in _shared_embeddings:
+            if provider == "openai":
+                from langchain_openai import OpenAIEmbeddings
+                underlying = OpenAIEmbeddings(model=model, **kwargs)
+            elif provider == "huggingface":
+                from langchain_community.embeddings import HuggingFaceEmbeddings
+                underlying = HuggingFaceEmbeddings(model_name=model, **kwargs)
+            else:
+                raise ValueError(f"지원하지 않는 임베딩 제공자: {provider}")
+            _shared_embeddings[cache_key] = CachedEmbeddings(underlying, model_name=model)
+        return _shared_embeddings[cache_key]
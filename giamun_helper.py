@@ -5,7 +5,9 @@
 import openai
 import json
 from typing import Dict, List, Any
+from openai.types.chat import ChatCompletion
 from utils import PRIMARY_MODEL
+from llm_cassette import get_cassette
 
 # 1. 사용자가 제공한 JSON 데이터를 Python 딕셔너리로 내장
 EXAMPLES_DATA = {
@@ -139,13 +141,8 @@ def call_openai_api_for_json(prompt: str, api_key: str) -> Dict[str, Any]:
     print(f"[DEBUG] 프롬프트 길이: {len(prompt)}")
     
     try:
-        # OpenAI 클라이언트 초기화
-        print(f"[DEBUG] OpenAI 클라이언트 초기화 중...")
-        client = openai.OpenAI(api_key=api_key)
-        
-        print(f"[DEBUG] API 요청 전송 중...")
         # PRIMARY_MODEL을 사용하여 프로젝트 전체 모델 통일
-        response = client.chat.completions.create(
+        request = dict(
             model=PRIMARY_MODEL,
             messages=[
                 {
@@ -161,6 +158,20 @@ def call_openai_api_for_json(prompt: str, api_key: str) -> Dict[str, Any]:
             max_tokens=2000,
             response_format={"type": "json_object"}  # JSON 형식 강제
         )
+
+        def send_request():
+            # OpenAI 클라이언트 초기화 (카세트에서 재생할 때는 만들지 않음)
+            print(f"[DEBUG] OpenAI 클라이언트 초기화 중...")
+            client = openai.OpenAI(api_key=api_key)
+            print(f"[DEBUG] API 요청 전송 중...")
+            return client.chat.completions.create(**request)
+
+        # LLM_CASSETTE 설정에 따라 녹화/재생 (기본은 그대로 호출)
+        response = get_cassette().call(
+            "openai.chat_completions", request, send_request,
+            serialize=lambda r: r.model_dump(mode='json'),
+            deserialize=ChatCompletion.model_validate
+        )
         
         print(f"[DEBUG] API 응답 수신 완료")
         
@@ -38,13 +38,23 @@ def draw_info_search_tab():
             placeholder="예: 선생님 내선전화번호, 학년업무, 와이파이 비밀번호", 
             key="rag_question"
         )
+        # 검색 결과는 LLM 없이 바로 보여주고, 요약 답변은 원할 때만 생성
+        summarize = st.checkbox("🤖 AI 요약 답변도 함께 보기 (조금 느려질 수 있습니다)", value=False, key="rag_summarize")
         ask_button = st.button("🔍 검색하기", use_container_width=True)
     
     # 검색 실행
     if ask_button and user_question.strip():
+        # 스피너는 검색(문서 찾기)까지만 표시하고, 요약 답변은 아래에서 토큰 단위로 흘려보냄
         with st.spinner("전주화정초 정보를 검색하고 있습니다..."):
             try:
-                result = get_rag_answer(user_question)
+                result = get_rag_answer(user_question, stream=True, summarize=summarize)
+            except Exception as e:
+                result = None
+                st.error(f"❌ 검색 중 오류가 발생했습니다: {e}")
+                st.info("잠시 후 다시 시도해주세요.")
+
+        if result is not None:
+            try:
                 st.markdown(f"**🔍 검색 질문:** {user_question}")
                 
                 results_list = result.get('results', [])
@@ -53,6 +63,9 @@ def draw_info_search_tab():
                     # 메인 답변 표시
                     main_result = results_list[0]
                     confidence = main_result.get('confidence', 0)
+                    # 목록 질문 결과는 카드에 건수만 쓰고 전체 목록은 아래 표로 표시
+                    table = main_result.get('table')
+                    main_answer = main_result['answer'].split(chr(10), 1)[0] if table else main_result['answer']
                     
                     # 신뢰도에 따른 스타일링
                     if confidence >= 0.8:
@@ -81,10 +94,17 @@ def draw_info_search_tab():
                             <span style="color: {color}; font-size: 12px; font-weight: bold;">{confidence_text}</span>
                         </div>
                         <div style="font-size: 16px; line-height: 1.6; color: #333;">
-                            {main_result['answer'].replace(chr(10), '<br>')}
+                            {main_answer.replace(chr(10), '<br>')}
                         </div>
                     </div>
                     """, unsafe_allow_html=True)
+                    if table:
+                        st.dataframe(table, hide_index=True, use_container_width=True)
+                    
+                    # LLM 요약 답변 스트리밍 (요약을 요청한 경우에만 있음)
+                    if result.get('stream') is not None:
+                        st.markdown("### 🤖 AI 답변")
+                        st.write_stream(result['stream'])
                     
                     # 추가 결과 표시
                     if len(results_list) > 1:
@@ -0,0 +1,355 @@
+"""
+LLM / Rerank 호출 녹화·재생 (카세트)
+OpenAI 채팅과 Cohere Rerank 호출을 요청 해시 -> 응답(+소요 시간)으로 SQLite에 저장해 두고,
+재생 모드에서는 네트워크 없이 같은 응답을 돌려줍니다. 우리 코드의 성능을 API 비용/지연 없이 반복 측정할 때 사용합니다.
+
+환경 변수
+    LLM_CASSETTE          off (기본) / record / replay / auto
+                            record: 실제 호출 후 저장, replay: 저장된 응답만 사용 (없으면 CassetteMissError),
+                            auto: 저장된 응답이 있으면 재생, 없으면 호출 후 저장
+    LLM_CASSETTE_PATH     카세트 파일 (기본 vectorstore_cache/llm_cassette.sqlite3)
+    LLM_CASSETTE_LATENCY  재생 시 지연 재현 방식
+                            none (기본): 바로 응답
+                            recorded: 그 요청을 녹화할 때 걸린 시간만큼 대기 (스트림은 청크 도착 시각까지 재현)
+                            sampled: 같은 종류 호출들의 녹화 시간 분포에서 하나를 뽑아 대기
+
+    LLM_CASSETTE=replay python rag_benchmark.py          # 녹화해 둔 LLM 응답으로 파이프라인 측정
+"""
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+CASSETTE_ENV = "LLM_CASSETTE"
+CASSETTE_PATH_ENV = "LLM_CASSETTE_PATH"
+CASSETTE_LATENCY_ENV = "LLM_CASSETTE_LATENCY"
+
+DEFAULT_CASSETTE_PATH = os.path.join("vectorstore_cache", "llm_cassette.sqlite3")
+
+CASSETTE_MODES = ("off", "record", "replay", "auto")
+LATENCY_MODES = ("none", "recorded", "sampled")
+
+
+class CassetteMissError(LookupError):
+    """replay 모드에서 녹화되지 않은 요청이 들어온 경우"""
+
+    def __init__(self, kind: str, key: str):
+        super().__init__(f"카세트에 녹화되지 않은 {kind} 요청입니다 (key={key[:12]}). LLM_CASSETTE=record 또는 auto로 먼저 녹화하세요.")
+        self.kind = kind
+        self.key = key
+
+
+def request_key(kind: str, request: dict) -> str:
+    """요청 내용의 안정적인 해시 (dict 키 순서와 무관)"""
+    payload = json.dumps(request, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(f"{kind}\0{payload}".encode('utf-8')).hexdigest()
+
+
+class Cassette:
+    """요청 해시 -> 응답 저장소"""
+
+    def __init__(self, path: str = DEFAULT_CASSETTE_PATH, mode: str = "off",
+                 latency: str = "none", seed: Optional[int] = None):
+        """
+        Args:
+            path: SQLite 파일 경로
+            mode: off / record / replay / auto
+            latency: 재생 지연 재현 방식 none / recorded / sampled
+            seed: sampled 지연 추출용 시드 (같은 시드면 같은 지연 순서)
+        """
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"지원하지 않는 카세트 모드: {mode} (사용 가능: {', '.join(CASSETTE_MODES)})")
+        if latency not in LATENCY_MODES:
+            raise ValueError(f"지원하지 않는 지연 재현 방식: {latency} (사용 가능: {', '.join(LATENCY_MODES)})")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._conn = None
+        if mode != "off":
+            db_dir = os.path.dirname(path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS calls ("
+                "key TEXT PRIMARY KEY, kind TEXT NOT NULL, request TEXT NOT NULL, response TEXT NOT NULL, "
+                "chunks TEXT, latency_ms REAL NOT NULL, created_at REAL NOT NULL)"
+            )
+            # 같은 요청을 여러 번 녹화하면 소요 시간은 모두 남겨 분포로 사용
+            self._conn.execute("CREATE TABLE IF NOT EXISTS latencies (kind TEXT NOT NULL, latency_ms REAL NOT NULL)")
+            self._conn.commit()
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode in ("replay", "auto")
+
+    def _load(self, key: str) -> Optional[tuple]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT response, chunks, latency_ms FROM calls WHERE key = ?", (key,)
+            ).fetchone()
+
+    def _save(self, key: str, kind: str, request: dict, response: Any, latency_ms: float,
+              chunks: Optional[List[list]] = None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO calls (key, kind, request, response, chunks, latency_ms, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, kind, json.dumps(request, ensure_ascii=False, default=str),
+                 json.dumps(response, ensure_ascii=False),
+                 json.dumps(chunks, ensure_ascii=False) if chunks is not None else None,
+                 latency_ms, time.time())
+            )
+            self._conn.execute("INSERT INTO latencies (kind, latency_ms) VALUES (?, ?)", (kind, latency_ms))
+            self._conn.commit()
+            self.recorded += 1
+
+    def _replay_delay_ms(self, kind: str, recorded_ms: float) -> float:
+        if self.latency == "recorded":
+            return recorded_ms
+        if self.latency == "sampled":
+            with self._lock:
+                samples = [row[0] for row in self._conn.execute(
+                    "SELECT latency_ms FROM latencies WHERE kind = ?", (kind,))]
+                return self._rng.choice(samples) if samples else recorded_ms
+        return 0.0
+
+    def call(self, kind: str, request: dict, func: Callable[[], Any],
+             serialize: Callable[[Any], Any] = None, deserialize: Callable[[Any], Any] = None) -> Any:
+        """
+        요청 1건 실행 또는 재생
+
+        Args:
+            kind: 호출 종류 ("openai.chat" 등, 지연 분포를 나누는 단위)
+            request: 응답을 결정하는 요청 내용 (JSON으로 바꿀 수 있어야 함)
+            func: 실제 호출 함수
+            serialize: 응답 -> JSON 값 (없으면 그대로 저장)
+            deserialize: JSON 값 -> 응답 (없으면 그대로 반환)
+        """
+        if not self.enabled:
+            return func()
+
+        key = request_key(kind, request)
+        if self.replaying:
+            row = self._load(key)
+            if row is not None:
+                self.hits += 1
+                response, _, latency_ms = row
+                delay = self._replay_delay_ms(kind, latency_ms)
+                if delay:
+                    time.sleep(delay / 1000)
+                value = json.loads(response)
+                return deserialize(value) if deserialize else value
+            self.misses += 1
+            if self.mode == "replay":
+                raise CassetteMissError(kind, key)
+
+        start = time.perf_counter()
+        result = func()
+        latency_ms = (time.perf_counter() - start) * 1000
+        self._save(key, kind, request, serialize(result) if serialize else result, latency_ms)
+        return result
+
+    def stream(self, kind: str, request: dict, func: Callable[[], Iterator[str]]) -> Iterator[str]:
+        """
+        스트리밍 요청 1건 실행 또는 재생 (문자열 청크 단위)
+
+        녹화할 때는 청크마다 시작 후 경과 시간을 함께 저장하고,
+        latency가 recorded/sampled면 재생할 때 같은 시각(sampled는 비율을 맞춰)에 청크를 내보냅니다.
+        """
+        if not self.enabled:
+            yield from func()
+            return
+
+        key = request_key(kind, request)
+        if self.replaying:
+            row = self._load(key)
+            if row is not None:
+                self.hits += 1
+                _, chunks, latency_ms = row
+                chunks = json.loads(chunks) if chunks else []
+                delay = self._replay_delay_ms(kind, latency_ms)
+                scale = delay / latency_ms if latency_ms else 0.0
+                start = time.perf_counter()
+                for offset_ms, text in chunks:
+                    wait = offset_ms * scale / 1000 - (time.perf_counter() - start)
+                    if wait > 0:
+                        time.sleep(wait)
+                    yield text
+                return
+            self.misses += 1
+            if self.mode == "replay":
+                raise CassetteMissError(kind, key)
+
+        chunks = []
+        start = time.perf_counter()
+        for text in func():
+            chunks.append([(time.perf_counter() - start) * 1000, text])
+            yield text
+        latency_ms = (time.perf_counter() - start) * 1000
+        self._save(key, kind, request, "".join(text for _, text in chunks), latency_ms, chunks)
+
+    def stats(self) -> dict:
+        return {'mode': self.mode, 'hits': self.hits, 'misses': self.misses, 'recorded': self.recorded}
+
+
+_shared_cassettes: Dict[tuple, Cassette] = {}
+_shared_lock = threading.Lock()
+
+
+def get_cassette() -> Cassette:
+    """환경 변수 설정에 맞는 프로세스 공유 카세트"""
+    mode = os.getenv(CASSETTE_ENV, "off").lower()
+    path = os.getenv(CASSETTE_PATH_ENV, DEFAULT_CASSETTE_PATH)
+    latency = os.getenv(CASSETTE_LATENCY_ENV, "none").lower()
+    key = (mode, os.path.abspath(path), latency)
+    with _shared_lock:
+        if key not in _shared_cassettes:
+            _shared_cassettes[key] = Cassette(path, mode=mode, latency=latency)
+        return _shared_cassettes[key]
+
+
+# --- LangChain 연결 ---
+
+def _message_payload(messages) -> List[list]:
+    return [[message.type, message.content] for message in messages]
+
+
+def _make_cassette_chat_model():
+    from langchain_core.language_models import BaseChatModel
+    from langchain_core.messages import AIMessage, AIMessageChunk
+    from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+    class CassetteChatModel(BaseChatModel):
+        """채팅 모델 호출을 카세트로 녹화·재생하는 래퍼 (invoke/stream 모두 지원)"""
+        inner: BaseChatModel
+        cassette: Any
+
+        @property
+        def _llm_type(self) -> str:
+            return f"cassette-{self.inner._llm_type}"
+
+        @property
+        def _identifying_params(self) -> dict:
+            return self.inner._identifying_params
+
+        def _request(self, messages, stop, kwargs) -> dict:
+            return {
+                'params': self.inner._identifying_params,
+                'messages': _message_payload(messages),
+                'stop': stop,
+                'kwargs': kwargs,
+            }
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            content = self.cassette.call(
+                "openai.chat",
+                self._request(messages, stop, kwargs),
+                lambda: self.inner.invoke(messages, stop=stop, **kwargs).content,
+            )
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+        def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+            chunks = self.cassette.stream(
+                "openai.chat_stream",
+                self._request(messages, stop, kwargs),
+                lambda: (chunk.content for chunk in self.inner.stream(messages, stop=stop, **kwargs)),
+            )
+            for text in chunks:
+                chunk = ChatGenerationChunk(message=AIMessageChunk(content=text))
+                if run_manager:
+                    run_manager.on_llm_new_token(text, chunk=chunk)
+                yield chunk
+
+    return CassetteChatModel
+
+
+_cassette_chat_model_class = None
+
+
+def wrap_chat_model(llm, cassette: Optional[Cassette] = None):
+    """카세트가 켜져 있으면 채팅 모델을 녹화·재생 래퍼로 감쌈 (꺼져 있으면 그대로 반환)"""
+    global _cassette_chat_model_class
+    cassette = cassette or get_cassette()
+    if not cassette.enabled:
+        return llm
+    if _cassette_chat_model_class is None:
+        _cassette_chat_model_class = _make_cassette_chat_model()
+    return _cassette_chat_model_class(inner=llm, cassette=cassette)
+
+
+def create_chat_model(**kwargs):
+    """
+    ChatOpenAI 생성 (카세트 설정 반영)
+
+    replay 모드에서는 API 키가 없어도 되도록 자리표시 키를 넣습니다 (실제 요청은 나가지 않음).
+    """
+    from langchain_openai import ChatOpenAI
+
+    cassette = get_cassette()
+    if cassette.mode == "replay" and not (kwargs.get('api_key') or os.getenv("OPENAI_API_KEY")):
+        kwargs['api_key'] = "replay"
+    return wrap_chat_model(ChatOpenAI(**kwargs), cassette)
+
+
+def _make_cassette_reranker():
+    from langchain_core.documents import BaseDocumentCompressor, Document
+
+    class CassetteReranker(BaseDocumentCompressor):
+        """리랭커(CohereRerank 등) 호출을 카세트로 녹화·재생하는 래퍼"""
+        inner: BaseDocumentCompressor
+        cassette: Any
+        model: str = ""
+
+        def compress_documents(self, documents, query, callbacks=None):
+            documents = list(documents)
+            contents = [doc.page_content for doc in documents]
+
+            def rerank():
+                ranked = self.inner.compress_documents(documents, query, callbacks=callbacks)
+                positions = {content: i for i, content in enumerate(contents)}
+                return [
+                    [positions[doc.page_content], doc.metadata.get("relevance_score")]
+                    for doc in ranked if doc.page_content in positions
+                ]
+
+            ranking = self.cassette.call(
+                "cohere.rerank",
+                {'model': self.model, 'top_n': getattr(self.inner, 'top_n', None), 'query': query, 'documents': contents},
+                rerank,
+            )
+            return [
+                Document(documents[i].page_content, metadata={**documents[i].metadata, "relevance_score": score})
+                for i, score in ranking
+            ]
+
+    return CassetteReranker
+
+
+_cassette_reranker_class = None
+
+
+def wrap_reranker(reranker, model: str = "", cassette: Optional[Cassette] = None):
+    """카세트가 켜져 있으면 리랭커를 녹화·재생 래퍼로 감쌈 (꺼져 있으면 그대로 반환)"""
+    global _cassette_reranker_class
+    cassette = cassette or get_cassette()
+    if not cassette.enabled or reranker is None:
+        return reranker
+    if _cassette_reranker_class is None:
+        _cassette_reranker_class = _make_cassette_reranker()
+    return _cassette_reranker_class(inner=reranker, cassette=cassette, model=model)
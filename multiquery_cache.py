@@ -0,0 +1,183 @@
+"""
+MultiQuery 변형 질문 캐시
+MultiQuery가 LLM으로 만든 검색 질문들과 각 질문의 검색 결과를 SQLite에 저장하여
+같은 질문(정규화 기준)은 처음 물은 사람만 LLM 호출 비용을 내고, 이후에는 프로세스를 다시 띄워도 재사용합니다.
+
+키: 정규화된 질문 + 프롬프트 지문(프롬프트 템플릿과 LLM 설정 해시)
+    - 프롬프트나 모델이 바뀌면 키가 달라져 예전 변형을 쓰지 않음
+인덱스 버전:
+    - 검색 결과는 저장할 때의 인덱스 버전과 함께 저장하고, 버전이 바뀌면 결과만 버림
+    - 변형 질문 자체는 인덱스와 무관하므로 남겨 두고 검색만 다시 실행 (LLM 호출 없음)
+크기:
+    - max_entries를 넘으면 가장 오래 안 쓰인 항목부터 삭제
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from rag_cache import normalize_query
+
+# 캐시 파일 (벡터스토어 캐시 폴더 안에 함께 둠)
+MULTIQUERY_CACHE_PATH = os.path.join("vectorstore_cache", "multiquery.sqlite3")
+
+# 최대 저장 질문 수
+DEFAULT_MAX_ENTRIES = 2000
+
+
+def prompt_fingerprint(prompt, llm=None) -> str:
+    """
+    프롬프트 템플릿 + LLM 설정 해시 (캐시 키에 포함)
+
+    Args:
+        prompt: PromptTemplate 또는 문자열
+        llm: LangChain 채팅 모델 (_identifying_params의 모델 이름/온도 등을 포함)
+    """
+    template = getattr(prompt, 'template', prompt)
+    params = getattr(llm, '_identifying_params', None) or {}
+    payload = json.dumps({'template': str(template), 'llm': params}, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def _document_to_dict(doc) -> dict:
+    return {'page_content': doc.page_content, 'id': doc.id, 'metadata': doc.metadata}
+
+
+def _document_from_dict(data: dict):
+    from langchain_core.documents import Document
+    return Document(data['page_content'], id=data.get('id'), metadata=data.get('metadata') or {})
+
+
+class MultiQueryCache:
+    """SQLite 기반 변형 질문 + 변형별 검색 결과 캐시 (여러 워커 프로세스가 같은 파일을 공유)"""
+
+    def __init__(self, prompt_hash: str, db_path: str = MULTIQUERY_CACHE_PATH,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        Args:
+            prompt_hash: prompt_fingerprint() 값
+            db_path: SQLite 캐시 파일 경로
+            max_entries: 최대 저장 질문 수 (파일 전체 기준)
+        """
+        self.prompt_hash = prompt_hash
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.index_version = None
+        self.hits = 0           # 변형 + 검색 결과 모두 재사용
+        self.variant_hits = 0   # 변형만 재사용 (인덱스가 바뀌어 검색은 다시 실행)
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS variants ("
+            " key TEXT PRIMARY KEY, query TEXT NOT NULL, variants TEXT NOT NULL,"
+            " results TEXT, index_version TEXT, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS variants_last_used ON variants (last_used)")
+        self._conn.commit()
+
+    def _key(self, query: str) -> str:
+        return hashlib.sha256(f"{self.prompt_hash}\0{normalize_query(query)}".encode('utf-8')).hexdigest()
+
+    def get(self, query: str) -> Optional[dict]:
+        """
+        저장된 항목 반환
+
+        Returns:
+            {'variants': [변형 질문], 'results': [[Document], ...] 또는 None (인덱스 버전이 다를 때)}
+            저장된 적이 없으면 None
+        """
+        key = self._key(query)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT variants, results, index_version FROM variants WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE variants SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+
+        variants_json, results_json, index_version = row
+        results = None
+        if results_json is not None and index_version == self.index_version:
+            results = [[_document_from_dict(d) for d in docs] for docs in json.loads(results_json)]
+            self.hits += 1
+        else:
+            self.variant_hits += 1
+        return {'variants': json.loads(variants_json), 'results': results}
+
+    def put(self, query: str, variants: List[str], results=None):
+        """
+        변형 질문과 변형별 검색 결과 저장 (max_entries를 넘으면 오래 안 쓰인 항목부터 삭제)
+
+        Args:
+            query: 원래 질문
+            variants: LLM이 만든 변형 질문 리스트
+            results: 검색한 질문 순서대로의 Document 리스트들 (없으면 변형만 저장)
+        """
+        results_json = None
+        if results is not None:
+            results_json = json.dumps(
+                [[_document_to_dict(doc) for doc in docs] for docs in results], ensure_ascii=False, default=str
+            )
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO variants (key, query, variants, results, index_version, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (self._key(query), query, json.dumps(variants, ensure_ascii=False), results_json,
+                 self.index_version, time.time())
+            )
+            self._conn.execute(
+                "DELETE FROM variants WHERE key IN ("
+                " SELECT key FROM variants ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+
+    def set_index_version(self, version):
+        """
+        현재 인덱스 버전 설정 (다른 버전에서 저장된 검색 결과는 쓰지 않고 다음 저장 때 덮어씀, 변형 질문은 유지)
+
+        파일을 공유하는 다른 워커가 아직 예전 버전일 수 있으므로 행을 지우지 않고 읽을 때 버전을 비교합니다.
+        """
+        with self._lock:
+            self.index_version = version
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM variants")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM variants").fetchone()[0]
+        total = self.hits + self.variant_hits + self.misses
+        return {
+            'size': size,
+            'hits': self.hits,
+            'variant_hits': self.variant_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.variant_hits) / total if total else 0.0,
+        }
+
+
+_shared_caches: Dict[tuple, MultiQueryCache] = {}
+_shared_lock = threading.Lock()
+
+
+def get_multiquery_cache(prompt_hash: str, db_path: str = MULTIQUERY_CACHE_PATH) -> MultiQueryCache:
+    """프로세스 공유 캐시 반환 (프롬프트 지문/파일별 1개)"""
+    key = (prompt_hash, os.path.abspath(db_path))
+    with _shared_lock:
+        if key not in _shared_caches:
+            _shared_caches[key] = MultiQueryCache(prompt_hash, db_path)
+        return _shared_caches[key]
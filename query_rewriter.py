@@ -0,0 +1,258 @@
+"""
+질문 재작성 (별칭/동의어 사전)
+검색 전에 질문 속 별칭을 CSV에서 쓰는 대표 표기로 바꿉니다. LLM 없이 트라이 한 번 훑기로 끝납니다.
+    "행정 선생님 번호"      -> "행정실 선생님 번호"
+    "6학년2반 내선번호"     -> "6학년 2반 내선번호"
+    "교무실 FAX"           -> "교무실 팩스"
+    "노주영쌤 번호"         -> "노주영 선생님 번호"
+
+사전 구성 (뒤에 오는 것이 앞의 것을 덮어씀):
+    1. rag_expansion.ALIAS_GROUPS (묶음의 첫 표기가 대표 표기)
+    2. school_info.csv에서 뽑은 반 표기("6학년2반", "6-2반" -> "6학년 2반")와
+       "~실" 부서 이름의 줄임말("보건" -> "보건실", "행정" -> "행정실")
+    3. 사용자 사전 data/query_aliases.csv (alias,canonical 열)
+CSV에 나오는 역할/부서 이름과 대표 표기는 그대로 두는 항목으로 넣어 "행정실장"의 "행정"처럼
+더 긴 단어의 일부가 바뀌지 않게 합니다. 1, 2의 별칭이 CSV에서 대표 표기가 아닌 다른 말의 앞부분으로도
+쓰이면 ("과학" -> "과학교육", "보건" -> "보건교육실") 과목/업무 질문이 방 이름으로 바뀌므로 넣지 않습니다.
+
+RAG_QUERY_REWRITE=off로 끌 수 있습니다.
+"""
+import csv
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from rag_corpus import DEFAULT_CSV_PATH, get_corpus
+from rag_expansion import ALIAS_GROUPS
+
+QUERY_REWRITE_ENV = "RAG_QUERY_REWRITE"
+CUSTOM_ALIAS_PATH = os.path.join("data", "query_aliases.csv")
+
+# 별칭 뒤에 붙어도 같은 단어로 보는 조사/호칭
+_PARTICLES = frozenset(('', '의', '은', '는', '이', '가', '을', '를', '에', '에서', '로', '으로', '과', '와', '도', '번호'))
+_HONORIFICS = ('선생님', '쌤', '샘', '님')
+
+# 트라이 노드에서 항목 끝을 나타내는 키 (값: 대표 표기, 그대로 두는 항목이면 None)
+_END = ''
+
+# ALIAS_GROUPS에 있어도 바꾸지 않는 말 (010/지역번호 같은 내선번호가 아닌 번호도 가리키므로
+# "내선번호"로 바꾸면 업체/학교팩스 질문이 4자리 내선번호 행으로 쏠림)
+_PROTECTED_ALIASES = frozenset(('전화번호', '연락처'))
+
+# "보건실", "행정실장", "과학실(건식)" -> 줄임말 "보건", "행정", "과학"
+_ROOM_NAME = re.compile(r'^([가-힣]{2,})실장?$')
+
+
+def _is_hangul(ch: str) -> bool:
+    return '가' <= ch <= '힣'
+
+
+def _is_ascii_word(ch: str) -> bool:
+    return ch.isascii() and ch.isalnum()
+
+
+class QueryRewriter:
+    """별칭 트라이 (가장 왼쪽에서 시작하는 가장 긴 항목부터 바꿈)"""
+
+    def __init__(self, entries: Optional[Dict[str, Optional[str]]] = None):
+        """
+        Args:
+            entries: {별칭: 대표 표기} (대표 표기가 None이면 그대로 두는 항목)
+        """
+        self._root: dict = {}
+        self.size = 0
+        for alias, canonical in (entries or {}).items():
+            self.add(alias, canonical)
+
+    def add(self, alias: str, canonical: Optional[str] = None):
+        """항목 추가 (대소문자 구분 없음, canonical이 None이면 바꾸지 않고 보호만 함)"""
+        alias = re.sub(r'\s+', ' ', str(alias)).strip().lower()
+        if not alias:
+            return
+        node = self._root
+        for ch in alias:
+            node = node.setdefault(ch, {})
+        if _END not in node:
+            self.size += 1
+        node[_END] = canonical if canonical is None or canonical.lower() != alias else None
+
+    def _candidates(self, text: str, start: int) -> List[Tuple[int, Optional[str]]]:
+        """start에서 시작하는 모든 항목 [(끝 위치, 대표 표기)] (짧은 것부터)"""
+        found = []
+        node = self._root
+        for i in range(start, len(text)):
+            node = node.get(text[i])
+            if node is None:
+                break
+            if _END in node:
+                found.append((i + 1, node[_END]))
+        return found
+
+    def _starts_word(self, text: str, i: int, previous_end: int) -> bool:
+        if i == 0 or i == previous_end:
+            return True
+        prev, ch = text[i - 1], text[i]
+        return not (_is_hangul(prev) and _is_hangul(ch)) and not (_is_ascii_word(prev) and _is_ascii_word(ch))
+
+    def _ends_word(self, text: str, end: int) -> bool:
+        """뒤에 조사/호칭/다른 항목만 붙은 경우만 인정 ("교무실무사"의 "교무실"은 제외)"""
+        rest = re.match(r'[가-힣a-z0-9]*', text[end:]).group(0)
+        return (rest in _PARTICLES or rest.startswith(_HONORIFICS)
+                or bool(self._candidates(text, end)))
+
+    def _scan(self, text: str):
+        """바꾸거나 보호할 구간 (시작, 끝, 대표 표기) 순회 (text는 소문자)"""
+        i = 0
+        previous_end = -1
+        while i < len(text):
+            if self._starts_word(text, i, previous_end):
+                for end, canonical in reversed(self._candidates(text, i)):
+                    if self._ends_word(text, end):
+                        yield i, end, canonical
+                        i = previous_end = end
+                        break
+                else:
+                    i += 1
+            else:
+                i += 1
+
+    def rewrite(self, query: str) -> str:
+        """질문 속 별칭을 대표 표기로 바꾼 질문 (바꿀 것이 없으면 공백만 정리한 원문)"""
+        text = re.sub(r'\s+', ' ', str(query)).strip()
+        lowered = text.lower()
+        out = []
+        position = 0
+        for start, end, canonical in self._scan(lowered):
+            if canonical is None:
+                continue
+            out.append(text[position:start])
+            # 앞 항목에 붙어 있던 별칭도 띄어 씀 ("노주영쌤" -> "노주영 선생님")
+            if start > 0 and not lowered[start - 1].isspace():
+                out.append(' ')
+            out.append(canonical)
+            # 조사가 아닌 말이 바로 붙어 있으면 띄어 씀 ("보건선생님" -> "보건실 선생님")
+            rest = re.match(r'[가-힣]*', lowered[end:]).group(0)
+            if rest not in _PARTICLES:
+                out.append(' ')
+            position = end
+        out.append(text[position:])
+        return re.sub(r'\s+', ' ', ''.join(out)).strip()
+
+    def matches(self, query: str) -> List[Tuple[str, str]]:
+        """바뀌는 (별칭, 대표 표기) 목록 (디버깅용)"""
+        text = re.sub(r'\s+', ' ', str(query)).strip().lower()
+        return [(text[start:end], canonical) for start, end, canonical in self._scan(text) if canonical is not None]
+
+    @classmethod
+    def from_csv(cls, csv_path: str = DEFAULT_CSV_PATH,
+                 custom_path: Optional[str] = CUSTOM_ALIAS_PATH) -> "QueryRewriter":
+        """school_info.csv와 사용자 사전으로 별칭 사전 구성"""
+        from staff_directory import get_staff_directory
+
+        corpus = get_corpus(csv_path)
+        directory = get_staff_directory(csv_path)
+        entries: Dict[str, Optional[str]] = {}
+        words = set(re.findall(r'[가-힣]+', "\n".join(corpus.questions + corpus.answers)))
+
+        def conflicts(alias: str, canonical: str) -> bool:
+            """alias로 시작하지만 canonical이 아닌 CSV 단어가 있는지 ("과학" -> "과학교육")"""
+            for word in words:
+                if word.startswith(alias) and not word.startswith(canonical):
+                    rest = word[len(alias):]
+                    if rest and rest not in _PARTICLES and not rest.startswith(_HONORIFICS):
+                        return True
+            return False
+
+        # 1. 공용 별칭 묶음
+        for group in ALIAS_GROUPS:
+            entries[group[0]] = None
+            for alias in group[1:]:
+                if alias in _PROTECTED_ALIASES:
+                    entries[alias] = None
+                elif not conflicts(alias, group[0]):
+                    entries[alias] = group[0]
+
+        # 2-1. 반 표기 (CSV는 "6학년 2반"(교실)과 "6-2"(담임)를 다른 행으로 두므로 둘은 그대로 두고 나머지만 맞춤)
+        for class_code in directory.by_class:
+            grade, room = class_code.split('-')
+            classroom = f"{grade}학년 {room}반"
+            entries[classroom] = None
+            entries[class_code] = None
+            entries[f"{grade}학년{room}반"] = classroom
+            entries[f"{class_code}반"] = classroom
+
+        # 2-2. 역할/부서 이름은 그대로 두고, "~실" 이름은 줄임말을 추가
+        names = set()
+        for key in list(directory.by_role) + list(directory.by_department):
+            names.add(key)
+            names.add(re.sub(r'\(.*?\)', '', key))
+        names.update(directory.by_name)
+        questions = "\n".join(corpus.questions)
+        stems: Dict[str, set] = {}
+        for name in names:
+            m = _ROOM_NAME.match(name)
+            if m:
+                stems.setdefault(m.group(1), set()).add(m.group(1) + '실')
+        for name in names:
+            entries.setdefault(name, None)
+        for stem, targets in stems.items():
+            # 줄임말 자체가 다른 역할 이름이거나 질문에 단독으로 쓰이면 ("안전/교무") 바꾸지 않음
+            if len(targets) != 1 or stem in names:
+                continue
+            if re.search(rf'(?<![가-힣]){re.escape(stem)}(?![가-힣])', questions):
+                continue
+            if conflicts(stem, next(iter(targets))):
+                continue
+            entries.setdefault(stem, next(iter(targets)))
+
+        # 3. 사용자 사전
+        if custom_path and os.path.exists(custom_path):
+            entries.update(load_custom_aliases(custom_path))
+
+        rewriter = cls(entries)
+        print(f"[DEBUG] 질문 재작성 사전: {rewriter.size}개 항목")
+        return rewriter
+
+
+def load_custom_aliases(path: str = CUSTOM_ALIAS_PATH) -> Dict[str, Optional[str]]:
+    """사용자 사전 CSV (alias,canonical) 로드 (canonical이 비어 있으면 그대로 두는 항목)"""
+    entries = {}
+    try:
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            for row in csv.DictReader(f):
+                alias = (row.get('alias') or '').strip()
+                if alias:
+                    entries[alias] = (row.get('canonical') or '').strip() or None
+    except (OSError, csv.Error) as e:
+        print(f"[ERROR] 사용자 별칭 사전 로드 실패 ({path}): {e}")
+    return entries
+
+
+_rewriters: Dict[tuple, QueryRewriter] = {}
+_rewriters_lock = threading.Lock()
+
+
+def get_query_rewriter(csv_path: str = DEFAULT_CSV_PATH) -> QueryRewriter:
+    """프로세스 공유 재작성기 (CSV 또는 사용자 사전이 바뀌었을 때만 다시 구성)"""
+    corpus = get_corpus(csv_path)
+    try:
+        custom_mtime = os.stat(CUSTOM_ALIAS_PATH).st_mtime_ns
+    except OSError:
+        custom_mtime = None
+    key = (os.path.abspath(csv_path), corpus.sha256, custom_mtime)
+    with _rewriters_lock:
+        if key not in _rewriters:
+            _rewriters[key] = QueryRewriter.from_csv(csv_path)
+        return _rewriters[key]
+
+
+def rewrite_query(query: str, csv_path: str = DEFAULT_CSV_PATH) -> str:
+    """검색 전 질문 재작성 (RAG_QUERY_REWRITE=off이거나 사전 구성에 실패하면 원문)"""
+    if os.getenv(QUERY_REWRITE_ENV, "on").lower() == "off" or not query:
+        return query
+    try:
+        return get_query_rewriter(csv_path).rewrite(query)
+    except Exception as e:
+        print(f"[ERROR] 질문 재작성 실패 (원문으로 검색): {e}")
+        return query
@@ -0,0 +1,744 @@
+"""
+RAG 검색 품질 / 지연시간 벤치마크
+school_info.csv에서 라벨이 달린 질문 세트(원문, 바꿔 말하기, 오타, 번호 역조회, 역할 질문)를 만들고
+모든 검색 엔진(rag_engines)과 utils.init_rag_system 파이프라인 설정별로
+recall@k, MRR, p50/p95/p99 지연시간, 최대 RSS, 콜드/웜 스타트 시간을 측정해 JSON 리포트로 저장합니다.
+
+엔진마다 별도 프로세스에서 실행하므로 메모리와 시작 시간이 서로 섞이지 않습니다.
+--offline이면 OpenAI 임베딩/LLM과 Cohere Rerank를 결정적인 로컬 대체물로 바꾸고,
+빈 임시 작업 폴더에서 실행하여 실제 캐시(vectorstore_cache)를 건드리지 않습니다.
+정답은 답변 문장이 담은 사실(fact_key) 단위로 판정합니다. 같은 번호나 같은 선생님-업무를 말하는 다른 행
+("교무부장의 내선번호는 8489" / "교무부장 고소임 선생님의 내선번호는 8489")은 같은 정답으로 봅니다.
+sentence-transformers/CrossEncoder는 대체하지 않으므로, 설치되어 있지 않아 다른 방식으로 대체된 대상은
+리포트의 method.fallback과 요약의 "*" 표시로 구분합니다 (예: v2 -> sklearn, pipeline-local -> none).
+
+    python rag_benchmark.py --offline                          # 전체 엔진 + 파이프라인, 네트워크 없이
+    python rag_benchmark.py --offline --targets lite,tfidf --out bench.json
+    python rag_benchmark.py --offline --compare old.json       # 이전 리포트와 비교
+    python rag_benchmark.py --save-queries queries.json        # 질문 세트만 저장 (직접 라벨 수정 후 --queries로 사용)
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from functools import partial
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from rag_corpus import DEFAULT_CSV_PATH, get_corpus
+
+# 리포트 형식 버전 (필드 의미가 바뀌면 올림, 3: 정답을 사실 단위로 판정하고 역할 질문 라벨을 CSV에서 생성)
+REPORT_VERSION = 3
+
+DEFAULT_K_VALUES = (1, 3, 5)
+DEFAULT_PER_KIND = 30
+DEFAULT_SEED = 17
+LATENCY_PERCENTILES = (50, 95, 99)
+
+# 라이브러리 엔진 외에 측정할 utils.init_rag_system 설정 (이름 -> 환경 변수)
+PIPELINE_CONFIGS = {
+    "pipeline-none": {"RAG_RERANKER": "none"},
+    "pipeline-cohere": {"RAG_RERANKER": "cohere"},
+    "pipeline-local": {"RAG_RERANKER": "local"},
+    "pipeline-multiquery": {"RAG_RERANKER": "cohere", "RAG_MULTIQUERY": "on"},
+}
+
+# 오프라인 임베딩 차원
+OFFLINE_EMBEDDING_DIM = 512
+
+# 바꿔 말하기 규칙 (위에서부터 처음 맞는 규칙 하나만 적용)
+PARAPHRASE_RULES = [
+    (re.compile(r'^(?P<x>.+?) 선생님 내선번호 알려줘$'), "{x} 선생님 전화번호 뭐야"),
+    (re.compile(r'^(?P<x>.+?) 내선번호 알려줘$'), "{x} 전화 몇 번이야"),
+    (re.compile(r'^(?P<x>.+?) 내선번호는\?$'), "{x} 연락처 알려주세요"),
+    (re.compile(r'^(?P<x>.+?) 선생님 업무는\?$'), "{x} 선생님은 무슨 일 맡고 계셔"),
+    (re.compile(r'^(?P<x>.+?) 담당 선생님은\?$'), "{x}은 누가 맡아"),
+    (re.compile(r'^(?P<x>.+?) 뭐야\?$'), "{x} 알려주세요"),
+    (re.compile(r'^(?P<x>.+?) 알려줘$'), "{x} 좀 가르쳐줘"),
+]
+
+_NUMBER_IN_TEXT = re.compile(r'\d{2,3}-\d{3,4}-\d{4}|(?<![\d-])\d{4}(?![\d-])')
+
+# 선생님-업무 답변 문장 (두 표현이 같은 사실)
+_DUTY_SENTENCES = [
+    re.compile(r'^(?P<name>\S+) 선생님은 (?P<duty>.+) 업무를 담당하십니다\.$'),
+    re.compile(r'^(?P<duty>.+) 담당 선생님은 (?P<name>.+?) 선생님입니다\.$'),
+]
+
+# 역할 질문 라벨에 쓰는 CSV 연락처 질문 ("교감 선생님 내선번호 알려줘", "교무부장 내선번호는?")
+_CONTACT_QUESTION = re.compile(r'^(?P<role>.+?) (?:선생님 )?내선번호(?: 알려줘| 뭐야\?|는\?)$')
+
+
+def _normalize_answer(text: str) -> str:
+    return re.sub(r'\s+', ' ', str(text)).strip()
+
+
+def fact_key(answer: str) -> str:
+    """
+    답변 문장이 담은 사실 (순위 판정 단위)
+
+    번호 답변은 번호, 업무 답변은 (이름, 업무)로 묶고 나머지는 문장 그대로입니다.
+    명부 조회처럼 같은 사실을 다른 행의 문장으로 돌려주는 단계도 정답으로 셉니다.
+    """
+    answer = _normalize_answer(answer)
+    for pattern in _DUTY_SENTENCES:
+        m = pattern.match(answer)
+        if m:
+            return f"업무:{m.group('name')}:{m.group('duty')}"
+    numbers = _NUMBER_IN_TEXT.findall(answer) if '번호' in answer else []
+    if numbers:
+        return "번호:" + ",".join(sorted(set(numbers)))
+    return answer
+
+
+def _query_id(kind: str, query: str) -> str:
+    return f"{kind}-{hashlib.sha1(query.encode('utf-8')).hexdigest()[:8]}"
+
+
+def paraphrase(question: str) -> Optional[str]:
+    """규칙 기반 바꿔 말하기 (맞는 규칙이 없으면 None)"""
+    for pattern, template in PARAPHRASE_RULES:
+        m = pattern.match(question.strip())
+        if m:
+            return template.format(**m.groupdict())
+    return None
+
+
+def make_typo(question: str, rng: random.Random) -> Optional[str]:
+    """가장 긴 한글 단어에서 글자 하나를 빼거나 앞뒤 글자를 바꿈 (첫 글자는 유지)"""
+    words = question.split()
+    candidates = [i for i, w in enumerate(words) if re.fullmatch(r'[가-힣]{3,}', w)]
+    if not candidates:
+        return None
+    i = max(candidates, key=lambda j: len(words[j]))
+    word = words[i]
+    pos = rng.randrange(1, len(word) - 1)
+    if rng.random() < 0.5:
+        word = word[:pos] + word[pos + 1:]
+    else:
+        word = word[:pos] + word[pos + 1] + word[pos] + word[pos + 2:]
+    if word == words[i]:
+        return None
+    return " ".join(words[:i] + [word] + words[i + 1:])
+
+
+def build_query_set(csv_path: str = DEFAULT_CSV_PATH, per_kind: int = DEFAULT_PER_KIND,
+                    seed: int = DEFAULT_SEED) -> List[dict]:
+    """
+    CSV에서 라벨이 달린 질문 세트 생성 (같은 CSV와 seed면 항상 같은 세트)
+
+    Returns:
+        [{'id', 'kind', 'query', 'relevant': [정답 답변 문장들]}]
+        kind: exact / paraphrase / typo / reverse / role
+        (정답 문장과 같은 사실을 담은 다른 행도 채점 시 정답으로 인정, fact_key 참고)
+    """
+    corpus = get_corpus(csv_path)
+    rng = random.Random(seed)
+
+    # 같은 질문이 여러 행에 있으면 그 답변 모두 정답
+    answers_by_question: Dict[str, List[str]] = {}
+    for question, answer in zip(corpus.questions, corpus.answers):
+        answers = answers_by_question.setdefault(question.strip(), [])
+        if _normalize_answer(answer) not in answers:
+            answers.append(_normalize_answer(answer))
+
+    questions = sorted(answers_by_question)
+    rng.shuffle(questions)
+
+    queries: List[dict] = []
+
+    def add(kind: str, query: str, relevant: Sequence[str]):
+        queries.append({'id': _query_id(kind, query), 'kind': kind, 'query': query, 'relevant': sorted(relevant)})
+
+    for question in questions[:per_kind]:
+        add('exact', question, answers_by_question[question])
+
+    paraphrased = [(q, paraphrase(q)) for q in questions]
+    for question, query in [p for p in paraphrased if p[1]][:per_kind]:
+        add('paraphrase', query, answers_by_question[question])
+
+    typos = []
+    for question in questions:
+        query = make_typo(question, rng)
+        if query and query not in answers_by_question:
+            typos.append((question, query))
+        if len(typos) >= per_kind:
+            break
+    for question, query in typos:
+        add('typo', query, answers_by_question[question])
+
+    # 번호 역조회: 번호가 들어간 모든 답변이 정답
+    answers_by_number: Dict[str, set] = {}
+    for answer in corpus.answers:
+        for number in _NUMBER_IN_TEXT.findall(answer):
+            answers_by_number.setdefault(number, set()).add(_normalize_answer(answer))
+    numbers = sorted(answers_by_number)
+    rng.shuffle(numbers)
+    for number in numbers[:per_kind]:
+        add('reverse', number, answers_by_number[number])
+
+    # 역할 질문: CSV에서 같은 역할 이름으로 묻는 연락처 질문들의 답변이 정답
+    # (답변이 그 이름으로 시작하는 행만 역할로 봄, "고소임 선생님 내선번호"처럼 사람 이름으로 묻는 행은 제외.
+    #  명부 모듈로 라벨을 만들면 명부 조회 단계가 자기 출력으로 채점되므로 CSV만 사용)
+    answers_by_role: Dict[str, set] = {}
+    for question, answer in zip(corpus.questions, corpus.answers):
+        m = _CONTACT_QUESTION.match(question.strip())
+        if m and not re.match(r'^\d', m.group('role')) and answer.strip().startswith(m.group('role')):
+            answers_by_role.setdefault(m.group('role'), set()).add(_normalize_answer(answer))
+    roles = sorted(answers_by_role)
+    rng.shuffle(roles)
+    templates = ("{role} 번호 알려줘", "{role} 누구야", "{role} 연락처")
+    for i, role in enumerate(roles[:per_kind]):
+        add('role', templates[i % len(templates)].format(role=role), answers_by_role[role])
+
+    return queries
+
+
+def save_query_set(queries: List[dict], path: str):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(queries, f, ensure_ascii=False, indent=2)
+
+
+def load_query_set(path: str) -> List[dict]:
+    with open(path, 'r', encoding='utf-8') as f:
+        queries = json.load(f)
+    for query in queries:
+        query.setdefault('kind', 'custom')
+        query.setdefault('id', _query_id(query['kind'], query['query']))
+        query['relevant'] = [_normalize_answer(a) for a in query['relevant']]
+    return queries
+
+
+def query_set_hash(queries: List[dict]) -> str:
+    payload = json.dumps(queries, ensure_ascii=False, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+
+# --- 지표 ---
+
+def ranking_metrics(ranked: List[str], relevant: Sequence[str], k_values: Sequence[int]) -> dict:
+    """
+    질문 1개의 recall@k와 reciprocal rank
+
+    정답과 결과는 fact_key로 바꿔 비교합니다 (같은 사실을 담은 다른 행의 문장도 정답).
+    recall@k는 상위 k개 안의 정답 사실 수를 min(k, 정답 사실 수)로 나눈 값입니다
+    (정답이 k개보다 많은 역할/역조회 질문도 완벽한 순위면 1.0).
+    """
+    relevant = {fact_key(a) for a in relevant}
+    ranked = [fact_key(a) for a in ranked]
+    metrics = {}
+    for k in k_values:
+        hits = len(relevant.intersection(ranked[:k]))
+        metrics[f"recall@{k}"] = hits / min(k, len(relevant)) if relevant else 0.0
+    rank = next((i + 1 for i, answer in enumerate(ranked[:max(k_values)]) if answer in relevant), None)
+    metrics['mrr'] = 1.0 / rank if rank else 0.0
+    return metrics
+
+
+def _mean_metrics(rows: List[dict]) -> dict:
+    if not rows:
+        return {}
+    return {key: float(np.mean([row[key] for row in rows])) for key in rows[0]}
+
+
+def latency_summary(values_ms: Sequence[float]) -> dict:
+    if not values_ms:
+        return {}
+    values = np.asarray(values_ms, dtype=np.float64)
+    summary = {f"p{pct}": float(np.percentile(values, pct)) for pct in LATENCY_PERCENTILES}
+    summary['mean'] = float(values.mean())
+    summary['max'] = float(values.max())
+    return summary
+
+
+def _rss_mb() -> float:
+    import psutil
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+def _peak_rss_mb() -> float:
+    """프로세스 최대 RSS (Windows는 peak_wset, 그 외는 getrusage)"""
+    import psutil
+    info = psutil.Process().memory_info()
+    peak = getattr(info, 'peak_wset', None)
+    if peak is not None:
+        return peak / (1024 * 1024)
+    import resource
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux는 KB, macOS는 바이트 단위
+    return maxrss / (1024 * 1024) if sys.platform == 'darwin' else maxrss / 1024
+
+
+def _round(value, digits: int = 4):
+    """리포트 diff가 잡음 없이 보이도록 소수점 정리"""
+    if isinstance(value, float):
+        return round(value, digits)
+    if isinstance(value, dict):
+        return {k: _round(v, digits) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_round(v, digits) for v in value]
+    return value
+
+
+# --- 오프라인 대체물 (OpenAI / Cohere) ---
+
+def _char_ngrams(text: str, sizes=(1, 2, 3)) -> List[str]:
+    text = re.sub(r'\s+', ' ', text.lower())
+    return [text[i:i + n] for n in sizes for i in range(len(text) - n + 1) if text[i:i + n].strip()]
+
+
+def _make_offline_classes():
+    """LangChain 기반 대체 클래스 (LangChain이 필요할 때만 import)"""
+    from langchain_core.documents import BaseDocumentCompressor, Document
+    from langchain_core.embeddings import Embeddings
+    from langchain_core.language_models import BaseChatModel
+    from langchain_core.messages import AIMessage
+    from langchain_core.outputs import ChatGeneration, ChatResult
+
+    class HashingEmbeddings(Embeddings):
+        """글자 n-gram 해싱 임베딩 (OpenAIEmbeddings 대체, 결정적)"""
+
+        def __init__(self, dim: int = OFFLINE_EMBEDDING_DIM):
+            self.dim = dim
+
+        def _embed(self, text: str) -> List[float]:
+            vector = np.zeros(self.dim, dtype=np.float32)
+            for gram in _char_ngrams(text):
+                vector[zlib.crc32(gram.encode('utf-8')) % self.dim] += 1.0
+            norm = np.linalg.norm(vector)
+            return (vector / norm if norm else vector).tolist()
+
+        def embed_documents(self, texts: List[str]) -> List[List[float]]:
+            return [self._embed(text) for text in texts]
+
+        def embed_query(self, text: str) -> List[float]:
+            return self._embed(text)
+
+    class OfflineChatModel(BaseChatModel):
+        """
+        ChatOpenAI 대체 (결정적)
+
+        MultiQuery 프롬프트에는 원래 질문의 변형 3개를, 그 외 프롬프트에는 문맥의 첫 답변을 돌려줍니다.
+        """
+        latency_ms: float = 0.0
+
+        @property
+        def _llm_type(self) -> str:
+            return "offline-chat"
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            text = str(messages[-1].content)
+            questions = re.findall(r'(?:원본 질문|Original question|질문|Question)\s*:\s*(.+)', text)
+            question = questions[-1].strip() if questions else text.strip().splitlines()[-1]
+            if re.search(r'검색 질문|different versions', text):
+                words = question.split()
+                content = "\n".join([question, question.replace(" ", ""), " ".join(words[:-1]) or question])
+            else:
+                answers = re.findall(r'답변:\s*(.+)', text)
+                content = answers[0].strip() if answers else question
+            if self.latency_ms:
+                time.sleep(self.latency_ms / 1000)
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    class OfflineReranker(BaseDocumentCompressor):
+        """CohereRerank 대체 (질문 글자 bigram이 문서에 들어 있는 비율로 정렬, 결정적)"""
+        top_n: int = 3
+        model: str = "offline"
+        cohere_api_key: Optional[str] = None
+        latency_ms: float = 0.0
+
+        def compress_documents(self, documents, query, callbacks=None):
+            query_grams = set(_char_ngrams(query, sizes=(2,)))
+            scored = []
+            for doc in documents:
+                doc_grams = set(_char_ngrams(doc.page_content, sizes=(2,)))
+                score = len(query_grams & doc_grams) / len(query_grams) if query_grams else 0.0
+                scored.append((doc, score))
+            scored.sort(key=lambda x: x[1], reverse=True)
+            if self.latency_ms:
+                time.sleep(self.latency_ms / 1000)
+            return [
+                Document(doc.page_content, metadata={**doc.metadata, "relevance_score": score})
+                for doc, score in scored[:self.top_n]
+            ]
+
+    return HashingEmbeddings, OfflineChatModel, OfflineReranker
+
+
+def enable_offline_mode(latency_ms: float = 0.0):
+    """
+    OpenAI 임베딩/LLM과 Cohere Rerank를 로컬 대체물로 교체
+
+    RAG 모듈들이 import하기 전에 호출해야 합니다 (모듈 import 시점에 이름을 가져가므로).
+    latency_ms를 주면 LLM/리랭커 호출마다 그만큼 기다려 네트워크 왕복을 흉내 냅니다.
+    """
+    import embedding_cache
+    import langchain_cohere
+    import langchain_openai
+    from embedding_cache import CachedEmbeddings
+
+    HashingEmbeddings, OfflineChatModel, OfflineReranker = _make_offline_classes()
+
+    # 키가 없으면 초기화 단계에서 건너뛰는 경로가 있으므로 더미 키를 넣어 실제와 같은 경로를 타게 함
+    os.environ['OPENAI_API_KEY'] = "offline"
+    os.environ['COHERE_API_KEY'] = "offline"
+
+    shared = {}
+
+    def get_offline_embeddings(model: str, provider: str = "openai", **kwargs):
+        if (provider, model) not in shared:
+            shared[(provider, model)] = CachedEmbeddings(HashingEmbeddings(), model_name=f"offline-hash:{model}")
+        return shared[(provider, model)]
+
+    embedding_cache.get_shared_embeddings = get_offline_embeddings
+    langchain_openai.ChatOpenAI = partial(OfflineChatModel, latency_ms=latency_ms)
+    langchain_cohere.CohereRerank = partial(OfflineReranker, latency_ms=latency_ms)
+
+
+# --- 측정 대상 ---
+
+def available_targets() -> List[str]:
+    from rag_engines import ENGINES
+    return list(ENGINES) + list(PIPELINE_CONFIGS)
+
+
+class _EngineTarget:
+    """rag_engines.Retriever 측정"""
+
+    def __init__(self, name: str, csv_path: str):
+        from rag_engines import create_retriever
+        self.retriever = create_retriever(name, csv_path)
+
+    def search(self, query: str, top_k: int) -> dict:
+        response = self.retriever.search(query, top_k=top_k)
+        return {'answers': [r.answer for r in response.results], 'timings': response.timings}
+
+    def search_many(self, queries: List[str], top_k: int) -> Optional[List[List[str]]]:
+        return [[r.answer for r in response.results] for response in self.retriever.search_many(queries, top_k)]
+
+    def method(self) -> dict:
+        return {
+            'requested': self.retriever.requested_method or self.retriever.name,
+            'effective': self.retriever.effective_method,
+        }
+
+
+class _PipelineTarget:
+    """utils.init_rag_system의 get_rag_answer 측정 (결과 캐시는 질문마다 비움)"""
+
+    def __init__(self, settings: Dict[str, str], csv_path: str):
+        os.environ.update(settings)
+        self.settings = settings
+        import utils
+        self.pipeline_info = utils.rag_pipeline_info
+        from rag_cache import rag_result_cache, rag_semantic_cache
+        self.caches = (rag_result_cache, rag_semantic_cache)
+        status, self.get_rag_answer, _ = utils.init_rag_system()
+        if status != "success":
+            raise RuntimeError("init_rag_system 실패")
+
+    def search(self, query: str, top_k: int) -> dict:
+        for cache in self.caches:
+            cache.clear()
+        result = self.get_rag_answer(query)
+        timings = dict(result.get('timings') or {})
+        timings['tier:' + str(result.get('tier', 'unknown'))] = 1.0
+        return {'answers': [r['answer'] for r in result['results'][:top_k]], 'timings': timings}
+
+    def search_many(self, queries: List[str], top_k: int):
+        return None
+
+    def method(self) -> dict:
+        # 비교 기준은 리랭커 (나머지 실제 설정은 details로 기록)
+        return {
+            'requested': self.settings.get('RAG_RERANKER', 'none'),
+            'effective': self.pipeline_info.get('reranker', 'unknown'),
+            'details': dict(self.pipeline_info),
+        }
+
+
+def _open_target(name: str, csv_path: str):
+    if name in PIPELINE_CONFIGS:
+        return _PipelineTarget(PIPELINE_CONFIGS[name], csv_path)
+    return _EngineTarget(name, csv_path)
+
+
+def run_target(name: str, queries: List[dict], csv_path: str, k_values: Sequence[int],
+               repeat: int = 1, build_only: bool = False) -> dict:
+    """
+    현재 프로세스에서 대상 하나 측정
+
+    Returns:
+        {'cold_start_ms', 'rss_mb', 'peak_rss_mb', 'method', 'metrics', 'by_kind', 'latency_ms', 'batch', 'stages'}
+        method는 {'requested', 'effective', 'fallback'} (선택 의존성이 없어 다른 방식으로 대체되었으면 fallback=True)
+    """
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    target = _open_target(name, csv_path)
+    report = {'cold_start_ms': (time.perf_counter() - start) * 1000}
+    method = target.method()
+    method['fallback'] = method['requested'] != method['effective']
+    report['method'] = method
+    if method['fallback']:
+        print(f"[ERROR] {name}: 요청한 방식({method['requested']}) 대신 {method['effective']}(으)로 실행됨")
+    if build_only:
+        report['peak_rss_mb'] = _peak_rss_mb()
+        return report
+
+    top_k = max(k_values)
+    latencies: List[float] = []
+    stage_totals: Dict[str, float] = {}
+    per_query: Dict[str, dict] = {}
+    for _ in range(max(1, repeat)):
+        for query in queries:
+            start = time.perf_counter()
+            result = target.search(query['query'], top_k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            for stage, value in result['timings'].items():
+                stage_totals[stage] = stage_totals.get(stage, 0.0) + value
+            per_query[query['id']] = ranking_metrics(result['answers'], query['relevant'], k_values)
+
+    runs = max(1, repeat) * len(queries)
+    report['latency_ms'] = latency_summary(latencies)
+    # 단계별 평균 ms (파이프라인의 tier:* 항목은 그 단계에서 답한 질문 비율)
+    report['stages'] = {stage: total / runs for stage, total in sorted(stage_totals.items())}
+    report['metrics'] = _mean_metrics(list(per_query.values()))
+    report['by_kind'] = {
+        kind: _mean_metrics([per_query[q['id']] for q in queries if q['kind'] == kind])
+        for kind in sorted({q['kind'] for q in queries})
+    }
+
+    start = time.perf_counter()
+    batch = target.search_many([q['query'] for q in queries], top_k)
+    if batch is not None:
+        batch_ms = (time.perf_counter() - start) * 1000
+        report['batch'] = {'total_ms': batch_ms, 'per_query_ms': batch_ms / len(queries)}
+
+    report['rss_mb'] = _rss_mb() - rss_before
+    report['peak_rss_mb'] = _peak_rss_mb()
+    report['failed_queries'] = sorted(qid for qid, m in per_query.items() if m['mrr'] == 0.0)
+    return report
+
+
+# --- 프로세스 분리 실행 ---
+
+def _run_worker(args) -> int:
+    if args.offline:
+        enable_offline_mode(args.offline_latency_ms)
+    queries = load_query_set(args.queries)
+    try:
+        report = run_target(args.worker, queries, args.csv, args.k, args.repeat, args.build_only)
+    except Exception as e:
+        import traceback
+        report = {'error': f"{type(e).__name__}: {e}", 'traceback': traceback.format_exc()}
+    with open(args.worker_out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False)
+    return 0
+
+
+def _spawn(target: str, args, workdir: str, queries_path: str, csv_path: str, build_only: bool) -> dict:
+    out_path = os.path.join(workdir, f".bench_{target}.json")
+    command = [
+        sys.executable, os.path.abspath(__file__), "--worker", target,
+        "--queries", queries_path, "--worker-out", out_path, "--csv", csv_path,
+        "--k", ",".join(map(str, args.k)), "--repeat", str(args.repeat),
+    ]
+    if args.offline:
+        command += ["--offline", "--offline-latency-ms", str(args.offline_latency_ms)]
+    if build_only:
+        command.append("--build-only")
+
+    start = time.perf_counter()
+    proc = subprocess.run(command, cwd=workdir, capture_output=True, text=True, encoding='utf-8', errors='replace')
+    wall_ms = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0 or not os.path.exists(out_path):
+        return {'error': f"worker 종료 코드 {proc.returncode}", 'stderr': proc.stderr[-2000:]}
+    with open(out_path, 'r', encoding='utf-8') as f:
+        report = json.load(f)
+    os.remove(out_path)
+    # 인터프리터 시작과 import까지 포함한 시간
+    report['process_wall_ms'] = wall_ms
+    return report
+
+
+def run_benchmark(args) -> dict:
+    csv_path = os.path.abspath(args.csv)
+    queries = load_query_set(args.queries) if args.queries else build_query_set(csv_path, args.per_kind, args.seed)
+
+    # 오프라인은 빈 작업 폴더에서 실행 (실제 캐시와 분리, 첫 실행이 진짜 콜드 스타트)
+    temp_dir = None
+    if args.workdir:
+        workdir = os.path.abspath(args.workdir)
+    elif args.offline:
+        workdir = temp_dir = tempfile.mkdtemp(prefix="rag_bench_")
+    else:
+        workdir = os.getcwd()
+    os.makedirs(os.path.join(workdir, "data"), exist_ok=True)
+    worker_csv = os.path.join(workdir, DEFAULT_CSV_PATH)
+    if os.path.abspath(worker_csv) != csv_path:
+        shutil.copyfile(csv_path, worker_csv)
+
+    queries_path = os.path.join(workdir, ".bench_queries.json")
+    save_query_set(queries, queries_path)
+
+    targets = args.targets or available_targets()
+    results = {}
+    try:
+        for target in targets:
+            print(f"[DEBUG] 벤치마크 실행: {target}")
+            report = _spawn(target, args, workdir, queries_path, DEFAULT_CSV_PATH, build_only=False)
+            if 'error' not in report:
+                # 같은 작업 폴더의 디스크 캐시/인덱스를 재사용하는 두 번째 시작
+                warm = _spawn(target, args, workdir, queries_path, DEFAULT_CSV_PATH, build_only=True)
+                report['warm_start_ms'] = warm.get('cold_start_ms')
+            else:
+                print(f"[ERROR] {target} 측정 실패: {report['error']}")
+            results[target] = report
+    finally:
+        os.remove(queries_path)
+        if temp_dir and not args.keep_workdir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    kinds = {}
+    for query in queries:
+        kinds[query['kind']] = kinds.get(query['kind'], 0) + 1
+
+    return _round({
+        'report_version': REPORT_VERSION,
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'commit': _git_commit(),
+        },
+        'config': {
+            'offline': args.offline,
+            'offline_latency_ms': args.offline_latency_ms if args.offline else None,
+            'k_values': list(args.k),
+            'repeat': args.repeat,
+            'seed': args.seed,
+            'queries': len(queries),
+            'query_kinds': kinds,
+            'query_set_sha': query_set_hash(queries),
+            'csv_sha256': get_corpus(csv_path).sha256,
+        },
+        'targets': results,
+    })
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        proc = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)))
+        return proc.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare_reports(old: dict, new: dict, k: int = 3) -> List[str]:
+    """두 리포트의 대상별 recall@k / MRR / p95 변화"""
+    lines = []
+    if old.get('report_version') != new.get('report_version'):
+        lines.append("[DEBUG] 리포트 버전이 달라 채점 방식이 다를 수 있습니다.")
+    if old.get('config', {}).get('query_set_sha') != new.get('config', {}).get('query_set_sha'):
+        lines.append("[DEBUG] 질문 세트가 달라 품질 지표는 직접 비교할 수 없습니다.")
+    for target, report in new.get('targets', {}).items():
+        before = old.get('targets', {}).get(target)
+        if not before or 'error' in before or 'error' in report:
+            continue
+        recall_key = f"recall@{k}"
+        lines.append(
+            f"{target + _fallback_mark(report):16s} {recall_key} {before['metrics'].get(recall_key, 0):.3f} -> {report['metrics'].get(recall_key, 0):.3f}  "
+            f"MRR {before['metrics']['mrr']:.3f} -> {report['metrics']['mrr']:.3f}  "
+            f"p95 {before['latency_ms']['p95']:.2f} -> {report['latency_ms']['p95']:.2f} ms"
+        )
+    return lines
+
+
+def _fallback_mark(result: dict) -> str:
+    """요청한 방식 대신 다른 방식으로 실행된 대상 표시 ("*")"""
+    return "*" if result.get('method', {}).get('fallback') else ""
+
+
+def format_summary(report: dict) -> List[str]:
+    k_values = report['config']['k_values']
+    header = f"{'target':16s} " + " ".join(f"R@{k:<4d}" for k in k_values) + "  MRR     p50ms   p95ms   p99ms   cold ms   peakMB"
+    lines = [header]
+    for target, result in report['targets'].items():
+        if 'error' in result:
+            lines.append(f"{target:16s} 실패: {result['error']}")
+            continue
+        metrics, latency = result['metrics'], result['latency_ms']
+        lines.append(
+            f"{target + _fallback_mark(result):16s} " + " ".join(f"{metrics[f'recall@{k}']:.3f}" for k in k_values)
+            + f"  {metrics['mrr']:.3f}  {latency['p50']:6.2f}  {latency['p95']:6.2f}  {latency['p99']:6.2f}"
+            + f"  {result['cold_start_ms']:8.1f}  {result['peak_rss_mb']:7.1f}"
+        )
+    fallbacks = [
+        f"  *{target}: {result['method']['requested']} -> {result['method']['effective']}"
+        for target, result in report['targets'].items() if _fallback_mark(result)
+    ]
+    if fallbacks:
+        lines.append("* 요청한 방식을 쓸 수 없어 대체된 대상 (다른 대상과 같은 설정으로 측정됨):")
+        lines.extend(fallbacks)
+    return lines
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="RAG 검색 품질/지연시간 벤치마크")
+    parser.add_argument("--csv", default=DEFAULT_CSV_PATH)
+    parser.add_argument("--targets", type=lambda s: [t.strip() for t in s.split(",") if t.strip()],
+                        help="측정할 엔진/파이프라인 (쉼표 구분, 기본: 전체)")
+    parser.add_argument("--queries", help="라벨 질문 세트 JSON (없으면 CSV에서 생성)")
+    parser.add_argument("--save-queries", help="생성한 질문 세트를 저장하고 종료")
+    parser.add_argument("--per-kind", type=int, default=DEFAULT_PER_KIND, help="종류별 질문 수")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--k", type=lambda s: [int(x) for x in s.split(",")], default=list(DEFAULT_K_VALUES))
+    parser.add_argument("--repeat", type=int, default=1, help="지연시간 측정 반복 횟수")
+    parser.add_argument("--offline", action="store_true", help="OpenAI/Cohere 대신 결정적 로컬 대체물 사용")
+    parser.add_argument("--offline-latency-ms", type=float, default=0.0, help="오프라인 LLM/리랭커 호출당 지연")
+    parser.add_argument("--workdir", help="작업 폴더 (캐시/인덱스 위치)")
+    parser.add_argument("--keep-workdir", action="store_true")
+    parser.add_argument("--out", default="rag_benchmark.json", help="JSON 리포트 경로")
+    parser.add_argument("--compare", help="비교할 이전 리포트")
+    # 내부용 (대상별 하위 프로세스)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-out", help=argparse.SUPPRESS)
+    parser.add_argument("--build-only", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = _parse_args(argv)
+    if args.worker:
+        return _run_worker(args)
+
+    if args.save_queries:
+        queries = build_query_set(args.csv, args.per_kind, args.seed)
+        save_query_set(queries, args.save_queries)
+        print(f"질문 {len(queries)}개 저장: {args.save_queries}")
+        return 0
+
+    report = run_benchmark(args)
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+    print("\n".join(format_summary(report)))
+    print(f"\n리포트 저장: {args.out}")
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            print("\n".join(compare_reports(json.load(f), report)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""
+정보 검색 결과 캐시
+같은 질문(정확히 일치 또는 의미상 거의 같은 질문)이 다시 들어오면
+RAG 체인을 다시 돌리지 않고 저장된 결과를 바로 돌려줍니다.
+"""
+import copy
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+# 기본 캐시 크기 / 유효 시간(초)
+DEFAULT_MAX_SIZE = 256
+DEFAULT_TTL_SECONDS = 60 * 60
+
+# 의미 캐시 기본 크기 / 코사인 유사도 임계값
+# (임계값이 낮으면 "1-1 선생님"과 "1-2 선생님"처럼 다른 질문이 같은 답을 받을 수 있어 높게 둠)
+DEFAULT_SEMANTIC_MAX_SIZE = 128
+DEFAULT_SEMANTIC_THRESHOLD = 0.97
+
+
+def normalize_query(query: str) -> str:
+    """캐시 키용 질문 정규화 (유니코드 정규화, 소문자, 공백 정리, 끝 문장부호 제거)"""
+    text = unicodedata.normalize('NFC', str(query)).lower().strip()
+    text = re.sub(r'\s+', ' ', text)
+    return text.rstrip(' ?!.~')
+
+
+class QueryResultCache:
+    """크기(LRU)와 유효 시간(TTL) 제한이 있는 프로세스 전역 결과 캐시"""
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.index_version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # 정규화된 질문 -> (저장 시각, 결과)
+        self._lock = threading.Lock()
+
+    def get(self, query: str) -> Optional[dict]:
+        """캐시된 결과 반환 (없거나 만료되었으면 None)"""
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, result = entry
+                if time.monotonic() - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return copy.deepcopy(result)
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, query: str, result: dict):
+        """결과 저장 (가장 오래 안 쓰인 항목부터 제거)"""
+        key = normalize_query(query)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), copy.deepcopy(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def set_index_version(self, version):
+        """인덱스 버전이 바뀌면 저장된 결과를 모두 무효화"""
+        with self._lock:
+            if version != self.index_version:
+                self._entries.clear()
+                self.index_version = version
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+
+def _number_tokens(query: str) -> frozenset:
+    return frozenset(re.findall(r'\d+', normalize_query(query)))
+
+
+class SemanticQueryCache:
+    """
+    의미상 거의 같은 질문을 위한 캐시
+
+    최근 답한 질문들의 정규화된 임베딩을 작은 행렬로 들고 있다가, 새 질문과의 코사인 유사도를
+    한 번의 행렬곱으로 계산합니다. 임계값 이상이면 LLM/리랭커 없이 저장된 결과를 돌려줍니다.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_SEMANTIC_MAX_SIZE,
+                 threshold: float = DEFAULT_SEMANTIC_THRESHOLD,
+                 ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.max_size = max_size
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.index_version = None
+        self.hits = 0
+        self.misses = 0
+
+        self._vectors = None  # (max_size, dim) float32, 첫 저장 시 생성
+        self._valid = np.zeros(max_size, dtype=bool)
+        self._stored_at = np.zeros(max_size)
+        self._last_used = np.zeros(max_size)
+        self._queries = [None] * max_size
+        self._numbers = [None] * max_size
+        self._results = [None] * max_size
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm > 0 else v
+
+    def lookup(self, query: str, vector) -> Optional[dict]:
+        """임계값 이상으로 비슷한 질문의 결과 반환 (없으면 None)"""
+        with self._lock:
+            if self._vectors is None or not self._valid.any():
+                self.misses += 1
+                return None
+
+            now = time.monotonic()
+            self._valid &= (now - self._stored_at) <= self.ttl_seconds
+
+            sims = self._vectors @ self._normalize(vector)
+            sims[~self._valid] = -np.inf
+            best = int(np.argmax(sims))
+
+            # 숫자(반/내선번호 등)가 다르면 비슷해 보여도 다른 질문으로 취급
+            if sims[best] >= self.threshold and self._numbers[best] == _number_tokens(query):
+                self._last_used[best] = now
+                self.hits += 1
+                result = copy.deepcopy(self._results[best])
+                result['matched_query'] = self._queries[best]
+                result['similarity'] = float(sims[best])
+                return result
+
+            self.misses += 1
+            return None
+
+    def add(self, query: str, vector, result: dict):
+        """결과 저장 (빈 자리가 없으면 가장 오래 안 쓰인 항목 교체)"""
+        v = self._normalize(vector)
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != v.shape[0]:
+                self._vectors = np.zeros((self.max_size, v.shape[0]), dtype=np.float32)
+                self._valid[:] = False
+
+            free = np.flatnonzero(~self._valid)
+            slot = int(free[0]) if free.size else int(np.argmin(self._last_used))
+
+            now = time.monotonic()
+            self._vectors[slot] = v
+            self._valid[slot] = True
+            self._stored_at[slot] = now
+            self._last_used[slot] = now
+            self._queries[slot] = query
+            self._numbers[slot] = _number_tokens(query)
+            self._results[slot] = copy.deepcopy(result)
+
+    def set_index_version(self, version):
+        """인덱스 버전이 바뀌면 저장된 결과를 모두 무효화"""
+        with self._lock:
+            if version != self.index_version:
+                self._valid[:] = False
+                self.index_version = version
+
+    def clear(self):
+        with self._lock:
+            self._valid[:] = False
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'size': int(self._valid.sum()),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+
+# 프로세스 전체에서 공유하는 결과 캐시
+rag_result_cache = QueryResultCache()
+rag_semantic_cache = SemanticQueryCache()
@@ -0,0 +1,68 @@
+"""
+공유 학교 정보 코퍼스
+school_info.csv를 프로세스에서 한 번만 읽어 모든 RAG 엔진이 같은 질문/답변 열을 공유합니다.
+공유하는 열은 튜플이라 한 엔진이 고칠 수 없고, DataFrame(data)은 부를 때마다 사본을 돌려줍니다.
+"""
+import os
+import threading
+from typing import Dict, Iterator, Tuple
+
+import pandas as pd
+
+from rag_store import file_sha256, row_doc_id
+
+DEFAULT_CSV_PATH = "data/school_info.csv"
+
+
+class SchoolCorpus:
+    """질문-답변 코퍼스 (읽기 전용: 열은 튜플, data는 사본)"""
+
+    def __init__(self, csv_path: str = DEFAULT_CSV_PATH):
+        self.csv_path = csv_path
+        self.sha256 = file_sha256(csv_path)
+
+        # 쉼표가 따옴표 없이 들어간 행이 있어도 전체 로드가 실패하지 않도록 건너뜀
+        data = pd.read_csv(csv_path, on_bad_lines='warn', quotechar='"')
+        data = data.dropna(subset=['question', 'answer']).reset_index(drop=True)
+        data['question'] = data['question'].astype(str)
+        data['answer'] = data['answer'].astype(str)
+        data['full_text'] = (data['question'] + ' ' + data['answer']).str.strip()
+        self._data = data
+
+        self.questions = tuple(data['question'])
+        self.answers = tuple(data['answer'])
+        self.full_texts = tuple(data['full_text'])
+        self.doc_ids = tuple(row_doc_id(q) for q in self.questions)
+
+    @property
+    def data(self) -> pd.DataFrame:
+        """question/answer/full_text DataFrame 사본 (수정해도 공유 코퍼스에는 영향 없음)"""
+        return self._data.copy()
+
+    def __len__(self):
+        return len(self.questions)
+
+    def rows(self) -> Iterator[Tuple[str, str, str]]:
+        """(doc_id, question, answer) 순회"""
+        return zip(self.doc_ids, self.questions, self.answers)
+
+
+_corpora: Dict[str, Tuple[tuple, SchoolCorpus]] = {}
+_corpora_lock = threading.Lock()
+
+
+def get_corpus(csv_path: str = DEFAULT_CSV_PATH) -> SchoolCorpus:
+    """
+    공유 코퍼스 반환 (CSV 파일이 바뀌었을 때만 다시 읽음)
+
+    파일 크기와 수정 시각만 확인하므로 호출 비용이 거의 없습니다.
+    """
+    path = os.path.abspath(csv_path)
+    stat = os.stat(path)
+    signature = (stat.st_size, stat.st_mtime_ns)
+    with _corpora_lock:
+        cached = _corpora.get(path)
+        if cached is None or cached[0] != signature:
+            cached = (signature, SchoolCorpus(csv_path))
+            _corpora[path] = cached
+        return cached[1]
@@ -0,0 +1,343 @@
+"""
+공용 검색 엔진 인터페이스
+여러 RAG 구현을 같은 Retriever 인터페이스로 감싸 설정만으로 바꿔 끼우고 나란히 비교할 수 있게 합니다.
+모든 엔진은 rag_corpus의 공유 코퍼스를 사용하므로 CSV를 엔진마다 다시 읽지 않습니다.
+
+    retriever = get_retriever()            # RAG_ENGINE 환경 변수 (기본 "lite")
+    response = retriever.search("교장 선생님 번호", top_k=3)
+    response.results[0].score, response.timings
+
+앱(utils.init_rag_system)의 단계별 라우터는 keyword 단계에 get_lexical_retriever()를 쓰므로
+RAG_ENGINE이 LEXICAL_ENGINES 중 하나면 그 엔진, 아니면 lite를 씁니다.
+"8401"처럼 숫자가 대부분인 질문은 엔진과 관계없이 교직원 명부의 번호 역인덱스에서 바로 찾습니다.
+"""
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from rag_corpus import DEFAULT_CSV_PATH, get_corpus
+from rag_store import row_doc_id
+from staff_directory import get_staff_directory, is_number_query
+
+# 엔진 선택 환경 변수 / 기본 엔진
+ENGINE_ENV = "RAG_ENGINE"
+DEFAULT_ENGINE = "lite"
+
+# 라우터 keyword 단계에 쓸 수 있는 엔진 (LLM/OpenAI 임베딩 호출이 없는 싼 검색)
+LEXICAL_ENGINES = ("lite", "tfidf", "v2")
+
+
+class RetrievalResult:
+    """검색 결과 1건"""
+    __slots__ = ('question', 'answer', 'score', 'doc_id', 'source')
+
+    def __init__(self, question: str, answer: str, score: Optional[float], doc_id: str, source: str):
+        self.question = question
+        self.answer = answer
+        self.score = score      # 엔진이 계산한 실제 점수 (엔진마다 척도가 다름, 없으면 None)
+        self.doc_id = doc_id
+        self.source = source    # 엔진 이름
+
+    def to_dict(self) -> dict:
+        """기존 결과 딕셔너리 형식으로 변환"""
+        return {
+            'answer': self.answer,
+            'confidence': float(self.score) if self.score is not None else 0.0,
+            'source': self.source,
+            'question': self.question,
+        }
+
+    def __repr__(self):
+        return f"RetrievalResult(score={self.score!r}, question={self.question!r})"
+
+
+class RetrievalResponse:
+    """질문 1개에 대한 검색 응답"""
+    __slots__ = ('query', 'engine', 'results', 'timings')
+
+    def __init__(self, query: str, engine: str, results: List[RetrievalResult], timings: Dict[str, float]):
+        self.query = query
+        self.engine = engine
+        self.results = results
+        self.timings = timings  # 단계 이름 -> 소요 ms ('total' 포함)
+
+    def to_dict(self) -> dict:
+        return {
+            'results': [result.to_dict() for result in self.results],
+            'method': self.engine,
+            'timings': dict(self.timings),
+        }
+
+
+class Retriever:
+    """
+    검색 엔진 기본 클래스
+
+    하위 클래스는 _build()와 _search()를 구현하고, 일괄 검색을 더 빠르게 할 수 있으면 _search_many()도 구현합니다.
+    _search()는 (question, answer, score) 튜플 리스트를 돌려주고, 세부 단계 시간은 timings에 기록합니다.
+    """
+    name = "base"
+    # 요청한 검색 방식 (None이면 name), 실제 방식은 effective_method
+    requested_method: Optional[str] = None
+
+    def __init__(self, csv_path: str = DEFAULT_CSV_PATH):
+        self.corpus = get_corpus(csv_path)
+        self.directory = get_staff_directory(csv_path)
+        start = time.perf_counter()
+        self._build()
+        self.build_ms = (time.perf_counter() - start) * 1000
+
+    def _build(self):
+        raise NotImplementedError
+
+    def _search(self, query: str, top_k: int, timings: Dict[str, float]) -> List[Tuple[str, str, Optional[float]]]:
+        raise NotImplementedError
+
+    def _search_many(self, queries: List[str], top_k: int,
+                     timings: Dict[str, float]) -> List[List[Tuple[str, str, Optional[float]]]]:
+        return [self._search(query, top_k, timings) for query in queries]
+
+    def _records(self, matches) -> List[RetrievalResult]:
+        return [
+            RetrievalResult(question, answer, score, row_doc_id(question), self.name)
+            for question, answer, score in matches
+        ]
+
+    def _search_number(self, query: str, top_k: int) -> List[Tuple[str, str, Optional[float]]]:
+        """숫자가 대부분인 질문이면 번호 역인덱스 결과 (아니면 빈 리스트)"""
+        if not is_number_query(query):
+            return []
+        return [(question, answer, 1.0) for question, answer in self.directory.find_by_number(query)[:top_k]]
+
+    def search(self, query: str, top_k: int = 3) -> RetrievalResponse:
+        timings: Dict[str, float] = {}
+        start = time.perf_counter()
+        matches = _timed(timings, 'number', self._search_number, query, top_k) if query.strip() else []
+        if query.strip() and not matches:
+            matches = self._search(query, top_k, timings)
+        timings['total'] = (time.perf_counter() - start) * 1000
+        return RetrievalResponse(query, self.name, self._records(matches), timings)
+
+    @property
+    def effective_method(self) -> str:
+        """실제로 쓰고 있는 검색 방식 (선택 의존성이 없어 대체되면 requested_method와 다름)"""
+        return self.requested_method or self.name
+
+    @property
+    def questions(self) -> List[str]:
+        return self.corpus.questions
+
+    @property
+    def answers(self) -> List[str]:
+        return self.corpus.answers
+
+    def search_similar(self, query: str, top_k: int = 3) -> List[Tuple[str, str, float]]:
+        """(question, answer, score) 튜플 리스트 (rag_router.TieredRetrievalRouter의 lexical_engine 인터페이스)"""
+        return [
+            (result.question, result.answer, float(result.score) if result.score is not None else 0.0)
+            for result in self.search(query, top_k).results
+        ]
+
+    def search_many(self, queries: List[str], top_k: int = 3) -> List[RetrievalResponse]:
+        """여러 질문 일괄 검색 (timings는 일괄 처리 전체 시간, 번호로 찾은 질문은 엔진에 넘기지 않음)"""
+        timings: Dict[str, float] = {}
+        start = time.perf_counter()
+        queries = list(queries)
+        batches = [_timed(timings, 'number', self._search_number, query, top_k) for query in queries]
+        remaining = [i for i, matches in enumerate(batches) if not matches]
+        if remaining:
+            for i, matches in zip(remaining, self._search_many([queries[i] for i in remaining], top_k, timings)):
+                batches[i] = matches
+        timings['total'] = (time.perf_counter() - start) * 1000
+        return [
+            RetrievalResponse(query, self.name, self._records(matches), dict(timings))
+            for query, matches in zip(queries, batches)
+        ]
+
+
+def _timed(timings: Dict[str, float], stage: str, func, *args):
+    start = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + (time.perf_counter() - start) * 1000
+
+
+class LiteRetriever(Retriever):
+    """rag_system_lite: 완전 일치 + n-gram BM25 (네트워크 없음)"""
+    name = "lite"
+
+    def _build(self):
+        from rag_system_lite import SchoolInfoRAGLite
+        self.engine = SchoolInfoRAGLite(self.corpus.csv_path)
+
+    def _search(self, query, top_k, timings):
+        exact = _timed(timings, 'exact', self.engine.search_by_exact_match, query)
+        keyword = _timed(timings, 'bm25', self.engine.search_by_keywords, query, top_k + len(exact))
+        return (exact + [m for m in keyword if not exact or m[0] != exact[0][0]])[:top_k]
+
+
+class TfidfRetriever(Retriever):
+    """rag_system: TF-IDF 코사인 유사도"""
+    name = "tfidf"
+
+    def _build(self):
+        from rag_system import SchoolInfoRAG
+        self.engine = SchoolInfoRAG(self.corpus.csv_path)
+
+    def _search(self, query, top_k, timings):
+        return _timed(timings, 'search', self.engine.search_similar, query, top_k)
+
+    def _search_many(self, queries, top_k, timings):
+        return _timed(timings, 'search', self.engine.search_many, queries, top_k)
+
+
+class V2Retriever(Retriever):
+    """rag_system_v2: sentence-transformers > TF-IDF > 키워드 중 하나"""
+    name = "v2"
+    retrieval_mode = "auto"
+    requested_method = "sentence_transformers"
+
+    def _build(self):
+        from rag_system_v2 import SchoolInfoRAG
+        self.engine = SchoolInfoRAG(self.corpus.csv_path, retrieval_mode=self.retrieval_mode)
+
+    @property
+    def effective_method(self):
+        return self.engine.method_name
+
+    def _search(self, query, top_k, timings):
+        return _timed(timings, 'search', self.engine.search_similar, query, top_k)
+
+    def _search_many(self, queries, top_k, timings):
+        return _timed(timings, 'search', self.engine.search_many, queries, top_k)
+
+
+class HybridRetriever(V2Retriever):
+    """rag_system_v2 hybrid: TF-IDF + dense RRF"""
+    name = "hybrid"
+    retrieval_mode = "hybrid"
+    requested_method = "hybrid"
+
+
+class _DocumentRetriever(Retriever):
+    """LangChain 문서를 돌려주는 엔진 공통 처리 (메타데이터의 질문/답변과 점수 사용)"""
+
+    def _documents(self, query: str):
+        raise NotImplementedError
+
+    def _search(self, query, top_k, timings):
+        from rag_retrievers import document_score
+
+        docs = _timed(timings, 'retrieve', self._documents, query)
+        matches = []
+        seen = set()
+        for doc in docs:
+            answer = doc.metadata.get('answer', doc.page_content)
+            if answer in seen:
+                continue
+            seen.add(answer)
+            # 리랭커 관련도 > 코사인 유사도 > MultiQuery RRF 점수 순으로 사용
+            score = document_score(doc)
+            if score is None:
+                score = doc.metadata.get('rrf_score')
+            matches.append((doc.metadata.get('question', ''), answer, score))
+            if len(matches) >= top_k:
+                break
+        return matches
+
+
+class MultiQueryEngine(_DocumentRetriever):
+    """rag_system_multiquery: FAISS + MultiQuery (OpenAI 필요)"""
+    name = "multiquery"
+
+    def _build(self):
+        from rag_system_multiquery import MultiQueryRAGSystem
+        self.engine = MultiQueryRAGSystem(self.corpus.csv_path)
+
+    @property
+    def effective_method(self):
+        # MultiQuery 검색기를 만들지 못하면 search_documents가 기본 벡터 검색으로 대체
+        return self.name if self.engine.multi_query_retriever else "vector"
+
+    def _documents(self, query):
+        return self.engine.search_documents(query)
+
+
+class DocExpansionEngine(MultiQueryEngine):
+    """rag_system_multiquery 인덱스 + 문서 쪽 확장 변형, 질문 생성 없이 벡터 검색만 (LLM 호출 없음)"""
+    name = "docexpand"
+
+    @property
+    def effective_method(self):
+        return self.name
+
+    def _documents(self, query):
+        return self.engine.search_documents(query, use_multi_query=False)
+
+
+class AdvancedEngine(_DocumentRetriever):
+    """rag_system_advanced: 청크 분할 FAISS + MultiQuery (OpenAI 필요)"""
+    name = "advanced"
+
+    def _build(self):
+        from rag_system_advanced import AdvancedSchoolInfoRAG
+        self.engine = AdvancedSchoolInfoRAG(self.corpus.csv_path)
+
+    @property
+    def effective_method(self):
+        return self.name if self.engine.multi_query_retriever else "vector"
+
+    def _documents(self, query):
+        return self.engine.search_with_multi_query(query)
+
+
+# 엔진 이름 -> 클래스
+ENGINES = {
+    cls.name: cls
+    for cls in (LiteRetriever, TfidfRetriever, V2Retriever, HybridRetriever, MultiQueryEngine, DocExpansionEngine,
+                AdvancedEngine)
+}
+
+
+def create_retriever(name: Optional[str] = None, csv_path: str = DEFAULT_CSV_PATH) -> Retriever:
+    """
+    엔진 생성
+
+    Args:
+        name: ENGINES의 키 (없으면 RAG_ENGINE 환경 변수, 그것도 없으면 "lite")
+        csv_path: CSV 파일 경로
+    """
+    name = (name or os.getenv(ENGINE_ENV, DEFAULT_ENGINE)).lower()
+    if name not in ENGINES:
+        raise ValueError(f"지원하지 않는 검색 엔진: {name} (사용 가능: {', '.join(ENGINES)})")
+    return ENGINES[name](csv_path)
+
+
+_shared_retrievers: Dict[tuple, Retriever] = {}
+_shared_lock = threading.Lock()
+
+
+def get_retriever(name: Optional[str] = None, csv_path: str = DEFAULT_CSV_PATH) -> Retriever:
+    """프로세스 공유 엔진 반환 (엔진/CSV별 1개)"""
+    name = (name or os.getenv(ENGINE_ENV, DEFAULT_ENGINE)).lower()
+    key = (name, os.path.abspath(csv_path))
+    with _shared_lock:
+        if key not in _shared_retrievers:
+            _shared_retrievers[key] = create_retriever(name, csv_path)
+        return _shared_retrievers[key]
+
+
+def get_lexical_retriever(csv_path: str = DEFAULT_CSV_PATH) -> Retriever:
+    """
+    라우터 keyword 단계용 공유 엔진
+
+    RAG_ENGINE이 LEXICAL_ENGINES가 아니면 (multiquery/advanced처럼 LLM/임베딩을 호출하는 엔진) lite를 씁니다.
+    """
+    name = os.getenv(ENGINE_ENV, DEFAULT_ENGINE).lower()
+    if name not in LEXICAL_ENGINES:
+        print(f"[ERROR] {ENGINE_ENV}={name}은(는) keyword 단계에 쓸 수 없어 {DEFAULT_ENGINE}를 사용합니다 "
+              f"(사용 가능: {', '.join(LEXICAL_ENGINES)})")
+        name = DEFAULT_ENGINE
+    return get_retriever(name, csv_path)
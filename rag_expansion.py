@@ -0,0 +1,388 @@
+"""
+문서 쪽 질문 확장 (색인 시점)
+CSV 행마다 바꿔 말한 질문과 별칭("교무실 ↔ 교무행정실", "6-2 ↔ 6학년 2반")을 한 번만 만들어
+같은 행을 가리키는 추가 키워드 단위/벡터로 색인합니다.
+질문할 때마다 LLM으로 검색 질문을 만드는 MultiQuery 대신 변형을 미리 문서 쪽에 붙여 두는 방식이라
+검색 시점에는 LLM 호출이 없습니다.
+
+확장 방식 (RAG_DOC_EXPANSION 환경 변수):
+    rules : 규칙 기반 별칭/반 표기/답변에서 뽑은 이름·역할 (기본, 네트워크 없음)
+    llm   : rules + LLM이 만든 바꿔 말하기 (행 해시별로 저장하여 바뀐 행만 다시 생성)
+    off   : 확장 없음
+
+확장 문서 ID는 "<행 ID>~<변형 해시>"이고 metadata["row_id"]에 원래 행 ID를 담습니다.
+벡터 검색 결과는 collapse_expansions()로 행 단위로 합칩니다.
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from rag_store import VECTORSTORE_CACHE_DIR
+
+EXPANSION_ENV = "RAG_DOC_EXPANSION"
+DEFAULT_EXPANSION_MODE = "rules"
+EXPANSION_MODES = ("rules", "llm", "off")
+
+# 규칙이나 프롬프트가 바뀌면 올려서 저장된 확장을 무효화
+EXPANSION_VERSION = 1
+
+# 행 하나에 붙이는 최대 변형 수 (벡터 검색은 k * FETCH_FACTOR개를 가져와 행 단위로 합침)
+MAX_EXPANSIONS_PER_ROW = 8
+FETCH_FACTOR = MAX_EXPANSIONS_PER_ROW + 1
+
+# LLM 바꿔 말하기 설정
+EXPANSION_LLM_MODEL = "gpt-4o-mini"
+LLM_VARIANTS_PER_ROW = 3
+LLM_EXPANSION_PATH = os.path.join(VECTORSTORE_CACHE_DIR, "doc_expansions.json")
+LLM_EXPANSION_PROMPT = """당신은 학교 정보 검색을 도와주는 전문가입니다.
+다음 질문-답변 쌍을 보고, 사용자가 같은 답을 찾을 때 입력할 법한 서로 다른 질문 {count}개를 만들어주세요.
+담당자 이름, 부서, 반 표기(예: 6-2 / 6학년 2반), 줄임말이나 다른 호칭을 섞어 주세요.
+
+질문: {question}
+답변: {answer}
+
+각 질문은 한 줄씩, 번호 없이 작성해주세요."""
+
+# 같은 뜻으로 쓰이는 표현 묶음 (앞쪽이 대표 표기)
+ALIAS_GROUPS = (
+    ("교무실", "교무행정실", "교무행정지원실"),
+    ("행정실", "행정지원실"),
+    ("보건실", "보건", "양호실"),
+    ("식생활관", "급식실"),
+    ("팩스", "FAX"),
+    ("와이파이", "WIFI", "무선인터넷"),
+    ("비밀번호", "비번", "패스워드"),
+    ("아이디", "ID"),
+    ("내선번호", "전화번호", "연락처"),
+    ("교장", "교장선생님"),
+    ("교감", "교감선생님"),
+    ("방과후", "방과후학교"),
+)
+
+# 별칭 뒤에 붙어도 같은 단어로 보는 조사 ("교무실의", "행정실은")
+_PARTICLES = ('', '의', '은', '는', '이', '가', '을', '를', '에', '에서', '로', '으로', '과', '와', '도', '번호')
+
+# 질문 끝 어미 ("알려줘", "뭐야?", "내선번호는?" -> "내선번호")
+_ENDING = re.compile(r'\s*(?:좀\s*)?(?:알려\s*줘|알려\s*주세요|뭐야|뭐예요|뭔가요|어떻게\s*돼)?\s*\??$')
+_TOPIC_PARTICLE = re.compile(r'(?<=[가-힣])(?:은|는)$')
+
+# 반 표기 ("6-2" / "6학년 2반")
+_CLASS_CODE = re.compile(r'(?<![\d-])(\d)-(\d{1,2})(?![\d-])')
+_CLASS_NAME = re.compile(r'(?<!\d)(\d)\s*학년\s*(\d{1,2})\s*반')
+
+
+def _clean(text: str) -> str:
+    return re.sub(r'\s+', ' ', str(text)).strip()
+
+
+def question_core(question: str) -> str:
+    """질문에서 어미와 물음표를 뗀 핵심 부분 ("1-2 선생님 내선번호 알려줘" -> "1-2 선생님 내선번호")"""
+    core = _ENDING.sub('', _clean(question))
+    return _TOPIC_PARTICLE.sub('', core).strip() or _clean(question)
+
+
+def class_variants(text: str) -> List[str]:
+    """반 표기를 서로 바꾼 변형 ("6-2 선생님" -> "6학년 2반 선생님", "6학년 2반" -> "6-2", "6-2반")"""
+    variants = []
+    if _CLASS_CODE.search(text):
+        variants.append(_CLASS_CODE.sub(lambda m: f"{m.group(1)}학년 {int(m.group(2))}반", text))
+    if _CLASS_NAME.search(text):
+        variants.append(_CLASS_NAME.sub(lambda m: f"{m.group(1)}-{int(m.group(2))}", text))
+        variants.append(_CLASS_NAME.sub(lambda m: f"{m.group(1)}-{int(m.group(2))}반", text))
+    return variants
+
+
+def _alias_pattern(groups) -> re.Pattern:
+    terms = sorted({term for group in groups for term in group}, key=len, reverse=True)
+    return re.compile('|'.join(re.escape(term) for term in terms), re.IGNORECASE)
+
+
+_ALIAS_OF = {term.lower(): group for group in ALIAS_GROUPS for term in group}
+_ALIAS_PATTERN = _alias_pattern(ALIAS_GROUPS)
+
+
+def _alias_matches(text: str) -> List[Tuple[int, int, tuple]]:
+    """
+    텍스트 안의 별칭 위치 (시작, 끝, 묶음)
+
+    뒤에 조사나 다른 별칭만 붙은 경우에만 인정합니다 ("교무실무사"의 "교무실", "보건교육실"의 "보건"은 제외).
+    """
+    matches = []
+    for m in _ALIAS_PATTERN.finditer(text):
+        rest = re.match(r'[가-힣A-Za-z]*', text[m.end():]).group(0)
+        if rest not in _PARTICLES and not _ALIAS_PATTERN.match(rest):
+            continue
+        matches.append((m.start(), m.end(), _ALIAS_OF[m.group(0).lower()]))
+    return matches
+
+
+def alias_variants(text: str, per_term: int = 2) -> List[str]:
+    """별칭을 같은 묶음의 다른 표기로 바꾼 변형 (별칭 하나당 최대 per_term개)"""
+    variants = []
+    for start, end, group in _alias_matches(text):
+        current = text[start:end].lower()
+        for other in [term for term in group if term.lower() != current][:per_term]:
+            variants.append(text[:start] + other + text[end:])
+    return variants
+
+
+def answer_variants(question: str, answer: str) -> List[str]:
+    """
+    답변에서 뽑은 이름/역할/반으로 만든 질문 ("1-2 선생님 내선번호" 행에 "김민경 선생님 내선번호" 추가)
+
+    질문은 반으로, 답변은 이름으로 되어 있는 행을 이름이나 반 어느 쪽으로 물어도 찾을 수 있게 합니다.
+    """
+    from staff_directory import DUTY_PATTERNS, is_person_name, parse_contact
+
+    answer = _clean(answer)
+    variants = []
+    # 업무 행은 질문 방향을 유지 ("X 선생님 업무는?" / "D 담당 선생님은?"이 서로의 답을 가져가지 않도록)
+    name_to_duty, duty_to_name = DUTY_PATTERNS
+    m = name_to_duty.match(answer)
+    if m and is_person_name(m.group('name')):
+        return [f"{m.group('name')} 선생님 담당 업무", f"{m.group('name')} 선생님이 맡은 일"]
+    m = duty_to_name.match(answer)
+    if m and is_person_name(m.group('name')):
+        return [f"{m.group('duty')} 담당자", f"{m.group('duty')} 담당 교사"]
+
+    for record in parse_contact(answer):
+        if record.name:
+            variants.append(f"{record.name} 선생님 내선번호")
+        if record.class_code:
+            grade, room = record.class_code.split('-')
+            variants.append(f"{grade}학년 {room}반 담임 선생님 내선번호")
+            if record.name:
+                variants.append(f"{record.class_code} 담임 {record.name} 선생님")
+        elif record.role and record.role not in question:
+            variants.append(f"{record.role} 내선번호")
+    return variants
+
+
+def expand_row(question: str, answer: str, limit: int = MAX_EXPANSIONS_PER_ROW) -> List[str]:
+    """
+    행 하나의 규칙 기반 변형 질문 (원래 질문과 같은 것, 중복은 제외)
+
+    반 표기 -> 답변에서 뽑은 이름/역할 -> 별칭 -> 어미를 뗀 핵심 순으로 채웁니다.
+    """
+    question = _clean(question)
+    core = question_core(question)
+    seen = {question.lower()}
+    variants: List[str] = []
+
+    def add(text):
+        text = _clean(text)
+        if text and text.lower() not in seen and len(variants) < limit:
+            seen.add(text.lower())
+            variants.append(text)
+
+    for text in class_variants(core):
+        add(text)
+    for text in answer_variants(question, answer):
+        add(text)
+    for text in alias_variants(core) + [v for c in class_variants(core) for v in alias_variants(c)]:
+        add(text)
+    add(core)
+    return variants
+
+
+def row_hash(question: str, answer: str) -> str:
+    """행 내용 해시 (LLM 변형 재생성 여부 판단)"""
+    payload = f"{EXPANSION_VERSION}\0{_clean(question)}\0{_clean(answer)}"
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class LLMExpansionStore:
+    """
+    LLM 바꿔 말하기 저장소 (행 해시 -> 변형 질문 리스트, JSON 파일)
+
+    한 번 만든 행은 다시 생성하지 않고, 내용이 바뀐 행만 새로 만듭니다.
+    """
+
+    def __init__(self, path: str = LLM_EXPANSION_PATH, model: str = EXPANSION_LLM_MODEL):
+        self.path = path
+        self.model = model
+        self._lock = threading.Lock()
+        self.rows: Dict[str, List[str]] = self._load()
+
+    def _load(self) -> Dict[str, List[str]]:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if payload.get('version') != EXPANSION_VERSION or payload.get('model') != self.model:
+            return {}
+        return payload.get('rows', {})
+
+    def _save(self):
+        """임시 파일에 쓴 뒤 교체 (다른 워커가 반쯤 쓴 파일을 읽지 않도록)"""
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".doc_expansions.", dir=directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'version': EXPANSION_VERSION, 'model': self.model, 'rows': self.rows}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def _parse(text: str) -> List[str]:
+        lines = [re.sub(r'^\s*(?:\d+[.)]|[-*•])\s*', '', line).strip() for line in str(text).splitlines()]
+        return [line for line in lines if line][:LLM_VARIANTS_PER_ROW]
+
+    def sync(self, rows: Sequence[Tuple[str, str]], llm=None) -> Dict[str, List[str]]:
+        """
+        행 목록과 저장소를 맞춤 (없는 행만 LLM으로 생성, 사라진 행은 삭제)
+
+        Args:
+            rows: (question, answer) 리스트
+            llm: LangChain 채팅 모델 (없으면 llm_cassette.create_chat_model로 생성)
+
+        Returns:
+            {행 해시: 변형 질문 리스트}
+        """
+        hashes = [row_hash(q, a) for q, a in rows]
+        with self._lock:
+            missing = [(h, q, a) for h, (q, a) in zip(hashes, rows) if h not in self.rows]
+            stale = set(self.rows) - set(hashes)
+            if not missing and not stale:
+                return dict(self.rows)
+
+            if missing:
+                if llm is None:
+                    from llm_cassette import create_chat_model
+                    llm = create_chat_model(model=self.model, temperature=0.3)
+                print(f"[DEBUG] LLM 문서 확장 생성: {len(missing)}개 행")
+                prompts = [
+                    LLM_EXPANSION_PROMPT.format(count=LLM_VARIANTS_PER_ROW, question=q, answer=a)
+                    for _, q, a in missing
+                ]
+                responses = llm.batch(prompts, config={"max_concurrency": 8}, return_exceptions=True)
+                for (h, _, _), response in zip(missing, responses):
+                    if isinstance(response, Exception):
+                        print(f"[ERROR] LLM 문서 확장 실패 (다음 동기화 때 다시 시도): {response}")
+                        continue
+                    self.rows[h] = self._parse(getattr(response, 'content', response))
+
+            for h in stale:
+                del self.rows[h]
+            try:
+                self._save()
+            except OSError as e:
+                print(f"[ERROR] LLM 문서 확장 저장 실패: {e}")
+            return dict(self.rows)
+
+
+def expansion_mode(mode: Optional[str] = None) -> str:
+    mode = (mode or os.getenv(EXPANSION_ENV, DEFAULT_EXPANSION_MODE)).lower()
+    if mode not in EXPANSION_MODES:
+        raise ValueError(f"지원하지 않는 문서 확장 방식: {mode} (사용 가능: {', '.join(EXPANSION_MODES)})")
+    return mode
+
+
+_expansions: Dict[tuple, Dict[str, List[str]]] = {}
+_expansions_lock = threading.Lock()
+
+
+def build_expansions(corpus, mode: Optional[str] = None) -> Dict[str, List[str]]:
+    """
+    코퍼스 전체의 행별 변형 질문 {행 ID: [변형, ...]} (같은 CSV/방식이면 프로세스에서 한 번만 계산)
+
+    Args:
+        corpus: rag_corpus.SchoolCorpus
+        mode: "rules" / "llm" / "off" (없으면 RAG_DOC_EXPANSION 환경 변수)
+    """
+    mode = expansion_mode(mode)
+    key = (os.path.abspath(corpus.csv_path), corpus.sha256, mode)
+    with _expansions_lock:
+        if key in _expansions:
+            return _expansions[key]
+
+    expansions: Dict[str, List[str]] = {}
+    if mode != "off":
+        generated = {}
+        if mode == "llm":
+            try:
+                generated = LLMExpansionStore().sync(list(zip(corpus.questions, corpus.answers)))
+            except Exception as e:
+                print(f"[ERROR] LLM 문서 확장 실패, 규칙 기반 확장만 사용합니다: {e}")
+        for doc_id, question, answer in corpus.rows():
+            variants = expand_row(question, answer)
+            for text in generated.get(row_hash(question, answer), []):
+                if text not in variants and text != question:
+                    variants.append(text)
+            if variants:
+                expansions[doc_id] = variants
+
+    with _expansions_lock:
+        _expansions[key] = expansions
+    print(f"[DEBUG] 문서 확장 ({mode}): {sum(len(v) for v in expansions.values())}개 변형 / {len(expansions)}개 행")
+    return expansions
+
+
+def expansion_doc_id(doc_id: str, text: str) -> str:
+    """확장 문서 ID (변형 내용 기준이라 순서가 바뀌어도 같은 변형은 다시 임베딩하지 않음)"""
+    return f"{doc_id}~{hashlib.sha1(text.encode('utf-8')).hexdigest()[:8]}"
+
+
+def expansion_documents(corpus, doc_template: str, metadata_of=None, mode: Optional[str] = None) -> dict:
+    """
+    벡터스토어에 추가할 확장 문서 {확장 문서 ID: Document}
+
+    변형 질문을 원래 행과 같은 문서 템플릿에 넣어 임베딩하므로 점수 분포가 원래 행과 같습니다.
+
+    Args:
+        corpus: rag_corpus.SchoolCorpus
+        doc_template: "{question}", "{answer}"가 들어간 문서 템플릿
+        metadata_of: (doc_id, question, answer) -> 원래 행 메타데이터 (없으면 빈 딕셔너리)
+        mode: 확장 방식 (build_expansions 참고)
+    """
+    from langchain_core.documents import Document
+
+    expansions = build_expansions(corpus, mode)
+    documents = {}
+    for doc_id, question, answer in corpus.rows():
+        base_metadata = metadata_of(doc_id, question, answer) if metadata_of else {}
+        for text in expansions.get(doc_id, []):
+            documents[expansion_doc_id(doc_id, text)] = Document(
+                page_content=doc_template.format(question=text, answer=answer),
+                metadata={**base_metadata, 'row_id': doc_id}
+            )
+    return documents
+
+
+def collapse_expansions(docs_and_scores, vectorstore=None, k: Optional[int] = None):
+    """
+    벡터 검색 결과를 행 단위로 합침 [(Document, 점수)] -> 행마다 가장 높은 점수 1건
+
+    확장 문서는 벡터스토어에 원래 행 문서가 있으면 그것으로 바꿔 돌려주므로
+    이후 단계(RRF, 리랭커, 답변 추출)는 확장 여부를 몰라도 됩니다.
+    """
+    collapsed = []
+    seen = set()
+    for doc, score in docs_and_scores:
+        row_id = doc.metadata.get('row_id')
+        key = row_id or doc.id or doc.page_content
+        if key in seen:
+            continue
+        seen.add(key)
+        if row_id and vectorstore is not None:
+            original = _lookup_document(vectorstore, row_id)
+            if original is not None:
+                doc = original
+        collapsed.append((doc, score))
+        if k is not None and len(collapsed) >= k:
+            break
+    return collapsed
+
+
+def _lookup_document(vectorstore, doc_id: str):
+    from langchain_core.documents import Document
+
+    docstore = getattr(vectorstore, 'docstore', None)
+    if docstore is None:
+        return None
+    found = docstore.search(doc_id)
+    return found if isinstance(found, Document) else None
@@ -0,0 +1,213 @@
+"""
+TF-IDF / 임베딩 인덱스 파일 저장소 (pickle 대체)
+인덱스 하나는 폴더 하나에 저장됩니다.
+    manifest.json            형식 버전, 엔진, CSV 해시, 파라미터, 어휘, 배열 파일 목록
+    <build_id>.<name>.npy    배열 (희소 행렬은 data/indices/indptr를 각각 .npy로 저장)
+
+배열은 np.load(mmap_mode='r')로 읽으므로 여러 워커 프로세스가 같은 페이지를 공유합니다.
+CSV 내용, 엔진, 파라미터, 형식 버전 중 하나라도 manifest와 다르면 오래된 인덱스로 보고 무시합니다.
+"""
+import json
+import os
+import tempfile
+import time
+import uuid
+from typing import Dict, Optional
+
+import numpy as np
+from scipy import sparse
+
+from rag_store import file_sha256
+
+# 저장 형식이 바뀌면 올려서 기존 인덱스를 모두 무효화
+INDEX_FORMAT_VERSION = 1
+
+MANIFEST_NAME = "manifest.json"
+
+# CSR 행렬을 이루는 배열
+_CSR_PARTS = ("data", "indices", "indptr")
+
+# manifest에 저장할 TfidfVectorizer 설정 (JSON으로 옮길 수 있는 값만)
+TFIDF_PARAM_KEYS = (
+    "analyzer", "binary", "lowercase", "max_df", "max_features", "min_df",
+    "ngram_range", "norm", "smooth_idf", "sublinear_tf", "token_pattern", "use_idf",
+)
+
+
+def _write_atomic(path: str, write):
+    """임시 파일에 쓴 뒤 교체 (읽는 쪽에서 반쯤 쓴 파일이 보이지 않도록)"""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _read_manifest(index_dir: str) -> Optional[dict]:
+    path = os.path.join(index_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_index(index_dir: str, csv_path: str, engine: str, params: dict,
+               vocab: Optional[Dict[str, int]] = None,
+               sparse_arrays: Optional[Dict[str, sparse.spmatrix]] = None,
+               dense_arrays: Optional[Dict[str, np.ndarray]] = None) -> dict:
+    """
+    인덱스 저장
+
+    배열 파일 이름에 빌드 ID를 붙여 먼저 쓰고 manifest를 마지막에 교체하므로,
+    다른 프로세스는 항상 이전 인덱스 전체 또는 새 인덱스 전체만 보게 됩니다.
+
+    Args:
+        index_dir: 인덱스 폴더
+        csv_path: 인덱스를 만든 CSV (내용 해시를 기록)
+        engine: 엔진 이름 ("tfidf", "sentence_transformers" 등)
+        params: 엔진 파라미터 (로드할 때 같아야 유효)
+        vocab: 용어 -> 열 번호 (TF-IDF)
+        sparse_arrays: {이름: 희소 행렬} (CSR로 저장)
+        dense_arrays: {이름: numpy 배열}
+
+    Returns:
+        저장한 manifest
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    build_id = uuid.uuid4().hex[:12]
+    manifest = {
+        'format_version': INDEX_FORMAT_VERSION,
+        'engine': engine,
+        'csv_sha256': file_sha256(csv_path),
+        'params': params,
+        'vocab': vocab,
+        'created_at': time.time(),
+        'sparse': {},
+        'dense': {},
+    }
+
+    for name, matrix in (sparse_arrays or {}).items():
+        csr = sparse.csr_matrix(matrix)
+        files = {}
+        for part in _CSR_PARTS:
+            file_name = f"{build_id}.{name}.{part}.npy"
+            _write_atomic(os.path.join(index_dir, file_name), lambda f, a=getattr(csr, part): np.save(f, a))
+            files[part] = file_name
+        manifest['sparse'][name] = {'shape': list(csr.shape), 'files': files}
+
+    for name, array in (dense_arrays or {}).items():
+        file_name = f"{build_id}.{name}.npy"
+        _write_atomic(os.path.join(index_dir, file_name), lambda f, a=np.asarray(array): np.save(f, a))
+        manifest['dense'][name] = {'file': file_name}
+
+    payload = json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8')
+    _write_atomic(os.path.join(index_dir, MANIFEST_NAME), lambda f: f.write(payload))
+    _prune_old_builds(index_dir, build_id)
+    return manifest
+
+
+def _prune_old_builds(index_dir: str, build_id: str):
+    """이전 빌드의 배열 파일 정리 (이미 mmap으로 연 프로세스는 계속 읽을 수 있음)"""
+    for file_name in os.listdir(index_dir):
+        if file_name.endswith(".npy") and not file_name.startswith(build_id + "."):
+            try:
+                os.remove(os.path.join(index_dir, file_name))
+            except OSError:
+                pass
+
+
+def load_index(index_dir: str, csv_path: str, engine: Optional[str] = None,
+               params: Optional[dict] = None) -> Optional[dict]:
+    """
+    인덱스 로드 (없거나 오래되었으면 None)
+
+    Args:
+        index_dir: 인덱스 폴더
+        csv_path: 현재 CSV (해시가 manifest와 달라야 다시 만듦)
+        engine: 기대하는 엔진 (None이면 저장된 엔진을 그대로 사용)
+        params: 기대하는 파라미터 (None이면 확인하지 않음)
+
+    Returns:
+        {'manifest': dict, 'sparse': {이름: csr_matrix}, 'dense': {이름: 메모리 매핑 배열}}
+    """
+    try:
+        manifest = _read_manifest(index_dir)
+    except (OSError, ValueError) as e:
+        print(f"[ERROR] 인덱스 manifest 읽기 실패 ({index_dir}): {e}")
+        return None
+    if manifest is None:
+        return None
+
+    reason = None
+    if manifest.get('format_version') != INDEX_FORMAT_VERSION:
+        reason = "저장 형식 버전이 다름"
+    elif engine is not None and manifest.get('engine') != engine:
+        reason = f"엔진이 다름 ({manifest.get('engine')} != {engine})"
+    elif params is not None and manifest.get('params') != params:
+        reason = "파라미터가 다름"
+    elif manifest.get('csv_sha256') != file_sha256(csv_path):
+        reason = "CSV 내용이 바뀜"
+    if reason:
+        print(f"[DEBUG] 오래된 인덱스 무시 ({index_dir}): {reason}")
+        return None
+
+    try:
+        sparse_arrays = {}
+        for name, info in manifest['sparse'].items():
+            parts = [np.load(os.path.join(index_dir, info['files'][part]), mmap_mode='r') for part in _CSR_PARTS]
+            sparse_arrays[name] = sparse.csr_matrix(tuple(parts), shape=tuple(info['shape']), copy=False)
+
+        dense_arrays = {
+            name: np.load(os.path.join(index_dir, info['file']), mmap_mode='r')
+            for name, info in manifest['dense'].items()
+        }
+    except (OSError, ValueError, KeyError) as e:
+        print(f"[ERROR] 인덱스 배열 로드 실패 ({index_dir}): {e}")
+        return None
+
+    return {'manifest': manifest, 'sparse': sparse_arrays, 'dense': dense_arrays}
+
+
+def tfidf_params(vectorizer) -> dict:
+    """TfidfVectorizer 설정을 JSON으로 저장할 수 있는 dict로 변환"""
+    params = vectorizer.get_params()
+    result = {}
+    for key in TFIDF_PARAM_KEYS:
+        value = params.get(key)
+        result[key] = list(value) if isinstance(value, tuple) else value
+    return result
+
+
+def tfidf_vocab(vectorizer) -> Dict[str, int]:
+    return {term: int(col) for term, col in vectorizer.vocabulary_.items()}
+
+
+def restore_tfidf(params: dict, vocab: Dict[str, int], idf: np.ndarray):
+    """manifest의 설정/어휘와 idf 배열로 학습된 TfidfVectorizer 복원"""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    kwargs = {key: tuple(value) if isinstance(value, list) else value for key, value in params.items()}
+    vectorizer = TfidfVectorizer(**kwargs)
+    vectorizer.vocabulary_ = dict(vocab)
+    vectorizer.idf_ = np.asarray(idf, dtype=np.float64)
+    return vectorizer
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    (질문 수 x 문서 수) 점수 행렬의 행별 상위 k개 열 번호 (점수 내림차순)
+
+    전체 정렬 대신 argpartition으로 k개만 고른 뒤 그 안에서만 정렬합니다.
+    """
+    scores = np.atleast_2d(scores)
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(top, order, axis=1)
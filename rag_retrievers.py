@@ -0,0 +1,341 @@
+"""
+공용 LangChain 검색기 구성 요소
+"""
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from copy import deepcopy
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain.retrievers.multi_query import DEFAULT_QUERY_PROMPT, MultiQueryRetriever
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+    Callbacks,
+)
+from langchain_core.documents import BaseDocumentCompressor, Document
+from langchain_core.prompts import BasePromptTemplate
+from langchain_core.retrievers import BaseRetriever
+from pydantic import PrivateAttr
+
+from rag_expansion import collapse_expansions
+
+# RRF 상수 (값이 클수록 하위 순위 문서의 영향이 커짐)
+DEFAULT_RRF_K = 60
+
+# 리랭커 설정
+COHERE_RERANK_MODEL = "rerank-multilingual-v3.0"
+DEFAULT_CROSS_ENCODER_MODEL = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"  # 한국어 포함 다국어 모델
+
+
+def reciprocal_rank_fusion(document_lists: List[List[Document]], k: int = DEFAULT_RRF_K) -> List[Document]:
+    """
+    여러 검색 결과 목록을 RRF(Reciprocal Rank Fusion)로 합침
+
+    여러 질문에서 공통으로 상위에 나온 문서가 앞으로 옵니다.
+    합친 점수는 문서 사본의 metadata["rrf_score"]에 넣습니다 (벡터스토어 원본 문서는 건드리지 않음).
+    """
+    scores: Dict[str, float] = {}
+    first_seen: Dict[str, Document] = {}
+    similarities: Dict[str, float] = {}
+    for docs in document_lists:
+        for rank, doc in enumerate(docs):
+            key = doc.page_content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+            first_seen.setdefault(key, doc)
+            # 여러 질문에서 나온 문서는 가장 높은 유사도를 남김
+            if "similarity" in doc.metadata:
+                similarities[key] = max(similarities.get(key, float("-inf")), doc.metadata["similarity"])
+
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    fused = []
+    for key in ranked:
+        doc = first_seen[key]
+        metadata = {**doc.metadata, "rrf_score": scores[key]}
+        if key in similarities:
+            metadata["similarity"] = similarities[key]
+        fused.append(Document(doc.page_content, id=doc.id, metadata=metadata))
+    return fused
+
+
+def document_score(doc: Document) -> Optional[float]:
+    """
+    문서의 실제 점수 (0~1): 리랭커 관련도가 있으면 그것, 없으면 1차 검색 코사인 유사도
+
+    둘 다 없으면 None (RRF 점수는 순위에서 나온 값이라 신뢰도로 쓰지 않음)
+    """
+    for key in ("relevance_score", "similarity"):
+        value = doc.metadata.get(key)
+        if value is not None:
+            return float(value)
+    return None
+
+
+class ScoredVectorStoreRetriever(BaseRetriever):
+    """
+    유사도 점수를 문서 메타데이터("similarity")에 담아 돌려주는 벡터스토어 검색기
+
+    기본 as_retriever()는 점수를 버리므로 이후 단계(RRF, 신뢰도 계산, 임계값 판단)에서 쓸 수 없습니다.
+    rag_store 인덱스는 정규화 내적이므로 점수는 코사인 유사도입니다.
+    인덱스에 문서 쪽 확장 변형(rag_expansion)이 들어 있으면 fetch_k개를 가져와 행 단위로 합친 뒤 k개를 돌려줍니다.
+    """
+    vectorstore: Any
+    k: int = 4
+    fetch_k: Optional[int] = None  # 행 단위로 합치기 전에 가져올 문서 수 (없으면 k)
+    score_threshold: Optional[float] = None  # 이 유사도 미만 문서는 버림
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        docs_and_scores = self.vectorstore.similarity_search_with_relevance_scores(query, k=max(self.k, self.fetch_k or 0))
+        docs_and_scores = collapse_expansions(docs_and_scores, self.vectorstore, k=self.k)
+        return [
+            Document(doc.page_content, id=doc.id, metadata={**doc.metadata, "similarity": float(score)})
+            for doc, score in docs_and_scores
+            if self.score_threshold is None or score >= self.score_threshold
+        ]
+
+
+class ParallelMultiQueryRetriever(MultiQueryRetriever):
+    """
+    생성된 질문들을 동시에 검색하는 MultiQueryRetriever
+
+    기본 MultiQueryRetriever는 동기 경로에서 질문을 하나씩 차례로 검색하므로
+    질문 4개면 검색 시간도 4배가 됩니다. 여기서는 retriever.batch로 한 번에 실행하고
+    결과를 RRF로 합칩니다.
+
+    variant_cache(multiquery_cache.MultiQueryCache)가 있으면 생성된 질문과 질문별 검색 결과를 저장해 두고,
+    같은 질문이 다시 오면 LLM 호출과 검색 없이 저장된 결과를 RRF로 합칩니다 (동기 경로만 사용).
+    """
+
+    max_concurrency: int = 4
+    rrf_k: int = DEFAULT_RRF_K
+    variant_cache: Optional[Any] = None
+
+    @classmethod
+    def from_llm(cls, retriever: BaseRetriever, llm, prompt: BasePromptTemplate = DEFAULT_QUERY_PROMPT,
+                 parser_key: Optional[str] = None, include_original: bool = False,
+                 variant_cache=None) -> "ParallelMultiQueryRetriever":
+        instance = super().from_llm(
+            retriever, llm, prompt=prompt, parser_key=parser_key, include_original=include_original
+        )
+        instance.variant_cache = variant_cache
+        return instance
+
+    def _retrieve_lists(self, queries: List[str], run_manager: CallbackManagerForRetrieverRun) -> List[List[Document]]:
+        return self.retriever.batch(
+            queries,
+            config={"callbacks": run_manager.get_child(), "max_concurrency": self.max_concurrency},
+        )
+
+    def retrieve_documents(
+        self,
+        queries: List[str],
+        run_manager: CallbackManagerForRetrieverRun,
+    ) -> List[Document]:
+        return reciprocal_rank_fusion(self._retrieve_lists(queries, run_manager), k=self.rrf_k)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        if self.variant_cache is None:
+            return super()._get_relevant_documents(query, run_manager=run_manager)
+
+        try:
+            cached = self.variant_cache.get(query)
+        except Exception as e:
+            print(f"[ERROR] MultiQuery 캐시 조회 실패: {e}")
+            cached = None
+        if cached is not None and cached['results'] is not None:
+            return reciprocal_rank_fusion(cached['results'], k=self.rrf_k)
+
+        # 변형이 저장되어 있으면 (인덱스만 바뀐 경우) LLM 호출 없이 검색만 다시 실행
+        variants = cached['variants'] if cached is not None else self.generate_queries(query, run_manager)
+        queries = list(variants) + [query] if self.include_original else list(variants)
+        document_lists = self._retrieve_lists(queries, run_manager)
+        try:
+            self.variant_cache.put(query, list(variants), document_lists)
+        except Exception as e:
+            print(f"[ERROR] MultiQuery 캐시 저장 실패: {e}")
+        return reciprocal_rank_fusion(document_lists, k=self.rrf_k)
+
+    async def aretrieve_documents(
+        self,
+        queries: List[str],
+        run_manager: AsyncCallbackManagerForRetrieverRun,
+    ) -> List[Document]:
+        document_lists = await asyncio.gather(
+            *(
+                self.retriever.ainvoke(query, config={"callbacks": run_manager.get_child()})
+                for query in queries
+            )
+        )
+        return reciprocal_rank_fusion(document_lists, k=self.rrf_k)
+
+
+class LocalCrossEncoderReranker(BaseDocumentCompressor):
+    """
+    로컬 CrossEncoder 리랭커 (CohereRerank 대체용)
+
+    네트워크 없이 CPU에서 (질문, 문서) 쌍을 한 번의 배치로 점수화합니다.
+    한 번 계산한 쌍의 점수는 캐시하여 같은 질문이 다시 들어오면 모델을 돌리지 않습니다.
+    ContextualCompressionRetriever의 base_compressor 자리에 그대로 넣을 수 있습니다.
+    """
+
+    model_name: str = DEFAULT_CROSS_ENCODER_MODEL
+    top_n: int = 3
+    cache_size: int = 4096
+
+    _model: Any = PrivateAttr(default=None)
+    _score_cache: OrderedDict = PrivateAttr(default_factory=OrderedDict)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    def _get_model(self):
+        if self._model is None:
+            from sentence_transformers import CrossEncoder
+            self._model = CrossEncoder(self.model_name, device="cpu")
+        return self._model
+
+    @staticmethod
+    def _pair_key(query: str, content: str) -> str:
+        return hashlib.sha1(f"{query}\0{content}".encode('utf-8')).hexdigest()
+
+    def score(self, query: str, contents: List[str]) -> List[float]:
+        """(질문, 문서) 쌍 점수 계산 (캐시에 없는 쌍만 모델 실행)"""
+        keys = [self._pair_key(query, content) for content in contents]
+        scores: Dict[str, float] = {}
+        with self._lock:
+            for key in keys:
+                if key in self._score_cache:
+                    self._score_cache.move_to_end(key)
+                    scores[key] = self._score_cache[key]
+
+        missing = [(key, content) for key, content in zip(keys, contents) if key not in scores]
+        if missing:
+            predicted = self._get_model().predict(
+                [(query, content) for _, content in missing],
+                batch_size=len(missing),
+                show_progress_bar=False,
+            )
+            with self._lock:
+                for (key, _), value in zip(missing, predicted):
+                    scores[key] = float(value)
+                    self._score_cache[key] = float(value)
+                while len(self._score_cache) > self.cache_size:
+                    self._score_cache.popitem(last=False)
+
+        return [scores[key] for key in keys]
+
+    def compress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None,
+    ) -> Sequence[Document]:
+        if not documents:
+            return []
+
+        scores = self.score(query, [doc.page_content for doc in documents])
+        ranked = sorted(zip(documents, scores), key=lambda x: x[1], reverse=True)
+
+        compressed = []
+        for doc, score in ranked[:self.top_n]:
+            # CohereRerank와 같은 메타데이터 키 사용 (라벨 1개 CrossEncoder는 시그모이드를 거친 0~1 점수)
+            doc_copy = Document(doc.page_content, metadata=deepcopy(doc.metadata))
+            doc_copy.metadata["relevance_score"] = score
+            compressed.append(doc_copy)
+        return compressed
+
+
+def build_reranker(kind: str, top_n: int = 3, cohere_api_key: Optional[str] = None):
+    """
+    설정값에 맞는 리랭커 생성
+
+    Args:
+        kind: "cohere", "local", "none" 중 하나
+        top_n: 최종으로 남길 문서 수
+        cohere_api_key: kind가 "cohere"일 때 사용할 API 키
+
+    Returns:
+        BaseDocumentCompressor 또는 None (리랭크 사용 안 함)
+    """
+    kind = (kind or "none").lower()
+    if kind == "cohere":
+        from llm_cassette import get_cassette, wrap_reranker
+        cassette = get_cassette()
+        if not cohere_api_key:
+            if cassette.mode != "replay":
+                raise ValueError("COHERE_API_KEY 없이 cohere 리랭커를 사용할 수 없습니다.")
+            cohere_api_key = "replay"  # 재생 모드에서는 실제 요청이 나가지 않음
+        from langchain_cohere import CohereRerank
+        reranker = CohereRerank(cohere_api_key=cohere_api_key, top_n=top_n, model=COHERE_RERANK_MODEL)
+        return wrap_reranker(reranker, model=COHERE_RERANK_MODEL, cassette=cassette)
+    if kind == "local":
+        # 모델을 미리 불러와 실패를 초기화 단계에서 알림 (첫 질문에서 실패하지 않도록)
+        reranker = LocalCrossEncoderReranker(top_n=top_n)
+        reranker._get_model()
+        return reranker
+    if kind == "none":
+        return None
+    raise ValueError(f"지원하지 않는 리랭커: {kind}")
+
+
+def compare_rerankers(candidates: Dict[str, List[Document]], rerankers: Dict[str, BaseDocumentCompressor]) -> dict:
+    """
+    같은 후보 문서에 대해 리랭커들의 지연시간과 1위 일치율 비교
+
+    Args:
+        candidates: {질문: 1차 검색 후보 문서 리스트}
+        rerankers: {이름: 리랭커}
+
+    Returns:
+        {'latency_ms': {이름: {'mean', 'p50', 'p95'}}, 'top1_agreement': {이름: 기준 리랭커와의 1위 일치율}}
+        (기준 리랭커는 rerankers의 첫 번째 항목)
+    """
+    latencies = {name: [] for name in rerankers}
+    top1 = {name: [] for name in rerankers}
+
+    for query, docs in candidates.items():
+        for name, reranker in rerankers.items():
+            start = time.perf_counter()
+            ranked = reranker.compress_documents(docs, query)
+            latencies[name].append((time.perf_counter() - start) * 1000)
+            top1[name].append(ranked[0].page_content if ranked else None)
+
+    def _percentile(values, pct):
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] if ordered else 0.0
+
+    baseline = next(iter(rerankers))
+    report = {'latency_ms': {}, 'top1_agreement': {}}
+    for name in rerankers:
+        values = latencies[name]
+        report['latency_ms'][name] = {
+            'mean': sum(values) / len(values) if values else 0.0,
+            'p50': _percentile(values, 50),
+            'p95': _percentile(values, 95),
+        }
+        agree = sum(1 for a, b in zip(top1[name], top1[baseline]) if a == b)
+        report['top1_agreement'][name] = agree / len(top1[name]) if top1[name] else 0.0
+    return report
+
+
+if __name__ == "__main__":
+    # Cohere vs 로컬 CrossEncoder 비교 (1차 후보는 네트워크 없는 키워드 검색으로 고정)
+    import json
+    import os
+    from dotenv import load_dotenv
+    from rag_system_lite import SchoolInfoRAGLite
+
+    load_dotenv()
+    lite = SchoolInfoRAGLite()
+    test_queries = ["교무실 팩스 번호", "교장선생님 연락처", "행정실 번호", "1-1반 담임", "와이파이 비밀번호", "보건실"]
+    candidates = {
+        query: [Document(page_content=f"질문: {q} 답변: {a}") for q, a, _ in lite.search_by_keywords(query, top_k=10)]
+        for query in test_queries
+    }
+
+    rerankers = {}
+    if os.getenv("COHERE_API_KEY"):
+        rerankers["cohere"] = build_reranker("cohere", cohere_api_key=os.getenv("COHERE_API_KEY"))
+    rerankers["local"] = build_reranker("local")
+
+    print(json.dumps(compare_rerankers(candidates, rerankers), ensure_ascii=False, indent=2))
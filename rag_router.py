@@ -0,0 +1,197 @@
+"""
+단계별 검색 라우터
+비용이 싼 검색부터 시도하고, 점수가 충분히 높으면 그 자리에서 답을 돌려줍니다.
+    1. exact   : 질문 원문 완전 일치 (dict 조회)
+    2. keyword : rag_engines 어휘 엔진 검색 (RAG_ENGINE이 lite/tfidf/v2일 때 그 엔진, 그 외에는 lite)
+    3. dense   : FAISS 벡터 검색
+    4. full    : MultiQuery + Rerank 전체 파이프라인
+
+1차 점수(키워드 점수, 코사인 유사도)가 아주 높으면 MultiQuery/Rerank 없이 그 단계에서 답하고,
+둘 다 아주 낮으면 LLM을 부르지 않고 "찾을 수 없음"으로 끝냅니다.
+query_rewriter를 주면 exact 단계는 질문 원문, dense/full 단계는 별칭을 대표 표기로 바꾼 질문을 씁니다.
+"""
+import time
+from typing import Callable, Optional
+
+from rag_cache import normalize_query
+from rag_expansion import collapse_expansions
+
+# 각 단계에서 바로 답을 돌려줄 최소 점수
+DEFAULT_KEYWORD_THRESHOLD = 0.8
+DEFAULT_DENSE_THRESHOLD = 0.85
+
+# keyword 단계 엔진의 실제 검색 방식별 최소 점수 (점수 척도가 엔진마다 다름, rag_benchmark 질문 세트로 맞춤)
+#   lite: 키워드 점수 / tfidf, sklearn: TF-IDF 코사인 (0.7 이상은 높여도 정확도가 더 오르지 않음)
+#   sentence_transformers: 임베딩 코사인 (dense 단계와 같은 기준)
+KEYWORD_THRESHOLDS = {
+    "lite": DEFAULT_KEYWORD_THRESHOLD,
+    "tfidf": 0.7,
+    "sklearn": 0.9,
+    "sentence_transformers": DEFAULT_DENSE_THRESHOLD,
+}
+
+# 키워드 점수가 이 값 미만이고 벡터 유사도도 not_found_threshold 미만이면 전체 파이프라인 없이 "찾을 수 없음"
+DEFAULT_KEYWORD_FLOOR = 0.3
+
+NOT_FOUND_ANSWER = "죄송합니다. 관련된 정보를 찾을 수 없습니다."
+
+
+def keyword_threshold_for(method: str) -> float:
+    """keyword 단계 엔진의 실제 검색 방식(Retriever.effective_method)에 맞는 최소 점수"""
+    return KEYWORD_THRESHOLDS.get(method, DEFAULT_KEYWORD_THRESHOLD)
+
+
+def _answer_from_content(content: str) -> str:
+    """'질문: ... 답변: ...' 형식 문서에서 답변 부분만 추출"""
+    if '답변: ' in content:
+        return content.split('답변: ', 1)[1]
+    return content
+
+
+class TieredRetrievalRouter:
+    def __init__(self, lexical_engine, vectorstore=None,
+                 full_pipeline: Optional[Callable[[str], dict]] = None,
+                 keyword_threshold: float = DEFAULT_KEYWORD_THRESHOLD,
+                 dense_threshold: float = DEFAULT_DENSE_THRESHOLD,
+                 not_found_threshold: Optional[float] = None,
+                 keyword_floor: float = DEFAULT_KEYWORD_FLOOR,
+                 top_k: int = 3,
+                 fetch_k: Optional[int] = None,
+                 query_rewriter: Optional[Callable[[str], str]] = None):
+        """
+        Args:
+            lexical_engine: questions/answers/search_similar를 가진 엔진 (rag_engines.Retriever 또는 SchoolInfoRAGLite)
+            vectorstore: LangChain FAISS 벡터스토어 (없으면 dense 단계 생략, rag_store 인덱스면 점수는 코사인 유사도)
+            full_pipeline: 질문 -> {'results': [...]} 를 돌려주는 마지막 단계 함수
+            keyword_threshold: keyword 단계에서 바로 답할 최소 점수
+            dense_threshold: dense 단계에서 바로 답할 최소 유사도 (임베딩 모델마다 분포가 다름)
+            not_found_threshold: 최고 유사도가 이 값 미만이면 (키워드 점수도 keyword_floor 미만일 때)
+                전체 파이프라인 없이 "찾을 수 없음" (None이면 사용 안 함)
+            keyword_floor: not_found 판단에 쓰는 키워드 점수 하한
+            top_k: 각 단계에서 돌려줄 결과 수
+            fetch_k: dense 단계에서 행 단위로 합치기 전에 가져올 문서 수 (문서 쪽 확장 변형이 든 인덱스용)
+            query_rewriter: 질문 -> 재작성된 질문 (query_rewriter.rewrite_query 등, keyword 단계는 엔진이 직접 처리)
+        """
+        self.lexical_engine = lexical_engine
+        self.vectorstore = vectorstore
+        self.full_pipeline = full_pipeline
+        self.keyword_threshold = keyword_threshold
+        self.dense_threshold = dense_threshold
+        self.not_found_threshold = not_found_threshold
+        self.keyword_floor = keyword_floor
+        self.top_k = top_k
+        self.fetch_k = fetch_k
+        self.query_rewriter = query_rewriter
+
+        # 질문 원문 -> 답변 (완전 일치용)
+        self.exact_index = {
+            normalize_query(q): (q, a)
+            for q, a in zip(lexical_engine.questions, lexical_engine.answers)
+        }
+
+    def _try_exact(self, question: str):
+        match = self.exact_index.get(normalize_query(question))
+        if match is None:
+            return None
+        return [{'answer': match[1], 'confidence': 1.0, 'source': "완전 일치", 'question': match[0]}]
+
+    def match_exact(self, question: str) -> Optional[dict]:
+        """exact 단계만 실행 (질문 원문이 CSV 질문과 같으면 answer()와 같은 형식의 결과, 아니면 None)"""
+        start = time.perf_counter()
+        results = self._try_exact(question)
+        if not results:
+            return None
+        return {'results': results, 'tier': 'exact',
+                'timings': {'exact': (time.perf_counter() - start) * 1000}, 'scores': {'exact': None}}
+
+    def _try_keyword(self, question: str):
+        """(바로 답할 결과 또는 None, 최고 점수)"""
+        matches = self.lexical_engine.search_similar(question, top_k=self.top_k)
+        matches = sorted(matches, key=lambda m: m[2], reverse=True)
+        top = float(matches[0][2]) if matches else 0.0
+        if top < self.keyword_threshold:
+            return None, top
+        return [
+            {'answer': a, 'confidence': float(score), 'source': "키워드 검색", 'question': q}
+            for q, a, score in matches
+        ], top
+
+    def _try_dense(self, question: str):
+        """(바로 답할 결과 또는 None, 최고 유사도 (벡터스토어가 없으면 None))"""
+        if self.vectorstore is None:
+            return None, None
+        docs_and_scores = self.vectorstore.similarity_search_with_relevance_scores(
+            question, k=max(self.top_k, self.fetch_k or 0))
+        docs_and_scores = collapse_expansions(docs_and_scores, self.vectorstore, k=self.top_k)
+        top = float(docs_and_scores[0][1]) if docs_and_scores else 0.0
+        if top < self.dense_threshold:
+            return None, top
+        return [
+            {'answer': _answer_from_content(doc.page_content), 'confidence': float(score), 'source': "벡터 검색"}
+            for doc, score in docs_and_scores
+        ], top
+
+    @staticmethod
+    def _not_found(tier: str, timings: dict) -> dict:
+        return {
+            'results': [{'answer': NOT_FOUND_ANSWER, 'confidence': 0.1, 'source': "시스템"}],
+            'tier': tier,
+            'timings': timings
+        }
+
+    def answer(self, question: str, full_pipeline: Optional[Callable[[str], dict]] = None) -> dict:
+        """
+        싼 단계부터 차례로 시도하여 답변 생성
+
+        Args:
+            question: 사용자 질문
+            full_pipeline: 이번 호출에만 쓸 마지막 단계 함수 (없으면 생성자에서 받은 함수)
+
+        Returns:
+            {'results': [...], 'tier': 답한 단계 이름, 'timings': {단계: 소요 ms}, 'scores': {단계: 1차 최고 점수}}
+            tier가 'not_found'면 1차 점수가 너무 낮아 전체 파이프라인 없이 끝난 것
+        """
+        timings = {}
+        top_scores = {}
+        rewritten = question
+        if self.query_rewriter is not None:
+            start = time.perf_counter()
+            rewritten = self.query_rewriter(question)
+            timings['rewrite'] = (time.perf_counter() - start) * 1000
+        tiers = [
+            ('exact', lambda: (self._try_exact(question), None)),
+            ('keyword', lambda: self._try_keyword(question)),
+            ('dense', lambda: self._try_dense(rewritten)),
+        ]
+
+        for tier_name, tier_func in tiers:
+            start = time.perf_counter()
+            try:
+                results, top_scores[tier_name] = tier_func()
+            except Exception as e:
+                print(f"[ERROR] {tier_name} 단계 검색 실패: {e}")
+                results, top_scores[tier_name] = None, None
+            timings[tier_name] = (time.perf_counter() - start) * 1000
+            if results:
+                return {'results': results, 'tier': tier_name, 'timings': timings, 'scores': top_scores}
+
+        # 키워드/벡터 모두 관련 문서가 거의 없으면 MultiQuery/Rerank/LLM을 부르지 않음
+        dense_top = top_scores.get('dense')
+        if (self.not_found_threshold is not None and dense_top is not None
+                and dense_top < self.not_found_threshold
+                and (top_scores.get('keyword') or 0.0) < self.keyword_floor):
+            result = self._not_found('not_found', timings)
+            result['scores'] = top_scores
+            return result
+
+        full_pipeline = full_pipeline or self.full_pipeline
+        if full_pipeline is None:
+            return self._not_found('none', timings)
+
+        start = time.perf_counter()
+        result = full_pipeline(rewritten)
+        timings['full'] = (time.perf_counter() - start) * 1000
+        result['tier'] = 'full'
+        result['timings'] = timings
+        result['scores'] = top_scores
+        return result
@@ -0,0 +1,217 @@
+"""
+FAISS 벡터스토어 디스크 캐시 및 증분 인덱서
+임베딩 모델과 문서 템플릿으로 만든 키 아래에 인덱스를 저장하고,
+CSV 행이 바뀌면 바뀐 행만 다시 임베딩하여 인덱스를 갱신합니다.
+
+저장 구조:
+    vectorstore_cache/<index_key>/CURRENT        현재 버전 이름
+    vectorstore_cache/<index_key>/<version>/     index.faiss, index.pkl, rows.json
+
+인덱스는 L2 정규화한 벡터의 내적(= 코사인 유사도)으로 검색하므로,
+similarity_search_with_score / similarity_search_with_relevance_scores의 점수는 높을수록 가까운 실제 유사도입니다.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import warnings
+
+# 인덱스가 저장되는 기본 폴더
+VECTORSTORE_CACHE_DIR = "vectorstore_cache"
+
+# 저장 형식이 바뀌면 올려서 기존 캐시를 모두 무효화 (3: L2 거리 -> 정규화 내적)
+CACHE_FORMAT_VERSION = 3
+
+# LangChain FAISS는 내적 검색에서도 normalize_L2를 그대로 적용하면서 경고만 내므로 숨김
+warnings.filterwarnings("ignore", message="Normalizing L2 is not applicable")
+
+ROWS_MANIFEST = "rows.json"
+CURRENT_POINTER = "CURRENT"
+
+
+def file_sha256(path: str) -> str:
+    """파일 내용의 sha256 해시"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def compute_index_key(index_name: str, embedding_model: str, doc_template: str) -> str:
+    """
+    인덱스 캐시 키 생성
+
+    임베딩 모델이나 문서 템플릿이 바뀌면 벡터 자체가 달라지므로 키가 바뀌어 전체를 새로 만듭니다.
+    CSV 내용 변경은 키가 아닌 행 단위 해시(rows.json)로 추적합니다.
+    """
+    digest = hashlib.sha256()
+    for part in (str(CACHE_FORMAT_VERSION), index_name, embedding_model, doc_template):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()[:32]
+
+
+def row_doc_id(question: str) -> str:
+    """CSV 행의 안정적인 문서 ID (질문 텍스트 기준)"""
+    return hashlib.sha1(str(question).strip().encode('utf-8')).hexdigest()[:16]
+
+
+def document_hash(doc) -> str:
+    """문서 내용 + 메타데이터 해시 (행이 바뀌었는지 판단)"""
+    payload = doc.page_content + '\0' + json.dumps(doc.metadata, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def cosine_relevance(score: float) -> float:
+    """정규화 내적 점수를 0~1 관련도로 (음수 유사도는 0)"""
+    return min(1.0, max(0.0, float(score)))
+
+
+def faiss_options() -> dict:
+    """FAISS 생성/로드 공통 옵션: 정규화 벡터 + 내적 검색"""
+    from langchain_community.vectorstores.utils import DistanceStrategy
+    return {
+        'distance_strategy': DistanceStrategy.MAX_INNER_PRODUCT,
+        'normalize_L2': True,
+        'relevance_score_fn': cosine_relevance,
+    }
+
+
+def _read_current_version(key_dir: str):
+    try:
+        with open(os.path.join(key_dir, CURRENT_POINTER), encoding='utf-8') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def _load_current(key_dir: str, embeddings):
+    """현재 버전의 인덱스와 행 해시 목록 로드 (없거나 깨졌으면 (None, {}))"""
+    from langchain_community.vectorstores import FAISS
+
+    version = _read_current_version(key_dir)
+    if not version:
+        return None, {}
+
+    version_path = os.path.join(key_dir, version)
+    try:
+        vectorstore = FAISS.load_local(
+            version_path,
+            embeddings,
+            allow_dangerous_deserialization=True,
+            **faiss_options()
+        )
+        with open(os.path.join(version_path, ROWS_MANIFEST), encoding='utf-8') as f:
+            row_hashes = json.load(f)
+        return vectorstore, row_hashes
+    except Exception as e:
+        print(f"[ERROR] 캐시된 벡터스토어 로드 실패, 새로 생성합니다: {e}")
+        return None, {}
+
+
+def _manifest_version(row_hashes: dict) -> str:
+    payload = json.dumps(row_hashes, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+
+def _persist(vectorstore, row_hashes: dict, key_dir: str) -> str:
+    """
+    새 버전 폴더에 저장한 뒤 CURRENT 포인터를 원자적으로 교체
+
+    다른 워커가 반쯤 쓴 인덱스를 읽지 않도록 항상 완성된 폴더만 가리킵니다.
+    """
+    version = _manifest_version(row_hashes)
+    version_path = os.path.join(key_dir, version)
+
+    if not os.path.isdir(version_path):
+        tmp_path = tempfile.mkdtemp(prefix=f".{version}.", dir=key_dir)
+        vectorstore.save_local(tmp_path)
+        with open(os.path.join(tmp_path, ROWS_MANIFEST), 'w', encoding='utf-8') as f:
+            json.dump(row_hashes, f)
+        try:
+            os.rename(tmp_path, version_path)
+        except OSError:
+            # 다른 워커가 같은 버전을 먼저 저장한 경우
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    fd, tmp_pointer = tempfile.mkstemp(prefix=".CURRENT.", dir=key_dir)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(tmp_pointer, os.path.join(key_dir, CURRENT_POINTER))
+
+    prune_stale_versions(version, key_dir)
+    return version
+
+
+def sync_faiss_index(documents: dict, embeddings, index_key: str, cache_dir: str = VECTORSTORE_CACHE_DIR):
+    """
+    저장된 FAISS 인덱스를 현재 문서 목록과 동기화 (증분 인덱서)
+
+    새로 생긴 행과 내용이 바뀐 행만 임베딩하고, 사라진 행은 문서 ID로 삭제합니다.
+    재인덱싱 비용이 전체 행 수가 아니라 바뀐 행 수에 비례합니다.
+
+    Args:
+        documents: {문서 ID: Document} 딕셔너리 (row_doc_id 사용 권장)
+        embeddings: LangChain 임베딩 객체
+        index_key: compute_index_key()로 만든 캐시 키
+        cache_dir: 인덱스 저장 폴더
+
+    Returns:
+        (vectorstore, 통계 딕셔너리) 튜플
+        통계: {'version', 'added', 'updated', 'removed', 'from_cache'}
+    """
+    from langchain_community.vectorstores import FAISS
+
+    key_dir = os.path.join(cache_dir, index_key)
+    os.makedirs(key_dir, exist_ok=True)
+
+    vectorstore, old_hashes = _load_current(key_dir, embeddings)
+    new_hashes = {doc_id: document_hash(doc) for doc_id, doc in documents.items()}
+
+    removed = [doc_id for doc_id in old_hashes if doc_id not in new_hashes]
+    updated = [doc_id for doc_id, h in new_hashes.items() if doc_id in old_hashes and old_hashes[doc_id] != h]
+    added = [doc_id for doc_id in new_hashes if doc_id not in old_hashes]
+    stats = {
+        'added': len(added),
+        'updated': len(updated),
+        'removed': len(removed),
+        'from_cache': vectorstore is not None,
+    }
+
+    if vectorstore is not None and not (removed or updated or added):
+        stats['version'] = _read_current_version(key_dir)
+        print(f"[DEBUG] 캐시된 벡터스토어 로드 (변경 없음): {key_dir}")
+        return vectorstore, stats
+
+    if vectorstore is None:
+        ids = list(documents.keys())
+        vectorstore = FAISS.from_documents([documents[i] for i in ids], embeddings, ids=ids, **faiss_options())
+        print(f"[DEBUG] 벡터스토어 새로 생성: {len(ids)}개 문서")
+    else:
+        # 바뀐 행은 삭제 후 다시 추가
+        stale_ids = removed + updated
+        if stale_ids:
+            vectorstore.delete(stale_ids)
+        fresh_ids = updated + added
+        if fresh_ids:
+            vectorstore.add_documents([documents[i] for i in fresh_ids], ids=fresh_ids)
+        print(f"[DEBUG] 벡터스토어 증분 갱신: 추가 {len(added)}, 변경 {len(updated)}, 삭제 {len(removed)}")
+
+    try:
+        stats['version'] = _persist(vectorstore, new_hashes, key_dir)
+    except Exception as e:
+        print(f"[ERROR] 벡터스토어 저장 실패 (메모리 인덱스로 계속 진행): {e}")
+        stats['version'] = _manifest_version(new_hashes)
+
+    return vectorstore, stats
+
+
+def prune_stale_versions(current_version: str, key_dir: str):
+    """현재 버전이 아닌 오래된 인덱스 폴더 정리"""
+    for name in os.listdir(key_dir):
+        path = os.path.join(key_dir, name)
+        if name == current_version or name.startswith('.') or not os.path.isdir(path):
+            continue
+        shutil.rmtree(path, ignore_errors=True)
@@ -1,11 +1,13 @@
 import pandas as pd
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import pickle
 import os
 from typing import List, Tuple
 import re
+from rag_index_store import load_index, restore_tfidf, save_index, tfidf_params, tfidf_vocab, top_k_indices
+from rag_corpus import get_corpus
+from rag_store import VECTORSTORE_CACHE_DIR
+from query_rewriter import rewrite_query
 
 class SchoolInfoRAG:
     def __init__(self, csv_path: str = "data/school_info.csv"):
@@ -16,29 +18,29 @@ class SchoolInfoRAG:
             csv_path: CSV 파일 경로
         """
         self.csv_path = csv_path
+        self.corpus = None
         self.data = None
         self.vectorizer = None
         self.question_vectors = None
         self.answers = None
         self.questions = None
         
-        # 모델 저장 경로
-        self.model_path = "rag_model.pkl"
+        # 인덱스 저장 폴더 (manifest.json + .npy 배열)
+        self.index_dir = os.path.join(VECTORSTORE_CACHE_DIR, "rag_tfidf")
         
         # 데이터 로드 및 초기화
         self.load_data()
         
-        # 기존 모델이 있으면 로드, 없으면 새로 생성
-        if os.path.exists(self.model_path):
-            self.load_model()
-        else:
+        # 현재 CSV로 만든 인덱스가 있으면 로드, 없거나 오래되었으면 새로 생성
+        if not self.load_model():
             self.build_model()
             self.save_model()
     
     def load_data(self):
-        """CSV 데이터 로드"""
+        """CSV 데이터 로드 (프로세스 공유 코퍼스 사용)"""
         try:
-            self.data = pd.read_csv(self.csv_path)
+            self.corpus = get_corpus(self.csv_path)
+            self.data = self.corpus.data
             print(f"데이터 로드 완료: {len(self.data)}개 질문-답변 쌍")
         except Exception as e:
             print(f"데이터 로드 실패: {e}")
@@ -60,25 +62,30 @@ class SchoolInfoRAG:
         
         return text.lower()
     
+    @staticmethod
+    def create_vectorizer() -> TfidfVectorizer:
+        """TF-IDF 벡터화 설정"""
+        return TfidfVectorizer(
+            max_features=1000,
+            ngram_range=(1, 2),  # 1-gram과 2-gram 사용
+            stop_words=None,  # 한글에는 기본 불용어 사전이 없음
+            sublinear_tf=True,
+            norm='l2'
+        )
+    
     def build_model(self):
         """RAG 모델 구축"""
         print("RAG 모델 구축 시작...")
         
         # 질문과 답변 추출
-        self.questions = self.data['question'].fillna('').astype(str).tolist()
-        self.answers = self.data['answer'].fillna('').astype(str).tolist()
+        self.questions = self.corpus.questions
+        self.answers = self.corpus.answers
         
         # 질문 텍스트 전처리
         processed_questions = [self.preprocess_text(q) for q in self.questions]
         
         # TF-IDF 벡터화
-        self.vectorizer = TfidfVectorizer(
-            max_features=1000,
-            ngram_range=(1, 2),  # 1-gram과 2-gram 사용
-            stop_words=None,  # 한글에는 기본 불용어 사전이 없음
-            sublinear_tf=True,
-            norm='l2'
-        )
+        self.vectorizer = self.create_vectorizer()
         
         # 질문들을 벡터화
         self.question_vectors = self.vectorizer.fit_transform(processed_questions)
@@ -86,36 +93,40 @@ class SchoolInfoRAG:
         print("RAG 모델 구축 완료")
     
     def save_model(self):
-        """모델 저장"""
-        model_data = {
-            'vectorizer': self.vectorizer,
-            'question_vectors': self.question_vectors,
-            'questions': self.questions,
-            'answers': self.answers
-        }
-        
-        with open(self.model_path, 'wb') as f:
-            pickle.dump(model_data, f)
-        
-        print("모델 저장 완료")
-    
-    def load_model(self):
-        """저장된 모델 로드"""
+        """모델 저장 (TF-IDF 설정/어휘는 manifest, idf와 질문 벡터는 .npy)"""
         try:
-            with open(self.model_path, 'rb') as f:
-                model_data = pickle.load(f)
-            
-            self.vectorizer = model_data['vectorizer']
-            self.question_vectors = model_data['question_vectors']
-            self.questions = model_data['questions']
-            self.answers = model_data['answers']
-            
-            print("저장된 모델 로드 완료")
+            save_index(
+                self.index_dir, self.csv_path, engine="tfidf",
+                params=tfidf_params(self.vectorizer),
+                vocab=tfidf_vocab(self.vectorizer),
+                sparse_arrays={'question_vectors': self.question_vectors},
+                dense_arrays={'idf': self.vectorizer.idf_}
+            )
+            print("모델 저장 완료")
         except Exception as e:
-            print(f"모델 로드 실패: {e}")
-            print("새 모델을 생성합니다...")
-            self.build_model()
-            self.save_model()
+            print(f"모델 저장 실패: {e}")
+    
+    def load_model(self) -> bool:
+        """
+        저장된 모델 로드
+        
+        Returns:
+            로드 성공 여부 (인덱스가 없거나 CSV/설정이 바뀌었으면 False)
+        """
+        index = load_index(self.index_dir, self.csv_path, engine="tfidf",
+                           params=tfidf_params(self.create_vectorizer()))
+        if index is None:
+            return False
+        
+        manifest = index['manifest']
+        self.vectorizer = restore_tfidf(manifest['params'], manifest['vocab'], index['dense']['idf'])
+        self.question_vectors = index['sparse']['question_vectors']
+        # 인덱스가 현재 CSV로 만든 것이므로 질문/답변은 CSV에서 바로 가져옴
+        self.questions = self.corpus.questions
+        self.answers = self.corpus.answers
+        
+        print("저장된 모델 로드 완료")
+        return True
     
     def search_similar(self, query: str, top_k: int = 3) -> List[Tuple[str, str, float]]:
         """
@@ -130,26 +141,40 @@ class SchoolInfoRAG:
         """
         if not query.strip():
             return []
+        return self.search_many([query], top_k)[0]
+    
+    def search_many(self, queries: List[str], top_k: int = 3) -> List[List[Tuple[str, str, float]]]:
+        """
+        여러 질문을 한 번에 검색
         
-        # 질문 전처리 및 벡터화
-        processed_query = self.preprocess_text(query)
-        query_vector = self.vectorizer.transform([processed_query])
+        질문 벡터를 한 행렬로 쌓아 문서 벡터와 희소 행렬곱 한 번으로 점수를 구하고,
+        행마다 argpartition으로 상위 k개만 고릅니다. (벡터가 모두 L2 정규화되어 있어 내적 = 코사인 유사도)
         
-        # 코사인 유사도 계산
-        similarities = cosine_similarity(query_vector, self.question_vectors).flatten()
+        Args:
+            queries: 질문 리스트
+            top_k: 질문별로 반환할 상위 결과 개수
+            
+        Returns:
+            질문 순서대로 (question, answer, similarity_score) 리스트
+        """
+        if not queries:
+            return []
+        queries = [rewrite_query(query, self.csv_path) for query in queries]
         
-        # 상위 k개 결과 선택
-        top_indices = similarities.argsort()[-top_k:][::-1]
+        query_vectors = self.vectorizer.transform([self.preprocess_text(q) for q in queries])
+        similarities = (query_vectors @ self.question_vectors.T).toarray()
+        top_indices = top_k_indices(similarities, top_k)
         
         results = []
-        for idx in top_indices:
-            if similarities[idx] > 0:  # 유사도가 0보다 큰 경우만
-                results.append((
-                    self.questions[idx],
-                    self.answers[idx],
-                    float(similarities[idx])
-                ))
-        
+        for query, row, indices in zip(queries, similarities, top_indices):
+            if not query.strip():
+                results.append([])
+                continue
+            # 유사도가 0보다 큰 경우만
+            results.append([
+                (self.questions[idx], self.answers[idx], float(row[idx]))
+                for idx in indices if row[idx] > 0
+            ])
         return results
     
     def get_answer(self, query: str, threshold: float = 0.1) -> dict:
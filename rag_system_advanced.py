@@ -2,27 +2,26 @@
 LangChain 기반 고급 RAG 시스템
 MultiQueryRetriever와 개선된 데이터 처리를 통한 검색 정확도 향상
 """
-import pandas as pd
-import numpy as np
-import os
 import warnings
-from typing import List, Dict, Any, Optional
-import pickle
-from pathlib import Path
+from typing import List, Dict, Any
 
 warnings.filterwarnings("ignore")
 
 # LangChain imports (최신 버전 사용)
 from langchain.docstore.document import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain.retrievers.multi_query import MultiQueryRetriever
-from langchain.chains import RetrievalQA
+from llm_cassette import create_chat_model
 from langchain.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
+
+from rag_store import compute_index_key, sync_faiss_index
+from rag_corpus import get_corpus
+from embedding_cache import get_shared_embeddings
+from rag_retrievers import ParallelMultiQueryRetriever, ScoredVectorStoreRetriever, document_score
+from rag_expansion import FETCH_FACTOR, expansion_documents
+from query_rewriter import rewrite_query
+
+# 벡터스토어에 들어가는 문서 형식 (바뀌면 인덱스가 새로 만들어짐)
+DOC_TEMPLATE = "질문: {question}\n답변: {answer}"
 
 class AdvancedSchoolInfoRAG:
     def __init__(self, csv_path: str = "data/school_info.csv"):
@@ -39,8 +38,9 @@ class AdvancedSchoolInfoRAG:
         self.llm = None
         self.documents = None
         self.embedding_model = None
+        self.embedding_model_name = None
         
-        # 저장 경로
+        # 저장 경로 (vectorstore_cache 안에서 인덱스 이름으로 사용)
         self.vectorstore_path = "vectorstore_advanced"
         self.cache_path = "rag_cache_advanced.pkl"
         
@@ -51,21 +51,21 @@ class AdvancedSchoolInfoRAG:
         """CSV 데이터를 로드하고 LangChain Document 형태로 변환"""
         try:
             print("CSV 데이터 로드 및 처리 중...")
-            df = pd.read_csv(self.csv_path)
-            print(f"총 {len(df)}개의 질문-답변 쌍 로드됨")
+            corpus = get_corpus(self.csv_path)
+            print(f"총 {len(corpus)}개의 질문-답변 쌍 로드됨")
             
             # Document 객체 생성 - 질문과 답변을 하나의 문서로 결합
             documents = []
-            for index, row in df.iterrows():
+            for doc_id, question, answer in corpus.rows():
                 # 질문과 답변을 자연스러운 형태로 결합
-                content = f"질문: {row['question']}\n답변: {row['answer']}"
+                content = DOC_TEMPLATE.format(question=question, answer=answer)
                 
-                # 메타데이터 추가 (검색 결과 추적용)
+                # 메타데이터 추가 (검색 결과 추적용, 행 위치가 아닌 질문 기준 ID 사용)
                 metadata = {
-                    'source': f"school_info_row_{index}",
-                    'question': str(row['question']),
-                    'answer': str(row['answer']),
-                    'row_index': index
+                    'source': f"school_info_row_{doc_id}",
+                    'question': question,
+                    'answer': answer,
+                    'doc_id': doc_id
                 }
                 
                 doc = Document(page_content=content, metadata=metadata)
@@ -84,7 +84,8 @@ class AdvancedSchoolInfoRAG:
         try:
             # OpenAI 임베딩 시도
             print("OpenAI 임베딩 모델 초기화 중...")
-            self.embedding_model = OpenAIEmbeddings()
+            self.embedding_model_name = "text-embedding-ada-002"
+            self.embedding_model = get_shared_embeddings(self.embedding_model_name)
             print("OpenAI 임베딩 모델 설정 완료")
             return True
         except Exception as e:
@@ -92,9 +93,8 @@ class AdvancedSchoolInfoRAG:
             try:
                 # HuggingFace 임베딩으로 대체
                 print("HuggingFace 임베딩 모델로 대체 중...")
-                self.embedding_model = HuggingFaceEmbeddings(
-                    model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
-                )
+                self.embedding_model_name = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+                self.embedding_model = get_shared_embeddings(self.embedding_model_name, provider="huggingface")
                 print("HuggingFace 임베딩 모델 설정 완료")
                 return True
             except Exception as e2:
@@ -102,26 +102,8 @@ class AdvancedSchoolInfoRAG:
                 return False
     
     def create_vectorstore(self):
-        """벡터 스토어 생성 또는 로드"""
+        """벡터 스토어 로드 후 바뀐 행만 증분 갱신"""
         try:
-            # 기존 벡터 스토어가 있으면 로드 시도
-            if os.path.exists(self.vectorstore_path):
-                try:
-                    print("기존 벡터 스토어 로드 중...")
-                    self.vectorstore = FAISS.load_local(
-                        self.vectorstore_path, 
-                        self.embedding_model,
-                        allow_dangerous_deserialization=True
-                    )
-                    print("기존 벡터 스토어 로드 완료")
-                    return True
-                except Exception as e:
-                    print(f"기존 벡터 스토어 로드 실패: {e}")
-                    print("새로운 벡터 스토어를 생성합니다.")
-            
-            # 새로운 벡터 스토어 생성
-            print("새로운 벡터 스토어 생성 중...")
-            
             # 텍스트 분할 (필요시)
             text_splitter = RecursiveCharacterTextSplitter(
                 chunk_size=1000,
@@ -129,24 +111,31 @@ class AdvancedSchoolInfoRAG:
                 length_function=len,
             )
             
-            # 문서가 너무 길 경우에만 분할
-            processed_docs = []
+            # 문서가 너무 길 경우에만 분할 (분할된 조각은 행 ID 뒤에 번호를 붙임)
+            processed_docs = {}
             for doc in self.documents:
+                doc_id = doc.metadata['doc_id']
                 if len(doc.page_content) > 800:
                     splits = text_splitter.split_documents([doc])
-                    processed_docs.extend(splits)
+                    for i, split in enumerate(splits):
+                        processed_docs[f"{doc_id}-{i}"] = split
                 else:
-                    processed_docs.append(doc)
+                    processed_docs[doc_id] = doc
             
-            # FAISS 벡터 스토어 생성
-            self.vectorstore = FAISS.from_documents(
-                processed_docs,
-                self.embedding_model
-            )
+            # 행별 변형 질문 (별칭, 반 표기, 담당자 이름)을 같은 행을 가리키는 문서로 추가
+            row_metadata = {doc.metadata['doc_id']: doc.metadata for doc in self.documents}
+            try:
+                processed_docs.update(expansion_documents(
+                    get_corpus(self.csv_path), DOC_TEMPLATE,
+                    metadata_of=lambda doc_id, question, answer: row_metadata[doc_id]
+                ))
+            except Exception as e:
+                print(f"문서 확장 실패 (원래 행만 색인): {e}")
             
-            # 벡터 스토어 저장
-            self.vectorstore.save_local(self.vectorstore_path)
-            print(f"벡터 스토어 생성 및 저장 완료 (총 {len(processed_docs)}개 문서)")
+            index_key = compute_index_key(self.vectorstore_path, self.embedding_model_name, DOC_TEMPLATE)
+            self.vectorstore, stats = sync_faiss_index(processed_docs, self.embedding_model, index_key)
+            print(f"벡터 스토어 준비 완료 (총 {len(processed_docs)}개 문서, "
+                  f"추가 {stats['added']}, 변경 {stats['updated']}, 삭제 {stats['removed']})")
             
             return True
             
@@ -157,7 +146,7 @@ class AdvancedSchoolInfoRAG:
     def setup_llm(self):
         """LLM 설정"""
         try:
-            self.llm = ChatOpenAI(
+            self.llm = create_chat_model(
                 model="gpt-4o-mini",  # 비용 효율적인 모델 사용
                 temperature=0.1,
                 max_tokens=1000
@@ -172,18 +161,17 @@ class AdvancedSchoolInfoRAG:
         """검색기 설정 - 기본 retriever와 MultiQueryRetriever"""
         try:
             # 기본 retriever 설정
-            self.retriever = self.vectorstore.as_retriever(
-                search_type="similarity",
-                search_kwargs={
-                    "k": 5,  # 더 많은 결과 검색
-                    "score_threshold": 0.3  # 임계값 낮춤
-                }
+            self.retriever = ScoredVectorStoreRetriever(
+                vectorstore=self.vectorstore,
+                k=5,  # 더 많은 결과 검색
+                fetch_k=5 * FETCH_FACTOR,  # 확장 변형까지 가져와 행 단위로 합침
+                score_threshold=0.3  # 코사인 유사도 기준 (예전에는 L2 거리에 적용되어 대부분 걸러짐)
             )
             
             # MultiQueryRetriever 설정 (핵심 개선점)
             if self.llm:
                 print("MultiQueryRetriever 설정 중...")
-                self.multi_query_retriever = MultiQueryRetriever.from_llm(
+                self.multi_query_retriever = ParallelMultiQueryRetriever.from_llm(
                     retriever=self.retriever,
                     llm=self.llm,
                     prompt=self._get_multi_query_prompt()
@@ -244,7 +232,8 @@ class AdvancedSchoolInfoRAG:
             raise
     
     def search_with_multi_query(self, query: str, use_multi_query: bool = True) -> List[Document]:
-        """MultiQueryRetriever를 사용한 검색"""
+        """MultiQueryRetriever를 사용한 검색 (별칭을 대표 표기로 바꾼 질문 사용)"""
+        query = rewrite_query(query, self.csv_path)
         try:
             if use_multi_query and self.multi_query_retriever:
                 print(f"MultiQueryRetriever로 검색: '{query}'")
@@ -312,8 +301,9 @@ class AdvancedSchoolInfoRAG:
                         continue
                     seen_answers.add(answer)
                     
-                    # 간단한 신뢰도 점수 계산 (검색 순서 기반)
-                    confidence = max(0.9 - i * 0.15, 0.1)
+                    # 신뢰도: 리랭크 관련도 또는 코사인 유사도 (점수가 없는 문서만 0.5)
+                    score = document_score(doc)
+                    confidence = score if score is not None else 0.5
                     
                     results.append({
                         'answer': answer,
@@ -1,136 +1,209 @@
-import pandas as pd
+import numpy as np
 import re
+from scipy import sparse
 from typing import List, Tuple, Dict
-import json
-import os
+from rag_corpus import get_corpus
+from rag_expansion import build_expansions
+from query_rewriter import rewrite_query
+from rag_router import DEFAULT_KEYWORD_THRESHOLD
+
+# BM25 파라미터
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 한글 문자 n-gram 길이 ("행정실의"와 "행정실"이 "행정", "정실", "행정실"을 공유하도록)
+NGRAM_SIZES = (2, 3)
 
 class SchoolInfoRAGLite:
-    def __init__(self, csv_path: str = "data/school_info.csv"):
+    def __init__(self, csv_path: str = "data/school_info.csv", expansion: str = None):
         """
         가벼운 학교 정보 RAG 시스템 (의존성 최소화)
         
         Args:
             csv_path: CSV 파일 경로
+            expansion: 문서 확장 방식 ("rules" / "llm" / "off", 없으면 RAG_DOC_EXPANSION 환경 변수)
         """
         self.csv_path = csv_path
+        self.expansion = expansion
+        self.corpus = None
         self.data = None
         self.questions = []
         self.answers = []
-        self.keywords_index = {}
+        self.exact_index = {}   # 정규화된 질문 -> 행 번호
+        self.term_index = {}    # n-gram -> 열 번호
+        self.idf = None
+        self.postings = None    # (용어 수 x 색인 단위 수) BM25 가중치 희소 행렬
+        self.unit_rows = None   # 색인 단위 -> 행 번호 (앞쪽 len(questions)개는 원래 행, 나머지는 확장 변형)
         
         # 데이터 로드 및 초기화
         self.load_data()
         self.build_keyword_index()
     
     def load_data(self):
-        """CSV 데이터 로드"""
+        """CSV 데이터 로드 (프로세스 공유 코퍼스 사용)"""
         try:
-            self.data = pd.read_csv(self.csv_path)
-            self.questions = self.data['question'].fillna('').astype(str).tolist()
-            self.answers = self.data['answer'].fillna('').astype(str).tolist()
+            corpus = get_corpus(self.csv_path)
+            self.corpus = corpus
+            self.data = corpus.data
+            self.questions = corpus.questions
+            self.answers = corpus.answers
             print(f"데이터 로드 완료: {len(self.data)}개 질문-답변 쌍")
         except Exception as e:
             print(f"데이터 로드 실패: {e}")
             raise
     
-    def extract_keywords(self, text: str) -> set:
-        """텍스트에서 키워드 추출"""
-        # 한글, 영문, 숫자만 추출
-        text = re.sub(r'[^\w\s가-힣]', ' ', text.lower())
-        keywords = set(re.findall(r'\b\w+\b', text))
+    @staticmethod
+    def normalize(text: str) -> str:
+        """완전 일치용 정규화 (소문자, 공백 정리, 끝 문장부호 제거)"""
+        text = re.sub(r'\s+', ' ', str(text).lower()).strip()
+        return text.rstrip(' ?!.~')
+    
+    def tokenize(self, text: str) -> List[str]:
+        """
+        검색 용어 추출 (중복 포함)
         
-        # 한 글자 키워드는 제외 (조사, 어미 등)
-        keywords = {kw for kw in keywords if len(kw) > 1}
+        - 한글: 단어별 문자 2/3-gram ("행정실의" -> "행정", "정실", "행정실", ... 이라 조사가 붙어도 매칭됨)
+        - 영문/숫자: 단어 그대로 ("1-2", "wifi", "010-1234-5678")
+        """
+        text = str(text).lower()
+        terms = re.findall(r'[a-z]+|\d+(?:-\d+)*', text)
         
-        return keywords
+        for word in re.findall(r'[가-힣]+', text):
+            if len(word) == 1:
+                # 한 글자 단어는 n-gram이 나오지 않으므로 그대로 사용 ("반", "실")
+                terms.append(word)
+                continue
+            for n in NGRAM_SIZES:
+                terms.extend(word[i:i + n] for i in range(len(word) - n + 1))
+        return terms
+    
+    def extract_keywords(self, text: str) -> set:
+        """텍스트에서 검색 용어 집합 추출"""
+        return set(self.tokenize(text))
+    
+    def _index_units(self) -> List[Tuple[int, str]]:
+        """
+        색인 단위 (행 번호, 텍스트) 목록: 원래 행 + 행마다 미리 만든 변형 질문 (rag_expansion)
+        
+        변형은 "변형 질문 + 원래 답변"으로 따로 색인하고 검색 때 행별 최고 점수를 쓰므로,
+        "교무행정실", "6학년 2반"처럼 원래 질문에 없는 표현으로 물어도 같은 행이 나옵니다.
+        """
+        units = [(i, f"{q} {a}") for i, (q, a) in enumerate(zip(self.questions, self.answers))]
+        if self.corpus is None:
+            return units
+        try:
+            expansions = build_expansions(self.corpus, self.expansion)
+        except Exception as e:
+            print(f"문서 확장 실패 (원래 행만 색인): {e}")
+            return units
+        for i, doc_id in enumerate(self.corpus.doc_ids):
+            units.extend((i, f"{text} {self.answers[i]}") for text in expansions.get(doc_id, []))
+        return units
     
     def build_keyword_index(self):
-        """키워드 인덱스 구축"""
+        """n-gram 역색인 구축 (질문+답변 텍스트와 변형 질문에 대한 BM25 가중치를 미리 계산)"""
         print("키워드 인덱스 구축 중...")
         
+        self.exact_index = {}
         for i, question in enumerate(self.questions):
-            keywords = self.extract_keywords(question)
-            
-            for keyword in keywords:
-                if keyword not in self.keywords_index:
-                    self.keywords_index[keyword] = []
-                self.keywords_index[keyword].append(i)
-        
-        print(f"키워드 인덱스 구축 완료: {len(self.keywords_index)}개 키워드")
-    
-    def calculate_similarity(self, query: str, question: str) -> float:
-        """문자열 유사도 계산 (간단한 방법)"""
-        query_keywords = self.extract_keywords(query)
-        question_keywords = self.extract_keywords(question)
+            self.exact_index.setdefault(self.normalize(question), i)
         
-        if not query_keywords or not question_keywords:
-            return 0.0
+        units = self._index_units()
+        self.unit_rows = np.fromiter((row for row, _ in units), dtype=np.int64, count=len(units))
         
-        # Jaccard 유사도 계산
-        intersection = len(query_keywords & question_keywords)
-        union = len(query_keywords | question_keywords)
+        rows, cols, counts = [], [], []
+        doc_lengths = np.zeros(len(units), dtype=np.float32)
+        for i, (_, text) in enumerate(units):
+            terms = self.tokenize(text)
+            doc_lengths[i] = len(terms)
+            tf: Dict[str, int] = {}
+            for term in terms:
+                tf[term] = tf.get(term, 0) + 1
+            for term, count in tf.items():
+                rows.append(self.term_index.setdefault(term, len(self.term_index)))
+                cols.append(i)
+                counts.append(count)
         
-        if union == 0:
-            return 0.0
+        n_docs = len(units)
+        tf_matrix = sparse.csr_matrix(
+            (np.asarray(counts, dtype=np.float32), (rows, cols)),
+            shape=(len(self.term_index), n_docs)
+        )
         
-        jaccard_similarity = intersection / union
+        df = np.diff(tf_matrix.indptr).astype(np.float32)
+        self.idf = np.log((n_docs - df + 0.5) / (df + 0.5) + 1.0).astype(np.float32)
         
-        # 길이 보정 (더 긴 문장일수록 매칭이 어려우므로)
-        length_factor = min(len(query_keywords), len(question_keywords)) / max(len(query_keywords), len(question_keywords))
+        # tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl)) * idf
+        avg_length = float(doc_lengths.mean()) if n_docs else 1.0
+        length_norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths / max(avg_length, 1.0))
+        coo = tf_matrix.tocoo()
+        weights = coo.data * (BM25_K1 + 1) / (coo.data + length_norm[coo.col]) * self.idf[coo.row]
+        self.postings = sparse.csr_matrix((weights, (coo.row, coo.col)), shape=tf_matrix.shape)
         
-        return jaccard_similarity * length_factor
+        print(f"키워드 인덱스 구축 완료: {len(self.term_index)}개 n-gram, 색인 단위 {n_docs}개 (확장 {n_docs - len(self.questions)}개)")
     
-    def search_by_exact_match(self, query: str) -> List[Tuple[str, str, float]]:
-        """정확한 매칭 검색"""
-        results = []
-        query_lower = query.lower()
+    def score(self, query: str) -> np.ndarray:
+        """
+        모든 문서의 BM25 점수 (정규화)
         
-        for i, question in enumerate(self.questions):
-            question_lower = question.lower()
-            
-            # 완전 매칭
-            if query_lower == question_lower:
-                results.append((question, self.answers[i], 1.0))
-            # 부분 매칭
-            elif query_lower in question_lower or question_lower in query_lower:
-                # 더 정확한 유사도 계산
-                similarity = self.calculate_similarity(query, question)
-                if similarity > 0:
-                    results.append((question, self.answers[i], similarity))
-        
-        return results
+        질문 용어를 모두 한 번씩 가진 평균 길이 문서의 점수(= 질문 용어 idf 합)로 나눕니다.
+        짧은 문서나 용어가 여러 번 나오는 문서는 1을 넘을 수 있습니다 (순위용, 신뢰도는 1로 자름).
+        """
+        scores = np.zeros(len(self.questions), dtype=np.float32)
+        term_ids: Dict[int, int] = {}
+        for term in self.tokenize(query):
+            col = self.term_index.get(term)
+            if col is not None:
+                term_ids[col] = term_ids.get(col, 0) + 1
+        if not term_ids:
+            return scores
+        
+        ids = np.fromiter(term_ids.keys(), dtype=np.int64)
+        query_tf = np.fromiter(term_ids.values(), dtype=np.float32)
+        unit_scores = np.asarray(self.postings[ids].T @ query_tf).ravel()
+        
+        # 행 점수 = 원래 행과 그 변형들 중 최고 점수
+        n_rows = len(self.questions)
+        scores = unit_scores[:n_rows].copy()
+        if len(unit_scores) > n_rows:
+            np.maximum.at(scores, self.unit_rows[n_rows:], unit_scores[n_rows:])
+        
+        # 색인에 없는 용어도 분모에는 포함 (질문 일부만 맞는 문서가 높은 점수를 받지 않도록)
+        n_terms = len(self.tokenize(query))
+        max_score = float(self.idf[ids] @ query_tf) + (n_terms - int(query_tf.sum())) * float(self.idf.max())
+        return scores / max_score if max_score > 0 else scores
+    
+    def search_by_exact_match(self, query: str) -> List[Tuple[str, str, float]]:
+        """정확한 매칭 검색 (해시 조회)"""
+        i = self.exact_index.get(self.normalize(query))
+        if i is None:
+            return []
+        return [(self.questions[i], self.answers[i], 1.0)]
     
     def search_by_keywords(self, query: str, top_k: int = 5) -> List[Tuple[str, str, float]]:
-        """키워드 기반 검색"""
-        query_keywords = self.extract_keywords(query)
-        
-        if not query_keywords:
+        """
+        키워드(n-gram BM25) 기반 검색
+
+        원문 최고 점수가 라우터의 keyword 기준(DEFAULT_KEYWORD_THRESHOLD) 이상이면 원문 점수만 쓰고,
+        아니면 별칭을 대표 표기로 바꾼 질문의 점수와 행마다 큰 값을 씀 (재작성이 원문 결과를 밀어내지 않도록)
+        """
+        scores = self.score(query)
+        if scores.max(initial=0.0) < DEFAULT_KEYWORD_THRESHOLD:
+            rewritten = rewrite_query(query, self.csv_path)
+            if rewritten != query:
+                scores = np.maximum(scores, self.score(rewritten))
+        if not scores.any():
             return []
         
-        # 각 질문에 대한 점수 계산
-        question_scores = {}
-        
-        for keyword in query_keywords:
-            if keyword in self.keywords_index:
-                for question_idx in self.keywords_index[keyword]:
-                    if question_idx not in question_scores:
-                        question_scores[question_idx] = 0
-                    question_scores[question_idx] += 1
-        
-        # 점수를 유사도로 변환하고 정렬
-        results = []
-        for question_idx, score in question_scores.items():
-            similarity = score / len(query_keywords)  # 정규화
-            results.append((
-                self.questions[question_idx],
-                self.answers[question_idx],
-                similarity
-            ))
-        
-        # 유사도 순으로 정렬
-        results.sort(key=lambda x: x[2], reverse=True)
-        
-        return results[:top_k]
+        # 전체 정렬 대신 argpartition으로 상위 k개만 뽑은 뒤 그 안에서 정렬
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        
+        return [
+            (self.questions[i], self.answers[i], min(float(scores[i]), 1.0))
+            for i in top if scores[i] > 0
+        ]
     
     def search_similar(self, query: str, top_k: int = 3) -> List[Tuple[str, str, float]]:
         """유사한 질문-답변 검색"""
@@ -140,29 +213,12 @@ class SchoolInfoRAGLite:
         # 1. 정확한 매칭 먼저 시도
         exact_results = self.search_by_exact_match(query)
         if exact_results:
-            return exact_results[:top_k]
+            # 나머지 자리는 키워드 결과로 채움
+            others = [r for r in self.search_by_keywords(query, top_k + 1) if r[0] != exact_results[0][0]]
+            return (exact_results + others)[:top_k]
         
         # 2. 키워드 기반 검색
-        keyword_results = self.search_by_keywords(query, top_k)
-        
-        # 3. 추가적으로 모든 질문과 유사도 계산 (상위 결과가 부족한 경우)
-        if len(keyword_results) < top_k:
-            all_similarities = []
-            
-            for i, question in enumerate(self.questions):
-                # 이미 키워드 검색에서 찾은 것은 제외
-                if not any(question == result[0] for result in keyword_results):
-                    similarity = self.calculate_similarity(query, question)
-                    if similarity > 0:
-                        all_similarities.append((question, self.answers[i], similarity))
-            
-            # 유사도 순으로 정렬
-            all_similarities.sort(key=lambda x: x[2], reverse=True)
-            
-            # 키워드 결과와 합치기
-            keyword_results.extend(all_similarities[:top_k - len(keyword_results)])
-        
-        return keyword_results[:top_k]
+        return self.search_by_keywords(query, top_k)
     
     def get_answer(self, query: str, threshold: float = 0.1) -> dict:
         """질문에 대한 답변 생성"""
@@ -2,27 +2,33 @@
 LangChain MultiQueryRetriever 기반 고급 RAG 시스템
 검색 정확도 극대화를 위한 다중 질문 생성 및 검색
 """
-import pandas as pd
-import os
 import warnings
 from typing import List, Dict, Any
-import pickle
 from dotenv import load_dotenv
 
 # .env 파일 로드
 load_dotenv()
 warnings.filterwarnings("ignore")
 
+# 벡터스토어에 들어가는 문서 형식 (바뀌면 인덱스가 새로 만들어짐)
+DOC_TEMPLATE = "질문: {question}\n답변: {answer}"
+
+# 폴백 검색에서 남길 최소 코사인 유사도 (예전 L2 거리 < 1.0 필터와 같은 기준)
+FALLBACK_MIN_SIMILARITY = 0.5
+
 try:
     # LangChain 필수 라이브러리들
-    from langchain_community.vectorstores import FAISS
-    from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-    from langchain_community.embeddings import HuggingFaceEmbeddings
+    from llm_cassette import create_chat_model
     from langchain.docstore.document import Document
-    from langchain_text_splitters import RecursiveCharacterTextSplitter
-    from langchain.retrievers.multi_query import MultiQueryRetriever
     from langchain.prompts import PromptTemplate
     
+    from rag_store import compute_index_key, sync_faiss_index
+    from rag_corpus import get_corpus
+    from embedding_cache import get_shared_embeddings
+    from rag_retrievers import ParallelMultiQueryRetriever, ScoredVectorStoreRetriever, document_score
+    from rag_expansion import FETCH_FACTOR, expansion_documents
+    from query_rewriter import rewrite_query
+    
     LANGCHAIN_AVAILABLE = True
     print("LangChain 라이브러리 로드 완료")
 except ImportError as e:
@@ -44,8 +50,9 @@ class MultiQueryRAGSystem:
         self.llm = None
         self.documents = None
         self.embedding_model = None
+        self.embedding_model_name = None
         
-        # 저장 경로
+        # 저장 경로 (vectorstore_cache 안에서 인덱스 이름으로 사용)
         self.vectorstore_path = "vectorstore_multiquery"
         
         print("MultiQuery RAG 시스템 초기화 시작...")
@@ -55,19 +62,20 @@ class MultiQueryRAGSystem:
         """CSV 데이터를 로드하고 Document 형태로 변환"""
         try:
             print("CSV 데이터 로드 중...")
-            df = pd.read_csv(self.csv_path)
-            print(f"총 {len(df)}개의 데이터 로드됨")
+            corpus = get_corpus(self.csv_path)
+            print(f"총 {len(corpus)}개의 데이터 로드됨")
             
             documents = []
-            for idx, row in df.iterrows():
+            # 행 위치가 아닌 질문 기준 ID를 사용 (행이 추가/삭제되어도 다른 행은 그대로)
+            for doc_id, question, answer in corpus.rows():
                 # 질문과 답변을 자연스럽게 결합
-                content = f"질문: {row['question']}\n답변: {row['answer']}"
+                content = DOC_TEMPLATE.format(question=question, answer=answer)
                 
                 metadata = {
-                    'source': f"school_info_{idx}",
-                    'question': str(row['question']),
-                    'answer': str(row['answer']),
-                    'id': idx
+                    'source': f"school_info_{doc_id}",
+                    'question': question,
+                    'answer': answer,
+                    'id': doc_id
                 }
                 
                 doc = Document(page_content=content, metadata=metadata)
@@ -86,16 +94,16 @@ class MultiQueryRAGSystem:
         try:
             # OpenAI 임베딩 시도
             print("OpenAI 임베딩 모델 설정 중...")
-            self.embedding_model = OpenAIEmbeddings(model="text-embedding-3-small")
+            self.embedding_model_name = "text-embedding-3-small"
+            self.embedding_model = get_shared_embeddings(self.embedding_model_name)
             print("OpenAI 임베딩 설정 완료")
             return True
         except Exception as e:
             print(f"OpenAI 임베딩 실패: {e}")
             try:
                 print("HuggingFace 임베딩으로 대체...")
-                self.embedding_model = HuggingFaceEmbeddings(
-                    model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
-                )
+                self.embedding_model_name = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+                self.embedding_model = get_shared_embeddings(self.embedding_model_name, provider="huggingface")
                 print("HuggingFace 임베딩 설정 완료")
                 return True
             except Exception as e2:
@@ -103,32 +111,19 @@ class MultiQueryRAGSystem:
                 return False
     
     def create_or_load_vectorstore(self):
-        """벡터스토어 생성 또는 로드"""
+        """벡터스토어 로드 후 바뀐 행만 증분 갱신 (행별 변형 질문도 같은 행을 가리키는 벡터로 추가)"""
         try:
-            # 기존 벡터스토어 로드 시도
-            if os.path.exists(self.vectorstore_path):
-                try:
-                    print("기존 벡터스토어 로드 시도...")
-                    self.vectorstore = FAISS.load_local(
-                        self.vectorstore_path, 
-                        self.embedding_model,
-                        allow_dangerous_deserialization=True
-                    )
-                    print("기존 벡터스토어 로드 성공")
-                    return True
-                except Exception as e:
-                    print(f"기존 벡터스토어 로드 실패: {e}")
-            
-            # 새 벡터스토어 생성
-            print("새 벡터스토어 생성 중...")
-            self.vectorstore = FAISS.from_documents(
-                documents=self.documents,
-                embedding=self.embedding_model
-            )
-            
-            # 저장
-            self.vectorstore.save_local(self.vectorstore_path)
-            print("벡터스토어 생성 및 저장 완료")
+            documents = {doc.metadata['id']: doc for doc in self.documents}
+            try:
+                documents.update(expansion_documents(
+                    get_corpus(self.csv_path), DOC_TEMPLATE,
+                    metadata_of=lambda doc_id, question, answer: documents[doc_id].metadata
+                ))
+            except Exception as e:
+                print(f"문서 확장 실패 (원래 행만 색인): {e}")
+            index_key = compute_index_key(self.vectorstore_path, self.embedding_model_name, DOC_TEMPLATE)
+            self.vectorstore, stats = sync_faiss_index(documents, self.embedding_model, index_key)
+            print(f"벡터스토어 준비 완료 (추가 {stats['added']}, 변경 {stats['updated']}, 삭제 {stats['removed']})")
             return True
             
         except Exception as e:
@@ -138,7 +133,7 @@ class MultiQueryRAGSystem:
     def setup_llm(self):
         """LLM 설정 (선택사항)"""
         try:
-            self.llm = ChatOpenAI(
+            self.llm = create_chat_model(
                 model="gpt-4o-mini",
                 temperature=0.2,
                 max_tokens=500
@@ -154,10 +149,9 @@ class MultiQueryRAGSystem:
     def setup_retrievers(self):
         """검색기들 설정"""
         try:
-            # 기본 검색기 (임계값 낮춤)
-            self.basic_retriever = self.vectorstore.as_retriever(
-                search_type="similarity",
-                search_kwargs={"k": 8}  # 임계값 제거하고 상위 8개만
+            # 기본 검색기 (임계값 없이 상위 8개 행, 코사인 유사도를 메타데이터에 담음)
+            self.basic_retriever = ScoredVectorStoreRetriever(
+                vectorstore=self.vectorstore, k=8, fetch_k=8 * FETCH_FACTOR
             )
             print("기본 검색기 설정 완료")
             
@@ -180,7 +174,7 @@ class MultiQueryRAGSystem:
 각 질문은 개행으로 구분하여 작성해주세요."""
                 )
                 
-                self.multi_query_retriever = MultiQueryRetriever.from_llm(
+                self.multi_query_retriever = ParallelMultiQueryRetriever.from_llm(
                     retriever=self.basic_retriever,
                     llm=self.llm,
                     prompt=multi_query_prompt
@@ -214,7 +208,8 @@ class MultiQueryRAGSystem:
         print("\n🎉 MultiQuery RAG 시스템 초기화 완료!")
     
     def search_documents(self, query: str, use_multi_query: bool = True) -> List[Document]:
-        """문서 검색 (새 API 사용)"""
+        """문서 검색 (새 API 사용, 별칭을 대표 표기로 바꾼 질문 사용)"""
+        query = rewrite_query(query, self.csv_path)
         try:
             if use_multi_query and self.multi_query_retriever:
                 print(f"MultiQuery 검색 실행: '{query}'")
@@ -231,8 +226,11 @@ class MultiQueryRAGSystem:
             # 폴백으로 직접 유사도 검색
             try:
                 if self.vectorstore:
-                    docs_and_scores = self.vectorstore.similarity_search_with_score(query, k=5)
-                    docs = [doc for doc, score in docs_and_scores if score < 1.0]  # 스코어 필터
+                    fallback = ScoredVectorStoreRetriever(
+                        vectorstore=self.vectorstore, k=5, fetch_k=5 * FETCH_FACTOR,
+                        score_threshold=FALLBACK_MIN_SIMILARITY
+                    )
+                    docs = fallback.invoke(query)
                     print(f"폴백 검색 결과: {len(docs)}개 문서")
                     return docs
             except Exception as e2:
@@ -273,8 +271,9 @@ class MultiQueryRAGSystem:
                         continue
                     seen_answers.add(answer)
                     
-                    # 신뢰도 계산 (순서 기반)
-                    confidence = max(0.95 - i * 0.1, 0.2)
+                    # 신뢰도: 리랭크 관련도 또는 코사인 유사도 (점수가 없는 문서만 0.5)
+                    score = document_score(doc)
+                    confidence = score if score is not None else 0.5
                     
                     results.append({
                         'answer': answer,
@@ -1,21 +1,45 @@
 import pandas as pd
 import numpy as np
-import pickle
 import os
 import re
-from typing import List, Tuple, Dict
+from typing import List, Tuple
 import warnings
+from rag_index_store import load_index, restore_tfidf, save_index, tfidf_params, tfidf_vocab, top_k_indices
+from rag_corpus import get_corpus
+from rag_store import VECTORSTORE_CACHE_DIR
+from query_rewriter import rewrite_query
+from staff_directory import get_staff_directory, is_number_query
 warnings.filterwarnings("ignore")
 
+# sentence-transformers 모델 이름
+SENTENCE_MODEL_NAME = 'paraphrase-multilingual-MiniLM-L12-v2'
+# 저장된 sentence-transformers 인덱스 설정 (문서 임베딩은 L2 정규화해서 저장, 예전 인덱스는 다시 구축)
+SENTENCE_INDEX_PARAMS = {'model': SENTENCE_MODEL_NAME, 'normalized': True}
+
+# 검색 방식
+#   auto   : dense(sentence-transformers) > TF-IDF > 키워드 중 사용 가능한 하나만 사용
+#   hybrid : TF-IDF와 dense를 한 번에 검색하고 RRF로 합침
+RETRIEVAL_MODES = ("auto", "hybrid")
+
+# RRF 상수 / hybrid에서 각 검색기가 후보로 내는 문서 수
+HYBRID_RRF_K = 60
+HYBRID_CANDIDATES = 20
+
 class SchoolInfoRAG:
-    def __init__(self, csv_path: str = "data/school_info.csv"):
+    def __init__(self, csv_path: str = "data/school_info.csv", retrieval_mode: str = "auto"):
         """
         학교 정보 RAG 시스템 초기화
         
         Args:
             csv_path: CSV 파일 경로
+            retrieval_mode: "auto" 또는 "hybrid" (RETRIEVAL_MODES 참고)
         """
+        if retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"지원하지 않는 검색 방식: {retrieval_mode}")
+        
         self.csv_path = csv_path
+        self.retrieval_mode = retrieval_mode
+        self.corpus = None
         self.data = None
         self.model = None
         self.question_embeddings = None
@@ -23,46 +47,45 @@ class SchoolInfoRAG:
         self.questions = None
         self.use_sentence_transformers = False
         
-        # 모델 저장 경로
-        self.model_path = "rag_model_v2.pkl"
+        # hybrid 전용: TF-IDF 희소 행렬과 L2 정규화된 dense 행렬을 따로 보관
+        self.tfidf_vectorizer = None
+        self.tfidf_matrix = None
+        self.dense_matrix = None
+        
+        # 인덱스 저장 폴더 (manifest.json + .npy 배열, sentence-transformers 임베딩은 float16)
+        self.index_dir = os.path.join(VECTORSTORE_CACHE_DIR, "rag_v2")
         
         # 데이터 로드 및 초기화
         self.load_data()
         self.initialize_model()
+        if self.retrieval_mode == "hybrid":
+            self.build_hybrid_index()
     
     def load_data(self):
-        """CSV 데이터 로드 및 full_text 컬럼 생성"""
+        """CSV 데이터 로드 (프로세스 공유 코퍼스 사용, full_text = question + answer)"""
         try:
-            self.data = pd.read_csv(self.csv_path)
-            
-            # question과 answer 컬럼을 결합하여 full_text 컬럼 생성
-            self.data['full_text'] = (
-                self.data['question'].fillna('').astype(str) + ' ' + 
-                self.data['answer'].fillna('').astype(str)
-            ).str.strip()
-            
+            self.corpus = get_corpus(self.csv_path)
+            self.data = self.corpus.data
             print(f"데이터 로드 완료: {len(self.data)}개 질문-답변 쌍")
-            print("question과 answer를 결합한 full_text 컬럼 생성 완료")
         except Exception as e:
             print(f"데이터 로드 실패: {e}")
             raise
     
     def initialize_model(self):
         """모델 초기화 - sentence-transformers 시도, 실패시 sklearn 사용"""
-        # 기존 모델이 있으면 로드 시도
-        if os.path.exists(self.model_path):
-            try:
-                self.load_model()
+        # 현재 CSV로 만든 인덱스가 있으면 로드 시도
+        try:
+            if self.load_model():
                 return
-            except Exception as e:
-                print(f"기존 모델 로드 실패: {e}")
+        except Exception as e:
+            print(f"기존 모델 로드 실패: {e}")
         
         # 새 모델 생성
         try:
             # sentence-transformers 시도
             from sentence_transformers import SentenceTransformer
             print("sentence-transformers를 사용하여 RAG 모델 구축 중...")
-            self.model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
+            self.model = SentenceTransformer(SENTENCE_MODEL_NAME)
             self.use_sentence_transformers = True
             self.build_sentence_transformer_model()
         except ImportError:
@@ -79,41 +102,32 @@ class SchoolInfoRAG:
     def build_sentence_transformer_model(self):
         """Sentence Transformers를 사용한 모델 구축"""
         # 질문, 답변, full_text 추출
-        self.questions = self.data['question'].fillna('').astype(str).tolist()
-        self.answers = self.data['answer'].fillna('').astype(str).tolist()
-        self.full_texts = self.data['full_text'].fillna('').astype(str).tolist()
+        self.questions = self.corpus.questions
+        self.answers = self.corpus.answers
+        self.full_texts = self.corpus.full_texts
         
-        # full_text를 임베딩으로 변환 (질문+답변 모두 포함)
+        # full_text를 임베딩으로 변환 (질문+답변 모두 포함, 검색 때 질문만 정규화하도록 미리 L2 정규화)
         print("full_text 임베딩 생성 중...")
-        self.question_embeddings = self.model.encode(self.full_texts)
+        self.question_embeddings = self._normalize_rows(self.model.encode(list(self.full_texts)))
         print("Sentence Transformers 모델 구축 완료")
     
     def build_sklearn_model(self):
         """sklearn을 사용한 백업 모델 구축"""
         try:
             from sklearn.feature_extraction.text import TfidfVectorizer
-            from sklearn.metrics.pairwise import cosine_similarity
             
             print("sklearn을 사용하여 RAG 모델 구축 중...")
             
             # 질문, 답변, full_text 추출
-            self.questions = self.data['question'].fillna('').astype(str).tolist()
-            self.answers = self.data['answer'].fillna('').astype(str).tolist()
-            self.full_texts = self.data['full_text'].fillna('').astype(str).tolist()
+            self.questions = self.corpus.questions
+            self.answers = self.corpus.answers
+            self.full_texts = self.corpus.full_texts
             
             # full_text 전처리 (질문+답변 모두 포함)
             processed_full_texts = [self.preprocess_text(ft) for ft in self.full_texts]
             
-            # TF-IDF 벡터화
-            self.model = TfidfVectorizer(
-                max_features=1000,
-                ngram_range=(1, 2),
-                stop_words=None,
-                sublinear_tf=True,
-                norm='l2'
-            )
-            
             # full_text를 벡터화
+            self.model = self.create_tfidf_vectorizer()
             self.question_embeddings = self.model.fit_transform(processed_full_texts)
             self.use_sentence_transformers = False
             print("sklearn 모델 구축 완료")
@@ -123,14 +137,59 @@ class SchoolInfoRAG:
             print("키워드 매칭 모드로 전환...")
             self.build_keyword_model()
     
+    @staticmethod
+    def create_tfidf_vectorizer():
+        """TF-IDF 벡터화 설정 (sklearn 모델과 hybrid 인덱스가 같은 설정 사용)"""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        return TfidfVectorizer(
+            max_features=1000,
+            ngram_range=(1, 2),
+            stop_words=None,
+            sublinear_tf=True,
+            norm='l2'
+        )
+    
+    def build_hybrid_index(self):
+        """
+        hybrid 검색용 인덱스 구축
+        
+        TF-IDF는 이름/내선번호("8401") 같은 글자 그대로의 일치에 강하고, dense는 "교감"과 "부교장"처럼
+        표현이 다른 역할 질문에 강하므로 둘을 함께 씁니다. sentence-transformers가 없으면 TF-IDF만 사용합니다.
+        """
+        self.full_texts = self.corpus.full_texts
+        if self.questions is None or len(self.questions) != len(self.full_texts):
+            self.questions = self.corpus.questions
+            self.answers = self.corpus.answers
+        
+        try:
+            if self.use_sentence_transformers and self.model is not None:
+                self.tfidf_vectorizer = self.create_tfidf_vectorizer()
+                self.tfidf_matrix = self.tfidf_vectorizer.fit_transform(
+                    [self.preprocess_text(ft) for ft in self.full_texts]
+                ).tocsr()
+            elif self.model is not None:
+                # sklearn 모델은 이미 같은 설정의 TF-IDF이므로 그대로 재사용
+                self.tfidf_vectorizer = self.model
+                self.tfidf_matrix = self.question_embeddings.tocsr()
+        except ImportError as e:
+            print(f"hybrid용 TF-IDF 구축 실패: {e}")
+        
+        if self.use_sentence_transformers and self.question_embeddings is not None:
+            # 이미 정규화된 임베딩 (저장본이면 메모리 매핑 그대로, 복사하지 않음)
+            self.dense_matrix = self.question_embeddings
+        
+        engines = [name for name, ready in (("TF-IDF", self.tfidf_matrix is not None),
+                                            ("dense", self.dense_matrix is not None)) if ready]
+        print(f"hybrid 인덱스 구축 완료: {' + '.join(engines) if engines else '없음 (키워드 매칭 사용)'}")
+    
     def build_keyword_model(self):
         """키워드 매칭 백업 모델"""
         print("키워드 매칭 모델 구축 중...")
         
         # 질문, 답변, full_text 추출
-        self.questions = self.data['question'].fillna('').astype(str).tolist()
-        self.answers = self.data['answer'].fillna('').astype(str).tolist()
-        self.full_texts = self.data['full_text'].fillna('').astype(str).tolist()
+        self.questions = self.corpus.questions
+        self.answers = self.corpus.answers
+        self.full_texts = self.corpus.full_texts
         self.model = None
         self.question_embeddings = None
         self.use_sentence_transformers = False
@@ -147,30 +206,43 @@ class SchoolInfoRAG:
         text = re.sub(r'\s+', ' ', text)
         return text.lower()
     
+    @staticmethod
+    def _normalize_rows(matrix) -> np.ndarray:
+        """행별 L2 정규화 (float32)"""
+        matrix = np.asarray(matrix, dtype=np.float32)
+        return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    
+    def dense_scores(self, queries: List[str]) -> np.ndarray:
+        """
+        (질문 수 x 문서 수) 코사인 유사도 - 문서 임베딩은 구축 때 정규화해 두었으므로 질문만 정규화하고
+        (메모리 매핑된) 임베딩과 행렬곱 한 번으로 계산 (프로세스마다 정규화된 사본을 만들지 않음)
+        """
+        return self._normalize_rows(self.model.encode(list(queries))) @ self.question_embeddings.T
+    
+    def tfidf_scores(self, queries: List[str], vectorizer, matrix) -> np.ndarray:
+        """(질문 수 x 문서 수) 코사인 유사도 - TF-IDF 벡터는 L2 정규화되어 있으므로 희소 행렬곱 한 번"""
+        query_vectors = vectorizer.transform([self.preprocess_text(q) for q in queries])
+        return (query_vectors @ matrix.T).toarray()
+    
+    def _collect(self, queries: List[str], rank_scores: np.ndarray, scores: np.ndarray,
+                 top_k: int) -> List[List[Tuple[str, str, float]]]:
+        """rank_scores 기준 행별 상위 k개를 (question, answer, score) 리스트로 변환"""
+        results = []
+        for i, indices in enumerate(top_k_indices(rank_scores, top_k)):
+            if not queries[i].strip():
+                results.append([])
+                continue
+            results.append([
+                (self.questions[idx], self.answers[idx], float(scores[i, idx]))
+                for idx in indices if rank_scores[i, idx] > 0
+            ])
+        return results
+    
     def search_similar_sentence_transformers(self, query: str, top_k: int = 3) -> List[Tuple[str, str, float]]:
         """Sentence Transformers를 사용한 유사도 검색"""
         try:
-            from sklearn.metrics.pairwise import cosine_similarity
-            
-            # 쿼리 임베딩 생성
-            query_embedding = self.model.encode([query])
-            
-            # 코사인 유사도 계산
-            similarities = cosine_similarity(query_embedding, self.question_embeddings).flatten()
-            
-            # 상위 k개 결과 선택
-            top_indices = similarities.argsort()[-top_k:][::-1]
-            
-            results = []
-            for idx in top_indices:
-                if similarities[idx] > 0:
-                    results.append((
-                        self.questions[idx],
-                        self.answers[idx],
-                        float(similarities[idx])
-                    ))
-            
-            return results
+            similarities = self.dense_scores([query])
+            return self._collect([query], similarities, similarities, top_k)[0]
         except Exception as e:
             print(f"Sentence Transformers 검색 실패: {e}")
             return self.search_similar_sklearn(query, top_k)
@@ -178,28 +250,8 @@ class SchoolInfoRAG:
     def search_similar_sklearn(self, query: str, top_k: int = 3) -> List[Tuple[str, str, float]]:
         """sklearn을 사용한 유사도 검색"""
         try:
-            from sklearn.metrics.pairwise import cosine_similarity
-            
-            # 쿼리 전처리 및 벡터화
-            processed_query = self.preprocess_text(query)
-            query_vector = self.model.transform([processed_query])
-            
-            # 코사인 유사도 계산
-            similarities = cosine_similarity(query_vector, self.question_embeddings).flatten()
-            
-            # 상위 k개 결과 선택
-            top_indices = similarities.argsort()[-top_k:][::-1]
-            
-            results = []
-            for idx in top_indices:
-                if similarities[idx] > 0:
-                    results.append((
-                        self.questions[idx],
-                        self.answers[idx],
-                        float(similarities[idx])
-                    ))
-            
-            return results
+            similarities = self.tfidf_scores([query], self.model, self.question_embeddings)
+            return self._collect([query], similarities, similarities, top_k)[0]
         except Exception as e:
             print(f"sklearn 검색 실패: {e}")
             return self.search_similar_keyword(query, top_k)
@@ -231,15 +283,90 @@ class SchoolInfoRAG:
             print(f"키워드 매칭 실패: {e}")
             return []
     
+    @staticmethod
+    def _rrf_scores(score_lists: List[np.ndarray], candidates: int, k: int = HYBRID_RRF_K) -> np.ndarray:
+        """
+        검색기별 (질문 수 x 문서 수) 점수 행렬을 순위로 바꿔 RRF 점수로 합침 (전부 벡터 연산)
+        
+        각 검색기에서 점수가 0보다 큰 상위 candidates개 문서만 순위 점수를 받습니다.
+        """
+        fused = np.zeros(score_lists[0].shape, dtype=np.float32)
+        rows = np.arange(fused.shape[0])[:, None]
+        for scores in score_lists:
+            top = top_k_indices(scores, candidates)
+            rank_weights = 1.0 / (k + np.arange(1, top.shape[1] + 1))
+            positive = np.take_along_axis(scores, top, axis=1) > 0
+            fused[rows, top] += np.where(positive, rank_weights, 0.0)
+        return fused
+    
+    def search_many_hybrid(self, queries: List[str], top_k: int = 3) -> List[List[Tuple[str, str, float]]]:
+        """
+        TF-IDF + dense 동시 검색 후 RRF로 합친 결과
+        
+        순위는 RRF로 정하고, 돌려주는 점수는 두 검색기의 코사인 유사도 중 큰 값입니다
+        (RRF 점수 자체는 0.03 수준이라 get_answer 임계값과 맞지 않음).
+        """
+        score_lists = []
+        if self.tfidf_matrix is not None:
+            score_lists.append(self.tfidf_scores(queries, self.tfidf_vectorizer, self.tfidf_matrix))
+        if self.dense_matrix is not None:
+            score_lists.append(self.dense_scores(queries))
+        
+        if not score_lists:
+            return [self.search_similar_keyword(query, top_k) if query.strip() else [] for query in queries]
+        
+        fused = self._rrf_scores(score_lists, HYBRID_CANDIDATES)
+        return self._collect(queries, fused, np.maximum.reduce(score_lists), top_k)
+    
+    def search_similar_hybrid(self, query: str, top_k: int = 3) -> List[Tuple[str, str, float]]:
+        """TF-IDF + dense 동시 검색 후 RRF로 합친 결과 (질문 1개)"""
+        return self.search_many_hybrid([query], top_k)[0]
+    
+    def search_many(self, queries: List[str], top_k: int = 3) -> List[List[Tuple[str, str, float]]]:
+        """
+        여러 질문을 한 번에 검색
+        
+        질문 벡터를 한 행렬로 쌓아 정규화된 문서 벡터와 행렬곱 한 번으로 점수를 구하고,
+        행마다 argpartition으로 상위 k개만 고릅니다. 평가/일괄 처리용입니다.
+        
+        Returns:
+            질문 순서대로 (question, answer, similarity_score) 리스트
+        """
+        if not queries:
+            return []
+        queries = [rewrite_query(query, self.csv_path) for query in queries]
+        
+        try:
+            if self.retrieval_mode == "hybrid":
+                return self.search_many_hybrid(queries, top_k)
+            elif self.use_sentence_transformers and self.model is not None:
+                similarities = self.dense_scores(queries)
+            elif self.model is not None:
+                similarities = self.tfidf_scores(queries, self.model, self.question_embeddings)
+            else:
+                return [self.search_similar_keyword(query, top_k) if query.strip() else [] for query in queries]
+            return self._collect(queries, similarities, similarities, top_k)
+        except Exception as e:
+            print(f"일괄 검색 실패: {e}")
+            return [self.search_similar(query, top_k) for query in queries]
+    
     def search_similar(self, query: str, top_k: int = 3) -> List[Tuple[str, str, float]]:
         """
-        유사한 질문-답변 검색 (우선순위: sentence-transformers > sklearn > keyword)
+        유사한 질문-답변 검색 (hybrid가 아니면 우선순위: sentence-transformers > sklearn > keyword)
+        "8401"처럼 숫자가 대부분인 질문은 교직원 명부의 번호 역인덱스에서 바로 찾음
         """
         if not query.strip():
             return []
+        if is_number_query(query):
+            rows = get_staff_directory(self.csv_path).find_by_number(query)
+            if rows:
+                return [(question, answer, 1.0) for question, answer in rows[:top_k]]
+        query = rewrite_query(query, self.csv_path)
         
         try:
-            if self.use_sentence_transformers and self.model is not None:
+            if self.retrieval_mode == "hybrid":
+                return self.search_similar_hybrid(query, top_k)
+            elif self.use_sentence_transformers and self.model is not None:
                 return self.search_similar_sentence_transformers(query, top_k)
             elif self.model is not None:
                 return self.search_similar_sklearn(query, top_k)
@@ -275,7 +402,7 @@ class SchoolInfoRAG:
                     'answer': '죄송합니다. 관련된 정보를 찾을 수 없습니다.',
                     'confidence': float(best_similarity)
                 }],
-                'method': 'sentence_transformers' if self.use_sentence_transformers else 'sklearn' if self.model else 'keyword'
+                'method': self.method_name
             }
         
         # 상위 3개 결과를 리스트로 구성
@@ -298,51 +425,86 @@ class SchoolInfoRAG:
         
         return {
             'results': results,
-            'method': 'sentence_transformers' if self.use_sentence_transformers else 'sklearn' if self.model else 'keyword'
+            'method': self.method_name
         }
     
+    @property
+    def method_name(self) -> str:
+        """결과 딕셔너리의 'method' 값 (hybrid라도 한쪽 검색기만 준비되었으면 그 검색기 이름)"""
+        if self.retrieval_mode == "hybrid":
+            if self.tfidf_matrix is not None and self.dense_matrix is not None:
+                return 'hybrid'
+            if self.dense_matrix is not None:
+                return 'sentence_transformers'
+            return 'sklearn' if self.tfidf_matrix is not None else 'keyword'
+        return 'sentence_transformers' if self.use_sentence_transformers else 'sklearn' if self.model else 'keyword'
+    
     def save_model(self):
-        """모델 저장"""
+        """
+        모델 저장
+        
+        - sentence-transformers: L2 정규화한 full_text 임베딩을 float16 .npy로 (모델 자체는 이름만 기록)
+        - sklearn: TF-IDF 설정/어휘는 manifest, idf와 문서 벡터는 .npy
+        - 키워드 매칭: 저장할 인덱스 없음
+        """
         try:
-            model_data = {
-                'questions': self.questions,
-                'answers': self.answers,
-                'use_sentence_transformers': self.use_sentence_transformers,
-                'question_embeddings': self.question_embeddings if not self.use_sentence_transformers else None,
-                'model': self.model if not self.use_sentence_transformers else None
-            }
-            
-            with open(self.model_path, 'wb') as f:
-                pickle.dump(model_data, f)
+            if self.use_sentence_transformers:
+                save_index(
+                    self.index_dir, self.csv_path, engine="sentence_transformers",
+                    params=SENTENCE_INDEX_PARAMS,
+                    dense_arrays={'embeddings': np.asarray(self.question_embeddings, dtype=np.float16)}
+                )
+            elif self.model is not None:
+                save_index(
+                    self.index_dir, self.csv_path, engine="tfidf",
+                    params=tfidf_params(self.model),
+                    vocab=tfidf_vocab(self.model),
+                    sparse_arrays={'question_embeddings': self.question_embeddings},
+                    dense_arrays={'idf': self.model.idf_}
+                )
+            else:
+                return
             
             print("모델 저장 완료")
         except Exception as e:
             print(f"모델 저장 실패: {e}")
     
-    def load_model(self):
-        """저장된 모델 로드"""
-        try:
-            with open(self.model_path, 'rb') as f:
-                model_data = pickle.load(f)
-            
-            self.questions = model_data['questions']
-            self.answers = model_data['answers']
-            self.use_sentence_transformers = model_data.get('use_sentence_transformers', False)
-            
-            if self.use_sentence_transformers:
-                # sentence-transformers 모델 다시 로드
-                from sentence_transformers import SentenceTransformer
-                self.model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
-                # 임베딩 다시 생성 (저장하기엔 너무 큼)
-                self.question_embeddings = self.model.encode(self.questions)
-            else:
-                self.question_embeddings = model_data.get('question_embeddings')
-                self.model = model_data.get('model')
-            
-            print("저장된 모델 로드 완료")
-        except Exception as e:
-            print(f"모델 로드 실패: {e}")
-            raise
+    def load_model(self) -> bool:
+        """
+        저장된 모델 로드 (임베딩/벡터는 메모리 매핑)
+        
+        Returns:
+            로드 성공 여부 (인덱스가 없거나 CSV/모델/설정이 바뀌었으면 False)
+        """
+        index = load_index(self.index_dir, self.csv_path)
+        if index is None:
+            return False
+        
+        manifest = index['manifest']
+        if manifest['engine'] == "sentence_transformers":
+            if manifest['params'] != SENTENCE_INDEX_PARAMS:
+                return False
+            # 질문 임베딩용 모델만 다시 로드하고, 문서 임베딩은 구축 때와 같은 full_text 벡터를 그대로 사용
+            from sentence_transformers import SentenceTransformer
+            self.model = SentenceTransformer(SENTENCE_MODEL_NAME)
+            self.question_embeddings = index['dense']['embeddings']
+            self.use_sentence_transformers = True
+        elif manifest['engine'] == "tfidf":
+            if manifest['params'] != tfidf_params(self.create_tfidf_vectorizer()):
+                return False
+            self.model = restore_tfidf(manifest['params'], manifest['vocab'], index['dense']['idf'])
+            self.question_embeddings = index['sparse']['question_embeddings']
+            self.use_sentence_transformers = False
+        else:
+            return False
+        
+        # 인덱스가 현재 CSV로 만든 것이므로 질문/답변은 CSV에서 바로 가져옴
+        self.questions = self.corpus.questions
+        self.answers = self.corpus.answers
+        self.full_texts = self.corpus.full_texts
+        
+        print("저장된 모델 로드 완료")
+        return True
 
 # 전역 RAG 인스턴스
 rag_system_v2 = None
@@ -351,7 +513,7 @@ def initialize_rag():
     """RAG 시스템 초기화"""
     global rag_system_v2
     if rag_system_v2 is None:
-        rag_system_v2 = SchoolInfoRAG()
+        rag_system_v2 = SchoolInfoRAG(retrieval_mode=os.getenv("RAG_V2_RETRIEVAL_MODE", "auto"))
     return rag_system_v2
 
 def get_rag_answer(query: str) -> dict:
@@ -3,7 +3,7 @@
 """
 import streamlit as st
 import streamlit.components.v1 as components
-from langchain_openai import ChatOpenAI
+from llm_cassette import create_chat_model
 from langchain_core.output_parsers import StrOutputParser
 import pandas as pd
 from io import BytesIO
@@ -163,7 +163,7 @@ def draw_saengibu_tab(prompts):
                                 with st.spinner(f"{student_data['name']} 교과세특 생성 중..."):
                                     try:
                                         # LLM 호출 로직 (기존 '전체 생성' 로직과 동일)
-                                        llm = ChatOpenAI(model=PRIMARY_MODEL, temperature=0.5)
+                                        llm = create_chat_model(model=PRIMARY_MODEL, temperature=0.5)
                                         prompt = prompts["student_record"]
                                         chain = prompt | llm | StrOutputParser()
                                         result = chain.invoke({
@@ -208,7 +208,7 @@ def draw_saengibu_tab(prompts):
                             if data["observation"].strip():  # 내용이 있을 때만 생성
                                 with st.spinner(f"{data['name']} 교과세특 생성 중..."):
                                     try:
-                                        llm = ChatOpenAI(model=PRIMARY_MODEL, temperature=0.5)
+                                        llm = create_chat_model(model=PRIMARY_MODEL, temperature=0.5)
                                         prompt = prompts["student_record"]
                                         chain = prompt | llm | StrOutputParser()
                                         
@@ -657,7 +657,7 @@ def draw_saengibu_tab(prompts):
                         if st.session_state.behavior_student_data[i]["behavior_content"].strip():
                             with st.spinner(f"{st.session_state.behavior_student_data[i]['name']} 행발 생성 중..."):
                                 try:
-                                    llm = ChatOpenAI(model=PRIMARY_MODEL, temperature=0.5)
+                                    llm = create_chat_model(model=PRIMARY_MODEL, temperature=0.5)
                                     prompt = prompts["behavior_record"]
                                     chain = prompt | llm | StrOutputParser()
                                     
@@ -714,7 +714,7 @@ def draw_saengibu_tab(prompts):
                         if data["behavior_content"].strip():  # 내용이 있을 때만 생성
                             with st.spinner(f"{data['name']} 행발 생성 중..."):
                                 try:
-                                    llm = ChatOpenAI(model=PRIMARY_MODEL, temperature=0.5)
+                                    llm = create_chat_model(model=PRIMARY_MODEL, temperature=0.5)
                                     prompt = prompts["behavior_record"]
                                     chain = prompt | llm | StrOutputParser()
                                     
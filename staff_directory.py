@@ -0,0 +1,572 @@
+"""
+교직원 명부 인덱스
+school_info.csv의 정형화된 답변("X 선생님의 내선번호는 NNNN 입니다." 등)을 레코드로 파싱하여
+이름/반/역할 해시 인덱스와 접두사 인덱스로 저장합니다.
+"1-2 선생님", "노주영 선생님 업무"처럼 직접 찾는 질문은 임베딩이나 LLM 없이 바로 답합니다.
+"8401", "010-8649-4539 누구야?"처럼 숫자가 대부분인 질문은 번호 역인덱스(숫자만 남긴 번호 -> CSV 행)로 바로 찾습니다.
+"3학년 담임 선생님들", "부장 선생님 목록"처럼 여러 명을 찾는 질문은 학년/반/부서/역할 태그별 정수 비트셋의
+교집합으로 해당하는 레코드를 모두 골라 표로 돌려줍니다.
+"""
+import bisect
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from rag_corpus import DEFAULT_CSV_PATH, get_corpus
+
+# 답변 문장 패턴 (위에서부터 차례로 시도)
+_NUMBER = r'(?P<number>[\d-]+)(?: \(대표번호\))?'
+CONTACT_PATTERNS = [
+    re.compile(r'^(?P<label>.+?)\(담당: (?P<name>.+?) 선생님\)의 내선번호는 ' + _NUMBER + r' 입니다\.$'),
+    re.compile(r'^(?P<label>.+?) (?P<name>\S+) 선생님의 내선번호는 ' + _NUMBER + r' 입니다\.$'),
+    re.compile(r'^(?P<label>.+?)의 내선번호는 ' + _NUMBER + r' 입니다\.$'),
+    re.compile(r'^(?P<label>.+?) 번호는 ' + _NUMBER + r' 입니다\.$'),
+]
+DUTY_PATTERNS = [
+    re.compile(r'^(?P<name>\S+) 선생님은 (?P<duty>.+) 업무를 담당하십니다\.$'),
+    re.compile(r'^(?P<duty>.+) 담당 선생님은 (?P<name>.+?) 선생님입니다\.$'),
+]
+
+# 사람 이름 (2~4글자 한글, 동명이인 구분용 "(A)" 허용) - "2층", "자료실" 같은 값은 제외
+_PERSON_NAME = re.compile(r'^[가-힣]{2,4}(?:\([A-Z]\))?$')
+_NOT_NAME_SUFFIXES = ('층', '실', '관')
+
+# 반 표기: "1-2", "1-2(부장)", "1학년 2반"
+_CLASS_LABEL = re.compile(r'^(\d)\s*-\s*(\d{1,2})(?!\d)|^(\d)\s*학년\s*(\d{1,2})\s*반')
+_CLASS_QUERY = re.compile(r'(?<![\d-])(\d)\s*-\s*(\d{1,2})(?![\d-])|(\d)\s*학년\s*(\d{1,2})\s*반')
+
+# 질문 토큰 끝에 붙는 호칭/조사
+_QUERY_SUFFIXES = ('선생님', '교장선생님', '교감선생님', '쌤', '샘', '님', '의', '은', '는', '이', '가', '께')
+
+DUTY_KEYWORDS = ('업무', '담당', '맡')
+# 역할/부서 이름만으로 찾을 때 함께 있어야 하는 말 ("보건실 어디야", "1학년 교실 와이파이"는 명부 질문이 아님)
+CONTACT_KEYWORDS = ('내선', '번호', '전화', '연락', '팩스', 'fax')
+
+# 여러 사람(번호)이 나오는 이름/반 조회 결과의 신뢰도
+AMBIGUOUS_CONFIDENCE = 0.7
+
+# 답변 속 번호: 전화번호("010-8649-4539", "031 123 4567")와 4자리 내선/팩스 번호
+# (아이디/비밀번호/메일/IP 안의 숫자는 제외: 앞뒤에 영문/숫자/./@/-가 붙으면 번호가 아님)
+_PHONE_NUMBER = re.compile(r'(?<![A-Za-z0-9.@-])(0\d{1,2})[-\s.]?(\d{3,4})[-\s.]?(\d{4})(?![A-Za-z0-9.@-])')
+_EXTENSION_NUMBER = re.compile(r'(?<![A-Za-z0-9.@-])(\d{4})(?![A-Za-z0-9.@-])')
+# 질문 속 번호 후보: 하이픈/공백/점으로 이어진 숫자열 (영문에 붙은 숫자 제외)
+_QUERY_NUMBER = re.compile(r'(?<![A-Za-z])\d[\d\s.-]*\d(?![A-Za-z])')
+_NUMBER_LENGTHS = (4, 7, 8, 9, 10, 11)
+
+
+# 여러 명을 찾는 질문 표시 ("선생님들", "전체", "목록" 등)
+_SET_QUERY = re.compile(r'(?:선생님|교사|직원|분)들|전체|전부|목록|명단|리스트|모두|모든')
+_GRADE_QUERY = re.compile(r'(\d)\s*학년(?!\s*\d{1,2}\s*반)')
+# 목록 질문에서 조건으로 쓰지 않는 말
+_SET_STOPWORDS = frozenset((
+    '선생님', '선생', '직원', '교직원', '교사', '분', '사람', '전체', '전부', '목록', '명단', '리스트', '모두', '모든',
+    '번호', '내선번호', '연락처', '전화번호', '알려줘', '알려주세요', '보여줘', '누구', '누구야', '다',
+    '좀', '주세요', '줘', '번호들',
+))
+# 조건이 아닌 요청 표현 ("알려줄래", "보여주세요", "뭐야", "어디야")
+_REQUEST_WORD = re.compile(r'^(?:알려|보여|찾아|뭐|무엇|어디|누구)')
+
+# 표 열 이름 (연락처 목록 / 업무 목록)
+TABLE_COLUMNS = ('구분', '역할', '이름', '번호')
+DUTY_TABLE_COLUMNS = ('구분', '역할', '이름', '업무')
+
+
+def _iter_bits(bits: int):
+    """비트셋에서 켜진 비트 위치를 작은 것부터 순회"""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+def normalize_number(text: str) -> str:
+    """'010-8649 4539' -> '01086494539'"""
+    return re.sub(r'\D', '', text)
+
+
+def extract_numbers(answer: str) -> List[str]:
+    """
+    답변 문장 속 번호들 (숫자만 남긴 형태)
+
+    전화번호는 앞자리(010, 031 등)를 뺀 번호로도 찾을 수 있게 둘 다 돌려줍니다.
+    """
+    numbers = []
+    for m in _PHONE_NUMBER.finditer(answer):
+        numbers.extend((''.join(m.groups()), m.group(2) + m.group(3)))
+    numbers.extend(m.group(1) for m in _EXTENSION_NUMBER.finditer(_PHONE_NUMBER.sub(' ', answer)))
+    return list(dict.fromkeys(numbers))
+
+
+def query_numbers(query: str) -> List[str]:
+    """질문 속 번호 후보 (이어진 숫자열 전체, 그다음 공백으로 나눈 조각 순)"""
+    candidates = []
+    for m in _QUERY_NUMBER.finditer(query):
+        candidates.append(normalize_number(m.group(0)))
+        candidates.extend(normalize_number(part) for part in m.group(0).split())
+    return [number for number in dict.fromkeys(candidates) if len(number) in _NUMBER_LENGTHS]
+
+
+def is_number_query(query: str) -> bool:
+    """숫자가 대부분인 질문인지 ("8401", "8401 누구야?", "010-8649-4539 어디 번호야")"""
+    digits = sum(ch.isdigit() for ch in query)
+    letters = len(re.findall(r'[가-힣A-Za-z]', query))
+    return digits >= 4 and digits >= letters
+
+
+def is_person_name(text: str) -> bool:
+    """사람 이름처럼 보이는지 확인"""
+    return bool(_PERSON_NAME.match(text)) and not text.endswith(_NOT_NAME_SUFFIXES)
+
+
+def parse_class_code(text: str) -> Optional[str]:
+    """'1-2(부장)', '1학년 2반' -> '1-2'"""
+    m = _CLASS_LABEL.match(text.strip())
+    if not m:
+        return None
+    grade, room = (m.group(1), m.group(2)) if m.group(1) else (m.group(3), m.group(4))
+    return f"{grade}-{int(room)}"
+
+
+def _compact(text: str) -> str:
+    return re.sub(r'\s+', '', text)
+
+
+class StaffRecord:
+    """교직원 명부 레코드 1건"""
+    __slots__ = ('name', 'role', 'class_code', 'department', 'extension', 'phone', 'answer')
+
+    def __init__(self, name: Optional[str], role: str, class_code: Optional[str], department: str,
+                 extension: Optional[str], phone: Optional[str], answer: str):
+        self.name = name
+        self.role = role
+        self.class_code = class_code
+        self.department = department
+        self.extension = extension
+        self.phone = phone
+        self.answer = answer
+
+    def __repr__(self):
+        return (f"StaffRecord(name={self.name!r}, role={self.role!r}, class_code={self.class_code!r}, "
+                f"department={self.department!r}, extension={self.extension!r}, phone={self.phone!r})")
+
+
+def _department_of(label: str, class_code: Optional[str]) -> str:
+    if class_code:
+        return f"{class_code.split('-')[0]}학년"
+    # "교과전담실(4층)" -> "교과전담실"
+    return re.sub(r'\(.*?\)', '', label).strip()
+
+
+def parse_contact(answer: str, known_names=None) -> List[StaffRecord]:
+    """
+    연락처 답변 문장을 레코드로 파싱 (패턴에 맞지 않으면 빈 리스트)
+
+    Args:
+        answer: 답변 문장
+        known_names: "X 선생님" 형태로 확인된 이름 집합. "박으뜸의 내선번호는"처럼 라벨 전체가 이름인 경우는
+            이 집합에 있을 때만 이름으로 인정 ("교장", "방과후" 같은 라벨을 이름으로 오인하지 않도록)
+    """
+    for pattern in CONTACT_PATTERNS:
+        m = pattern.match(answer.strip())
+        if m:
+            break
+    else:
+        return []
+
+    label = m.group('label').replace('(대표번호)', '').strip()
+    raw_name = m.groupdict().get('name')
+    number = m.group('number')
+
+    # "늘봄1(김순옥)", "늘봄지원실장 박은희"처럼 이름이 라벨 안에 있는 경우
+    if raw_name is None:
+        inner = re.match(r'^(?P<label>.+?)\((?P<name>[^)]+)\)$', label) or re.match(r'^(?P<label>.+) (?P<name>\S+)$', label)
+        if inner and is_person_name(inner.group('name')) and (
+                len(inner.group('name')) == 3 or inner.group('name') in (known_names or ())):
+            label, raw_name = inner.group('label').strip(), inner.group('name')
+        elif known_names and label in known_names:
+            raw_name = label
+
+    names = [n for n in (raw_name or '').split('/') if is_person_name(n)] or [None]
+    class_code = parse_class_code(label)
+    extension = number if re.fullmatch(r'\d{4}', number) else None
+    phone = number if extension is None else None
+
+    return [
+        StaffRecord(name, label, class_code, _department_of(label, class_code), extension, phone, answer.strip())
+        for name in names
+    ]
+
+
+class StaffDirectory:
+    """이름/반/역할 해시 인덱스 + 역할 접두사 인덱스"""
+
+    def __init__(self, rows):
+        """
+        Args:
+            rows: (question, answer) 튜플의 iterable
+        """
+        self.records: List[StaffRecord] = []
+        self.duties: Dict[str, List[str]] = {}  # 이름 -> 업무 답변 문장들
+
+        # 번호 역인덱스: 숫자만 남긴 번호 -> CSV 행 번호들 (명부 레코드로 파싱되지 않는 답변도 포함)
+        self.rows: List[Tuple[str, str]] = [(str(q).strip(), str(a).strip()) for q, a in rows]
+        by_number: Dict[str, List[int]] = {}
+        for i, (_, answer) in enumerate(self.rows):
+            for number in extract_numbers(answer):
+                by_number.setdefault(number, []).append(i)
+        self.by_number = {number: tuple(ids) for number, ids in by_number.items()}
+
+        rows = [answer for _, answer in self.rows]
+
+        # "X 선생님" 형태로 나온 이름만 사람 이름으로 인정
+        known_names = set()
+        for answer in rows:
+            for pattern in CONTACT_PATTERNS[:2] + DUTY_PATTERNS:
+                m = pattern.match(answer)
+                if m:
+                    known_names.update(n for n in m.group('name').split('/') if is_person_name(n))
+                    break
+
+        seen = set()
+        for answer in rows:
+            for pattern in DUTY_PATTERNS:
+                m = pattern.match(answer)
+                if m and is_person_name(m.group('name')):
+                    sentences = self.duties.setdefault(m.group('name'), [])
+                    if answer not in sentences:
+                        sentences.append(answer)
+                    break
+            else:
+                for record in parse_contact(answer, known_names):
+                    key = (record.name, record.class_code or _compact(record.role), record.extension or record.phone)
+                    if key not in seen:
+                        seen.add(key)
+                        self.records.append(record)
+
+        self.by_name = self._build_index(lambda r: [r.name] if r.name else [])
+        self.by_class = self._build_index(lambda r: [r.class_code] if r.class_code else [])
+        self.by_role = self._build_index(lambda r: [_compact(r.role)])
+        self.by_department = self._build_index(lambda r: [_compact(r.department)])
+
+        # 역할 접두사 검색용 정렬 키 ("행정" -> "행정실장")
+        self._role_keys = sorted(self.by_role)
+
+        # 분류 태그 -> 레코드 비트셋 (i번째 비트 = records[i])
+        self.tags: Dict[str, int] = {}
+        for i, record in enumerate(self.records):
+            for tag in self._tags_of(record):
+                self.tags[tag] = self.tags.get(tag, 0) | (1 << i)
+        self._term_bits: Dict[str, int] = {}
+
+    @staticmethod
+    def _tags_of(record: StaffRecord) -> List[str]:
+        """레코드의 분류 태그 ('학년:3', '반:3-4', '담임', '부서:교과전담실', '역할:3-1(부장)')"""
+        tags = [f"부서:{_compact(record.department)}", f"역할:{_compact(record.role)}"]
+        m = re.match(r'^(\d)학년', record.department)
+        if m:
+            tags.append(f"학년:{m.group(1)}")
+        if record.class_code:
+            tags.extend((f"반:{record.class_code}", "담임"))
+        return tags
+
+    @classmethod
+    def from_csv(cls, csv_path: str = "data/school_info.csv") -> "StaffDirectory":
+        corpus = get_corpus(csv_path)
+        return cls(zip(corpus.questions, corpus.answers))
+
+    def _build_index(self, keys_of) -> Dict[str, Tuple[int, ...]]:
+        index: Dict[str, List[int]] = {}
+        for i, record in enumerate(self.records):
+            for key in keys_of(record):
+                if key and i not in index.setdefault(key, []):
+                    index[key].append(i)
+        return {key: tuple(ids) for key, ids in index.items()}
+
+    def find_by_name(self, name: str) -> List[StaffRecord]:
+        return [self.records[i] for i in self.by_name.get(name, ())]
+
+    def find_by_class(self, class_code: str) -> List[StaffRecord]:
+        return [self.records[i] for i in self.by_class.get(class_code, ())]
+
+    def find_by_role(self, role: str) -> List[StaffRecord]:
+        return [self.records[i] for i in self.by_role.get(_compact(role), ())]
+
+    def find_by_department(self, department: str) -> List[StaffRecord]:
+        return [self.records[i] for i in self.by_department.get(_compact(department), ())]
+
+    def find_by_number(self, query: str) -> List[Tuple[str, str]]:
+        """
+        번호로 (question, answer) 행 찾기 (같은 답변은 1번만, 하이픈/공백 무시)
+
+        Args:
+            query: 번호 또는 번호가 든 질문 ("8401", "010 8649 4539 누구야?")
+        """
+        rows: Dict[str, Tuple[str, str]] = {}
+        for number in query_numbers(query):
+            for i in self.by_number.get(number, ()):
+                question, answer = self.rows[i]
+                rows.setdefault(answer, (question, answer))
+        return list(rows.values())
+
+    def lookup_number(self, query: str) -> Optional[List[dict]]:
+        """숫자가 대부분인 질문이면 번호 역인덱스에서 바로 답변 (아니거나 없는 번호면 None)"""
+        if not is_number_query(query):
+            return None
+        rows = self.find_by_number(query)
+        if not rows:
+            return None
+        return [
+            {'answer': answer, 'confidence': 1.0, 'source': "번호 조회", 'question': question}
+            for question, answer in rows
+        ]
+
+    def bits_for_term(self, term: str) -> int:
+        """부서/역할 이름에 term이 들어간 레코드 비트셋 ("부장" -> 1-1(부장), 교무부장, 연구부장 ...)"""
+        term = _compact(term)
+        if term not in self._term_bits:
+            bits = 0
+            for tag, tag_bits in self.tags.items():
+                kind, _, value = tag.partition(':')
+                if kind in ('부서', '역할') and term in value:
+                    bits |= tag_bits
+            self._term_bits[term] = bits
+        return self._term_bits[term]
+
+    def _category_facets(self, query: str) -> Optional[List[int]]:
+        """
+        질문 속 조건별 비트셋 목록 (학년, 반, 담임, 부서/역할 이름)
+
+        불용어/요청 표현/업무 키워드가 아닌 말이 하나라도 조건으로 해석되지 않으면 None
+        ("교무실 와이파이 전부"의 "와이파이"처럼 명부 밖의 내용을 묻는 질문은 다른 검색 단계로 넘김)
+        """
+        facets = []
+        m = _CLASS_QUERY.search(query)
+        if m:
+            grade, room = (m.group(1), m.group(2)) if m.group(1) else (m.group(3), m.group(4))
+            facets.append(self.tags.get(f"반:{grade}-{int(room)}", 0))
+            query = query[:m.start()] + ' ' + query[m.end():]
+        for grade in _GRADE_QUERY.findall(query):
+            facets.append(self.tags.get(f"학년:{grade}", 0))
+        query = _GRADE_QUERY.sub(' ', query)
+        if '담임' in query:
+            facets.append(self.tags.get('담임', 0))
+            query = query.replace('담임', ' ')
+
+        for token in re.findall(r'[가-힣A-Za-z0-9()/]+', _SET_QUERY.sub(' ', query)):
+            if _REQUEST_WORD.match(token) or any(keyword in token for keyword in DUTY_KEYWORDS):
+                continue
+            candidates = [token] + [token[:-len(s)] for s in _QUERY_SUFFIXES if token.endswith(s) and len(token) > len(s)]
+            content = [c for c in candidates if len(c) >= 2 and c not in _SET_STOPWORDS]
+            if len(content) < len(candidates) and not any(self.bits_for_term(c) for c in content):
+                # 불용어에 조사/호칭만 붙은 말 ("선생님의")
+                continue
+            for candidate in content:
+                bits = self.bits_for_term(candidate)
+                if bits:
+                    facets.append(bits)
+                    break
+            else:
+                if content:
+                    return None
+        return facets
+
+    def find_by_category(self, query: str) -> List[StaffRecord]:
+        """
+        질문 속 조건(학년/반/담임/부서/역할)을 모두 만족하는 레코드 전체 (조건이 없으면 빈 리스트)
+
+        같은 역할/번호에 이름 있는 레코드와 없는 레코드가 함께 있으면 이름 있는 것만 남기고,
+        학년/반 순서로 정렬합니다.
+        """
+        facets = self._category_facets(query)
+        if not facets:
+            return []
+        bits = facets[0]
+        for facet in facets[1:]:
+            bits &= facet
+
+        records = [self.records[i] for i in _iter_bits(bits)]
+        named = {(_compact(r.role), r.extension or r.phone) for r in records if r.name}
+        records = [r for r in records if r.name or (_compact(r.role), r.extension or r.phone) not in named]
+
+        def sort_key(record: StaffRecord):
+            if record.class_code:
+                grade, room = record.class_code.split('-')
+                return (0, int(grade), int(room), record.role)
+            return (1, 0, 0, record.role)
+        return sorted(records, key=sort_key)
+
+    def lookup_category(self, query: str) -> Optional[List[dict]]:
+        """
+        여러 명을 찾는 질문이면 조건에 맞는 레코드 전체를 부서별로 묶은 표 결과 1건으로 답변
+
+        업무/담당을 묻는 질문("3학년 선생님 업무 전부")이면 번호 대신 해당 선생님들의 업무 목록으로 답합니다.
+
+        Returns:
+            [{'answer': 부서별 목록 문장, 'table': [{열 이름: 값}], ...}], 목록 질문이 아니거나 결과가 없으면 None
+        """
+        if not _SET_QUERY.search(query):
+            return None
+        records = self.find_by_category(query)
+        if not records:
+            return None
+
+        if any(keyword in query for keyword in DUTY_KEYWORDS):
+            columns, table = DUTY_TABLE_COLUMNS, self._duty_rows(records)
+        else:
+            columns = TABLE_COLUMNS
+            table = [
+                dict(zip(columns, (r.department, r.role, r.name or '', r.extension or r.phone or '')))
+                for r in records
+            ]
+        if not table:
+            return None
+
+        groups: Dict[str, List[str]] = {}
+        for row in table:
+            name = f" {row['이름']} 선생님" if row['이름'] else ''
+            groups.setdefault(row['구분'], []).append(f"- {row['역할']}{name}: {row[columns[-1]]}")
+        lines = [f"총 {len(table)}건입니다."]
+        for department, items in groups.items():
+            lines.append(f"[{department}] {len(items)}건")
+            lines.extend(items)
+        return [{
+            'answer': "\n".join(lines),
+            'confidence': 1.0,
+            'source': "교직원 명부",
+            'table': table,
+        }]
+
+    def _duty_rows(self, records: List[StaffRecord]) -> List[dict]:
+        """레코드의 선생님별 업무 표 행 (업무 문장이 없는 선생님은 제외)"""
+        rows = []
+        for record in records:
+            duties = []
+            for sentence in self.duties.get(record.name, []) if record.name else []:
+                for pattern in DUTY_PATTERNS:
+                    m = pattern.match(sentence)
+                    if m:
+                        if m.group('duty') not in duties:
+                            duties.append(m.group('duty'))
+                        break
+            if duties:
+                rows.append(dict(zip(DUTY_TABLE_COLUMNS, (record.department, record.role, record.name, ", ".join(duties)))))
+        return rows
+
+    def find_by_role_prefix(self, prefix: str, limit: int = 5) -> List[StaffRecord]:
+        """역할 이름이 prefix로 시작하는 레코드 (bisect로 정렬 키 구간만 확인)"""
+        prefix = _compact(prefix)
+        start = bisect.bisect_left(self._role_keys, prefix)
+        ids: List[int] = []
+        for key in self._role_keys[start:]:
+            if not key.startswith(prefix):
+                break
+            ids.extend(i for i in self.by_role[key] if i not in ids)
+            if len(ids) >= limit:
+                break
+        return [self.records[i] for i in ids[:limit]]
+
+    def _query_tokens(self, query: str) -> List[str]:
+        tokens = re.findall(r'[가-힣A-Za-z0-9()/]+', query)
+        candidates = []
+        for token in tokens:
+            candidates.append(token)
+            for suffix in _QUERY_SUFFIXES:
+                if token.endswith(suffix) and len(token) > len(suffix):
+                    candidates.append(token[:-len(suffix)])
+        return candidates
+
+    def _match_names(self, tokens: List[str]) -> List[str]:
+        names = []
+        for token in tokens:
+            # 가장 긴 접두사부터 ("이지영의" -> "이지영")
+            for length in range(min(len(token), 7), 1, -1):
+                if token[:length] in self.by_name:
+                    if token[:length] not in names:
+                        names.append(token[:length])
+                    break
+        return names
+
+    def lookup(self, query: str) -> Optional[List[dict]]:
+        """
+        이름/반/역할을 직접 찾는 질문이면 명부에서 바로 답변
+
+        역할/부서 이름만 맞는 질문은 번호/업무를 묻는 말이 함께 있을 때만 답하고,
+        그때도 서로 다른 번호가 여러 개 나오면 ("교감 내선번호") 라우터가 순위를 정하도록 None을 돌려줍니다.
+
+        Returns:
+            get_rag_answer 형식의 결과 리스트, 직접 조회 질문이 아니면 None
+        """
+        number_results = self.lookup_number(query)
+        if number_results:
+            return number_results
+        category_results = self.lookup_category(query)
+        if category_results:
+            return category_results
+
+        wants_duty = any(keyword in query for keyword in DUTY_KEYWORDS)
+        tokens = self._query_tokens(query)
+
+        records: List[StaffRecord] = []
+        m = _CLASS_QUERY.search(query)
+        if m:
+            grade, room = (m.group(1), m.group(2)) if m.group(1) else (m.group(3), m.group(4))
+            records = self.find_by_class(f"{grade}-{int(room)}")
+
+        names = [] if records else self._match_names(tokens)
+        for name in names:
+            records.extend(self.find_by_name(name))
+
+        lowered = query.lower()
+        by_label = not records and (wants_duty or any(keyword in lowered for keyword in CONTACT_KEYWORDS))
+        if by_label:
+            for token in tokens:
+                records = self.find_by_role(token)
+                if records:
+                    break
+
+        if by_label and not records:
+            # "1학년 부장 번호" -> 1학년 레코드 중 역할에 "부장"이 들어간 것
+            for token in tokens:
+                department_records = self.find_by_department(token)
+                if department_records:
+                    narrowed = [r for r in department_records
+                                if any(t != token and t in r.role for t in tokens)]
+                    records = narrowed or department_records
+                    break
+
+        if not records:
+            return None
+
+        ambiguous = len({r.extension or r.phone for r in records}) > 1
+        if by_label and ambiguous and not wants_duty:
+            return None
+        confidence = AMBIGUOUS_CONFIDENCE if ambiguous and len({r.name for r in records}) > 1 else 1.0
+
+        results = []
+        if wants_duty:
+            for name in dict.fromkeys(r.name for r in records if r.name):
+                for sentence in self.duties.get(name, []):
+                    results.append({'answer': sentence, 'confidence': confidence, 'source': "교직원 명부"})
+        if not results:
+            results = [{'answer': r.answer, 'confidence': confidence, 'source': "교직원 명부"} for r in records]
+
+        # 같은 문장 중복 제거
+        unique = {}
+        for result in results:
+            unique.setdefault(result['answer'], result)
+        return list(unique.values())
+
+
+_shared_directories: Dict[tuple, StaffDirectory] = {}
+_shared_lock = threading.Lock()
+
+
+def get_staff_directory(csv_path: str = DEFAULT_CSV_PATH) -> StaffDirectory:
+    """프로세스 공유 명부 (CSV 내용이 바뀌었을 때만 다시 구성)"""
+    corpus = get_corpus(csv_path)
+    key = (os.path.abspath(csv_path), corpus.sha256)
+    with _shared_lock:
+        if key not in _shared_directories:
+            _shared_directories[key] = StaffDirectory(zip(corpus.questions, corpus.answers))
+        return _shared_directories[key]
@@ -2,8 +2,15 @@
 RAG 시스템 성능 개선 테스트
 full_text 컬럼 추가 전후 비교
 """
+import os
+import shutil
+import tempfile
+import time
 import pandas as pd
 from rag_system_v2 import get_rag_answer, initialize_rag
+from staff_directory import StaffDirectory, extract_numbers, get_staff_directory, is_number_query, query_numbers
+from query_rewriter import get_query_rewriter
+from rag_cache import QueryResultCache, SemanticQueryCache
 
 def test_improved_rag():
     """개선된 RAG 시스템 테스트"""
@@ -48,5 +55,293 @@ def test_improved_rag():
         
         print()
 
+def test_category_queries():
+    """목록 질문 회귀 테스트 (명부 밖의 말이 섞인 질문은 목록으로 답하지 않아야 함)"""
+    print("=== 목록 질문 테스트 ===\n")
+
+    directory = get_staff_directory()
+
+    # 조건 하나만 맞고 나머지는 명부에 없는 말 -> 다른 검색 단계로 넘김
+    for query in ["교무실 와이파이 전부 알려줘", "학교 전체 행사"]:
+        result = directory.lookup_category(query)
+        print(f"'{query}' -> {'넘김' if result is None else result[0]['answer'].splitlines()[0]}")
+        assert result is None, query
+
+    # 업무를 묻는 목록 질문 -> 번호가 아닌 업무 표
+    result = directory.lookup_category("3학년 선생님 업무 전부")
+    assert result is not None
+    table = result[0]['table']
+    print(f"'3학년 선생님 업무 전부' -> {len(table)}건")
+    assert table and all(row.get('업무') for row in table)
+    assert all('번호' not in row for row in table)
+
+    # 기존 목록 질문은 그대로
+    result = directory.lookup_category("3학년 담임 선생님들")
+    assert result is not None
+    print(f"'3학년 담임 선생님들' -> {len(result[0]['table'])}건")
+    assert len(result[0]['table']) == 11
+
+    print("\n목록 질문 테스트 통과")
+
+def test_directory_lookup():
+    """명부 직접 조회 회귀 테스트 (명부 밖 질문/여러 사람이 걸리는 역할 질문은 라우터로 넘김)"""
+    print("=== 명부 직접 조회 테스트 ===\n")
+
+    directory = get_staff_directory()
+
+    # 번호/업무를 묻지 않는 역할/부서 질문, 여러 번호가 걸리는 역할 질문 -> 넘김
+    for query in ["1학년 교실 와이파이", "보건실 어디야", "교감 선생님 내선번호 알려줘"]:
+        result = directory.lookup(query)
+        print(f"'{query}' -> {'넘김' if result is None else result[0]['answer']}")
+        assert result is None, query
+
+    # 반/이름/번호를 묻는 역할 질문은 그대로
+    result = directory.lookup("1-2 선생님")
+    assert result and '8419' in result[0]['answer'] and result[0]['confidence'] == 1.0
+    result = directory.lookup("보건실 선생님 번호")
+    assert result and '8492' in result[0]['answer']
+
+    # 여러 사람이 나오면 신뢰도를 낮춤
+    result = directory.lookup("1학년 선생님 업무")
+    assert result and all(r['confidence'] < 1.0 for r in result)
+
+    print("\n명부 직접 조회 테스트 통과")
+
+def test_query_rewriter():
+    """질문 재작성 회귀 테스트 (별칭 -> 대표 표기, 과목/부서 이름과 전화번호는 그대로)"""
+    print("=== 질문 재작성 테스트 ===\n")
+
+    rewriter = get_query_rewriter()
+    cases = [
+        ("교무실 FAX", "교무실 팩스"),
+        ("행정 선생님 번호", "행정실 선생님 번호"),
+        ("6학년2반 내선번호", "6학년 2반 내선번호"),
+        ("6-2반 선생님", "6학년 2반 선생님"),
+        # 이름에 붙은 호칭은 띄어 씀
+        ("노주영쌤 번호", "노주영 선생님 번호"),
+        # 그대로 두는 말 (보건교육/과학교육 업무, 내선번호가 아닌 전화번호)
+        ("보건 선생님", "보건 선생님"),
+        ("과학 선생님", "과학 선생님"),
+        ("교무실 전화번호", "교무실 전화번호"),
+        ("6학년 2반 내선번호", "6학년 2반 내선번호"),
+    ]
+    for query, expected in cases:
+        rewritten = rewriter.rewrite(query)
+        print(f"'{query}' -> '{rewritten}'")
+        assert rewritten == expected, (query, rewritten, expected)
+
+    print("\n질문 재작성 테스트 통과")
+
+def test_result_cache():
+    """결과 캐시 테스트 (질문 정규화, TTL 만료, LRU 제거, 인덱스 버전 무효화)"""
+    print("=== 결과 캐시 테스트 ===\n")
+
+    cache = QueryResultCache(max_size=2, ttl_seconds=60)
+    cache.put("교장 선생님 번호?", {'results': [{'answer': "8401"}]})
+    # 대소문자/공백/끝 문장부호가 달라도 같은 질문
+    assert cache.get("  교장   선생님 번호 ")['results'][0]['answer'] == "8401"
+
+    # 돌려준 결과를 고쳐도 캐시 안의 결과는 그대로
+    cache.get("교장 선생님 번호")['results'].clear()
+    assert cache.get("교장 선생님 번호")['results']
+
+    # 가장 오래 안 쓰인 항목부터 제거
+    cache.put("교감 선생님 번호", {'results': []})
+    cache.get("교장 선생님 번호")
+    cache.put("행정실 번호", {'results': []})
+    assert cache.get("교감 선생님 번호") is None
+    assert cache.get("교장 선생님 번호") is not None
+
+    # 인덱스 버전이 바뀌면 모두 무효화 (같은 버전이면 유지)
+    cache.set_index_version("v1")
+    cache.put("교장 선생님 번호", {'results': []})
+    cache.set_index_version("v1")
+    assert cache.get("교장 선생님 번호") is not None
+    cache.set_index_version("v2")
+    assert cache.get("교장 선생님 번호") is None
+
+    # 유효 시간이 지나면 만료
+    cache = QueryResultCache(max_size=2, ttl_seconds=0.05)
+    cache.put("교장 선생님 번호", {'results': []})
+    time.sleep(0.1)
+    assert cache.get("교장 선생님 번호") is None
+    print(cache.stats())
+
+    print("\n결과 캐시 테스트 통과")
+
+def test_semantic_cache():
+    """의미 캐시 테스트 (유사도 임계값, 숫자가 다른 질문 구분, 빈 자리가 없을 때 교체)"""
+    print("=== 의미 캐시 테스트 ===\n")
+
+    cache = SemanticQueryCache(max_size=2, threshold=0.97)
+    cache.add("1-1 선생님 번호", [1.0, 0.0, 0.0], {'results': [{'answer': "8418"}]})
+
+    # 거의 같은 벡터 + 같은 숫자 -> 저장된 결과
+    result = cache.lookup("1-1 선생님 번호 알려줘", [0.99, 0.05, 0.0])
+    assert result is not None and result['results'][0]['answer'] == "8418"
+    assert result['matched_query'] == "1-1 선생님 번호"
+
+    # 벡터가 같아도 숫자(반/내선번호)가 다르면 다른 질문
+    assert cache.lookup("1-2 선생님 번호", [1.0, 0.0, 0.0]) is None
+    # 유사도가 임계값 미만이면 다른 질문
+    assert cache.lookup("1-1 선생님 번호", [0.7, 0.7, 0.0]) is None
+
+    # 빈 자리가 없으면 가장 오래 안 쓰인 항목 교체
+    cache.add("교장 선생님 번호", [0.0, 1.0, 0.0], {'results': []})
+    time.sleep(0.01)
+    cache.lookup("1-1 선생님 번호", [1.0, 0.0, 0.0])
+    cache.add("행정실 번호", [0.0, 0.0, 1.0], {'results': []})
+    assert cache.lookup("교장 선생님 번호", [0.0, 1.0, 0.0]) is None
+    assert cache.lookup("1-1 선생님 번호", [1.0, 0.0, 0.0]) is not None
+    assert cache.lookup("행정실 번호", [0.0, 0.0, 1.0]) is not None
+
+    # 인덱스 버전이 바뀌면 모두 무효화
+    cache.set_index_version("v2")
+    assert cache.lookup("행정실 번호", [0.0, 0.0, 1.0]) is None
+    print(cache.stats())
+
+    print("\n의미 캐시 테스트 통과")
+
+def test_incremental_index():
+    """FAISS 증분 인덱서 테스트 (바뀐 행만 임베딩, 변경/삭제 반영, 변경 없으면 캐시 그대로)"""
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import Embeddings
+    from rag_store import sync_faiss_index
+
+    print("=== 증분 인덱스 테스트 ===\n")
+
+    class CountingEmbeddings(Embeddings):
+        """임베딩한 텍스트를 기록하는 결정적 임베딩 (글자 코드 히스토그램)"""
+
+        def __init__(self):
+            self.embedded = []
+
+        def _embed(self, text):
+            vector = [0.0] * 16
+            for ch in text:
+                vector[ord(ch) % 16] += 1.0
+            return vector
+
+        def embed_documents(self, texts):
+            self.embedded.extend(texts)
+            return [self._embed(t) for t in texts]
+
+        def embed_query(self, text):
+            return self._embed(text)
+
+    def docs(rows):
+        return {doc_id: Document(page_content=text, metadata={'doc_id': doc_id}) for doc_id, text in rows.items()}
+
+    cache_dir = tempfile.mkdtemp(prefix="rag_index_test_")
+    try:
+        embeddings = CountingEmbeddings()
+        rows = {'a': "교장 8401", 'b': "교감 8402", 'c': "행정실 8470"}
+
+        _, stats = sync_faiss_index(docs(rows), embeddings, "test", cache_dir=cache_dir)
+        assert (stats['added'], stats['from_cache']) == (3, False)
+        assert len(embeddings.embedded) == 3
+
+        # 변경 없음 -> 임베딩 호출 없이 저장본 사용
+        embeddings.embedded.clear()
+        _, stats = sync_faiss_index(docs(rows), embeddings, "test", cache_dir=cache_dir)
+        assert (stats['added'], stats['updated'], stats['removed'], stats['from_cache']) == (0, 0, 0, True)
+        assert embeddings.embedded == []
+
+        # 변경 1, 삭제 1, 추가 1 -> 바뀐 2행만 임베딩
+        rows = {'a': "교장 8401", 'b': "교감 8302", 'd': "보건실 8492"}
+        vectorstore, stats = sync_faiss_index(docs(rows), embeddings, "test", cache_dir=cache_dir)
+        assert (stats['added'], stats['updated'], stats['removed']) == (1, 1, 1)
+        assert sorted(embeddings.embedded) == sorted(["교감 8302", "보건실 8492"])
+        stored = {vectorstore.docstore.search(i).page_content for i in vectorstore.index_to_docstore_id.values()}
+        assert stored == set(rows.values())
+
+        # 갱신된 저장본을 다시 불러오면 변경 없음
+        embeddings.embedded.clear()
+        _, stats = sync_faiss_index(docs(rows), embeddings, "test", cache_dir=cache_dir)
+        assert stats['from_cache'] and embeddings.embedded == []
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    print("증분 인덱스 테스트 통과")
+
+def test_multiquery_cache():
+    """MultiQuery 캐시 테스트 (변형/검색 결과 재사용, 인덱스 버전이 다르면 변형만 재사용, 최대 개수)"""
+    from langchain_core.documents import Document
+    from multiquery_cache import MultiQueryCache
+
+    print("=== MultiQuery 캐시 테스트 ===\n")
+
+    cache_dir = tempfile.mkdtemp(prefix="rag_mq_test_")
+    try:
+        cache = MultiQueryCache("prompt", db_path=os.path.join(cache_dir, "mq.sqlite3"), max_entries=2)
+        cache.set_index_version("v1")
+        docs = [[Document(page_content="교장 8401", metadata={'doc_id': 'a'})]]
+        cache.put("교장 선생님 번호", ["교장 번호", "교장 연락처"], docs)
+
+        entry = cache.get("교장 선생님 번호?")
+        assert entry['variants'] == ["교장 번호", "교장 연락처"]
+        assert entry['results'][0][0].page_content == "교장 8401"
+        assert entry['results'][0][0].metadata['doc_id'] == 'a'
+
+        # 인덱스가 바뀌면 검색 결과는 버리고 변형 질문만 재사용
+        cache.set_index_version("v2")
+        entry = cache.get("교장 선생님 번호")
+        assert entry['variants'] and entry['results'] is None
+
+        # 프롬프트가 다르면 다른 항목
+        other = MultiQueryCache("other prompt", db_path=os.path.join(cache_dir, "mq.sqlite3"))
+        assert other.get("교장 선생님 번호") is None
+
+        # 최대 개수를 넘으면 오래 안 쓰인 항목부터 삭제
+        time.sleep(0.01)
+        cache.put("교감 선생님 번호", ["교감 번호"])
+        time.sleep(0.01)
+        cache.put("행정실 번호", ["행정실 연락처"])
+        assert cache.get("교장 선생님 번호") is None
+        assert cache.get("행정실 번호") is not None
+        print(cache.stats())
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    print("\nMultiQuery 캐시 테스트 통과")
+
+def test_number_lookup():
+    """번호 역인덱스 테스트 (하이픈/공백 무시, 아이디/비밀번호 속 숫자 제외, 숫자가 대부분인 질문만)"""
+    print("=== 번호 역조회 테스트 ===\n")
+
+    # 번호 추출: 전화번호는 앞자리를 뺀 번호로도, 영문/점에 붙은 숫자는 번호가 아님
+    assert extract_numbers("교장의 내선번호는 8401 입니다.") == ["8401"]
+    assert extract_numbers("업체 번호는 010-8649-4539 입니다.") == ["01086494539", "86494539"]
+    assert extract_numbers("와이파이 아이디는 jjhj8400, 서버는 10.0.84.12 입니다.") == []
+
+    assert query_numbers("010 8649 4539 누구야?") == ["01086494539", "8649", "4539"]
+    assert query_numbers("jjhj8400") == []
+    assert is_number_query("8401 누구야?") and not is_number_query("교장 선생님 내선번호 8401 맞아?")
+
+    directory = StaffDirectory([
+        ("교장 선생님 내선번호 알려줘", "교장 김화자 선생님의 내선번호는 8401 입니다."),
+        ("교장 내선번호는?", "교장의 내선번호는 8401 입니다."),
+        ("학교컴퓨터보수업체 번호", "학교컴퓨터보수업체 번호는 010-8649-4539 입니다."),
+        ("와이파이 알려줘", "와이파이 아이디는 jjhj8400 입니다."),
+    ])
+    assert len(directory.find_by_number("8401")) == 2
+    assert directory.find_by_number("010-8649-4539") == directory.find_by_number("8649 4539")
+    assert directory.find_by_number("8400") == []
+    assert directory.lookup_number("교장 선생님 번호") is None
+
+    result = get_staff_directory().lookup("8401")
+    print(f"'8401' -> {[r['answer'] for r in result]}")
+    assert result and all('8401' in r['answer'] and r['source'] == "번호 조회" for r in result)
+
+    print("\n번호 역조회 테스트 통과")
+
 if __name__ == "__main__":
+    test_number_lookup()
+    test_incremental_index()
+    test_multiquery_cache()
+    test_semantic_cache()
+    test_result_cache()
+    test_query_rewriter()
+    test_directory_lookup()
+    test_category_queries()
     test_improved_rag()
\ No newline at end of file
@@ -3,13 +3,32 @@
 """
 import streamlit as st
 import streamlit.components.v1 as components
-from langchain_openai import ChatOpenAI
+from llm_cassette import create_chat_model
 from langchain_core.output_parsers import StrOutputParser
 import re
 
 # --- 프로젝트 전체에서 사용할 AI 모델 정의 ---
 PRIMARY_MODEL = "gpt-4o-mini"
 
+# --- 정보 검색(RAG) 인덱스 설정 (모델/템플릿이 바뀌면 벡터스토어 캐시가 자동으로 다시 만들어짐) ---
+EMBEDDING_MODEL = "text-embedding-ada-002"
+RAG_CSV_PATH = "data/school_info.csv"
+RAG_DOC_TEMPLATE = "질문: {question} 답변: {answer}"
+
+# --- 정보 검색 점수 기준 (EMBEDDING_MODEL의 코사인 유사도 분포 기준, 모델을 바꾸면 rag_benchmark로 다시 맞출 것) ---
+RAG_DENSE_ACCEPT_SIMILARITY = 0.9   # 이 이상이면 MultiQuery/Rerank 없이 벡터 검색 결과로 바로 답함
+RAG_NOT_FOUND_SIMILARITY = 0.75     # 최고 유사도가 이 미만이면 (키워드 점수도 낮을 때) LLM 없이 "찾을 수 없음"
+RAG_MIN_RERANK_SCORE = 0.05         # 리랭크 관련도가 이 미만인 문서는 결과에서 제외
+
+# --- 질문 확장 (RAG_MULTIQUERY: on / off / auto) ---
+# 인덱스에 행별 변형 질문(rag_expansion, RAG_DOC_EXPANSION)이 들어가므로 기본(auto)은 질문마다 LLM으로
+# 검색 질문을 만드는 MultiQuery를 쓰지 않고, 문서 쪽 확장을 끈 경우에만 사용
+RAG_MULTIQUERY_ENV = "RAG_MULTIQUERY"
+
+# init_rag_system이 실제로 구성한 검색 설정 (요청한 설정이 실패해 대체된 경우 확인용, rag_benchmark가 리포트에 기록)
+#   {'reranker': 실제 리랭커, 'first_stage': 1차 검색기 이름, 'lexical_engine': keyword 단계 엔진 이름}
+rag_pipeline_info = {}
+
 # --- 만능 메뉴 정리 함수 (복원) ---
 def format_meal_menu(menu_string: str) -> str:
     """
@@ -107,7 +126,7 @@ def run_chain_and_display(session_key, prompt_key, inputs, container, prompts):
         # 이미 생성된 결과가 있는지 확인
         if session_key not in st.session_state.generated_texts:
             # api_key 인자가 없어도 자동으로 환경변수에서 찾습니다.
-            llm = ChatOpenAI(model=PRIMARY_MODEL, temperature=0.5)
+            llm = create_chat_model(model=PRIMARY_MODEL, temperature=0.5)
             prompt = prompts[prompt_key]
             chain = prompt | llm | StrOutputParser()
 
@@ -250,15 +269,24 @@ def init_rag_system():
     """RAG 시스템 초기화 - Cohere Rerank를 사용한 고급 검색 정확도 시스템"""
     try:
         import os
-        import pandas as pd
+        import time
         from langchain.docstore.document import Document
-        from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-        from langchain_community.vectorstores import FAISS
-        from langchain.retrievers.multi_query import MultiQueryRetriever
+        from llm_cassette import create_chat_model
         from langchain.retrievers import ContextualCompressionRetriever
-        from langchain_cohere import CohereRerank
-        from langchain.chains import RetrievalQA
+        from langchain.prompts import PromptTemplate
         from dotenv import load_dotenv
+        from rag_store import compute_index_key, sync_faiss_index
+        from rag_corpus import get_corpus
+        from embedding_cache import get_shared_embeddings
+        from rag_cache import rag_result_cache, rag_semantic_cache
+        from rag_router import TieredRetrievalRouter, keyword_threshold_for
+        from rag_retrievers import ParallelMultiQueryRetriever, ScoredVectorStoreRetriever, build_reranker, document_score
+        from rag_expansion import FETCH_FACTOR, expansion_documents, expansion_mode
+        from multiquery_cache import get_multiquery_cache, prompt_fingerprint
+        from query_rewriter import rewrite_query
+        from langchain.retrievers.multi_query import DEFAULT_QUERY_PROMPT
+        from rag_engines import get_lexical_retriever, get_retriever
+        from staff_directory import get_staff_directory
         
         load_dotenv()
         openai_api_key = os.getenv("OPENAI_API_KEY")
@@ -268,123 +296,259 @@ def init_rag_system():
             st.error("OPENAI_API_KEY가 .env 파일에 설정되지 않았습니다.")
             return "failed", None, None
         
-        if not cohere_api_key:
-            st.warning("COHERE_API_KEY가 설정되지 않았습니다. Cohere Rerank 없이 기본 MultiQuery RAG로 실행됩니다.")
-            # Cohere 없이도 작동하도록 fallback 모드
+        # 리랭커 선택 (지정하지 않으면 Cohere 키가 있을 때만 Cohere 사용)
+        reranker_kind = os.getenv("RAG_RERANKER", "cohere" if cohere_api_key else "none").lower()
+        if reranker_kind == "cohere" and not cohere_api_key:
+            st.warning("COHERE_API_KEY가 설정되지 않았습니다. 로컬 리랭커(RAG_RERANKER=local)로 대체합니다.")
+            reranker_kind = "local"
+        elif reranker_kind == "none" and not cohere_api_key:
+            st.warning("COHERE_API_KEY가 설정되지 않았습니다. Rerank 없이 기본 MultiQuery RAG로 실행됩니다. (로컬 리랭커: RAG_RERANKER=local)")
 
-        # 1. 데이터 로드 및 전처리 (오류 처리 기능이 강화된 버전)
+        # 1. 데이터 로드 (다른 RAG 엔진과 같은 프로세스 공유 코퍼스 사용)
         try:
-            df = pd.read_csv(
-                "data/school_info.csv", 
-                on_bad_lines='warn', 
-                quotechar='"'
-            )
+            corpus = get_corpus(RAG_CSV_PATH)
         except Exception as e:
             st.error(f"CSV 파일을 읽는 중 심각한 오류 발생: {e}")
             return "failed", None, None
             
-        df.dropna(subset=['question', 'answer'], inplace=True)
-        documents = [Document(page_content=f"질문: {row['question']} 답변: {row['answer']}") for _, row in df.iterrows()]
+        documents = {
+            doc_id: Document(page_content=RAG_DOC_TEMPLATE.format(question=question, answer=answer))
+            for doc_id, question, answer in corpus.rows()
+        }
+        # 행마다 미리 만든 변형 질문(별칭, 반 표기, 담당자 이름)을 같은 행을 가리키는 추가 벡터로 색인
+        try:
+            doc_expansion = expansion_mode()
+            documents.update(expansion_documents(corpus, RAG_DOC_TEMPLATE, mode=doc_expansion))
+        except Exception as e:
+            print(f"[ERROR] 문서 확장 실패 (원래 행만 색인합니다): {e}")
+            doc_expansion = "off"
 
-        # 2. 임베딩 및 Vector Store 생성
-        embeddings = OpenAIEmbeddings(api_key=openai_api_key)
-        vectorstore = FAISS.from_documents(documents, embeddings)
+        # 2. 임베딩 및 Vector Store 생성 (디스크 캐시 재사용, 바뀐 행만 다시 임베딩)
+        embeddings = get_shared_embeddings(EMBEDDING_MODEL, api_key=openai_api_key)
+        index_key = compute_index_key("info_search", EMBEDDING_MODEL, RAG_DOC_TEMPLATE)
+        vectorstore, index_stats = sync_faiss_index(documents, embeddings, index_key)
 
-        # 3. 기본 Retriever 설정 (더 많은 문서를 가져오도록 k값 증가)
-        base_retriever = vectorstore.as_retriever(search_kwargs={'k': 10})
+        # 인덱스가 바뀌었으면 이전 검색 결과 캐시는 무효화
+        rag_result_cache.set_index_version(index_stats['version'])
+        rag_semantic_cache.set_index_version(index_stats['version'])
 
-        # 4. MultiQueryRetriever로 1차 검색기 강화
-        llm = ChatOpenAI(temperature=0, api_key=openai_api_key, model=PRIMARY_MODEL)
-        multiquery_retriever = MultiQueryRetriever.from_llm(
-            retriever=base_retriever, llm=llm
-        )
-        
-        # 5. [핵심] Cohere Rerank를 사용한 최종 검색기 구성
-        if cohere_api_key:
-            # Cohere Rerank 압축기 설정
-            compressor = CohereRerank(
-                cohere_api_key=cohere_api_key, 
-                top_n=3,  # 최종 3개 문서만 선택
-                model="rerank-multilingual-v3.0"  # 한국어 지원 모델
+        # 3. 기본 Retriever 설정 (더 많은 문서를 가져오도록 k값 증가, 코사인 유사도를 메타데이터에 담음)
+        #    확장 변형까지 가져온 뒤 행 단위로 합쳐 10개 행을 돌려줌
+        base_retriever = ScoredVectorStoreRetriever(vectorstore=vectorstore, k=10, fetch_k=10 * FETCH_FACTOR)
+
+        # 4. 1차 검색기: 문서 쪽 확장이 있으면 벡터 검색만, 없으면 MultiQuery (생성된 질문들은 동시에 검색 후 RRF로 합침)
+        llm = create_chat_model(temperature=0, api_key=openai_api_key, model=PRIMARY_MODEL)
+        multiquery_setting = os.getenv(RAG_MULTIQUERY_ENV, "auto").lower()
+        use_multiquery = multiquery_setting == "on" or (multiquery_setting == "auto" and doc_expansion == "off")
+        if use_multiquery:
+            # 생성된 질문과 질문별 검색 결과는 디스크 캐시에 저장 (같은 질문은 처음 한 번만 LLM 호출)
+            try:
+                variant_cache = get_multiquery_cache(prompt_fingerprint(DEFAULT_QUERY_PROMPT, llm))
+                variant_cache.set_index_version(index_stats['version'])
+            except Exception as e:
+                print(f"[ERROR] MultiQuery 캐시 초기화 실패 (캐시 없이 진행합니다): {e}")
+                variant_cache = None
+            first_stage_retriever = ParallelMultiQueryRetriever.from_llm(
+                retriever=base_retriever, llm=llm, variant_cache=variant_cache
             )
-            
+        else:
+            first_stage_retriever = base_retriever
+        first_stage_name = "MultiQuery" if use_multiquery else f"문서 확장({doc_expansion})"
+        
+        # 5. [핵심] Rerank를 사용한 최종 검색기 구성 (RAG_RERANKER: cohere / local / none)
+        try:
+            compressor = build_reranker(reranker_kind, top_n=3, cohere_api_key=cohere_api_key)  # 최종 3개 문서만 선택
+        except Exception as e:
+            print(f"[ERROR] 리랭커({reranker_kind}) 초기화 실패, Rerank 없이 진행합니다: {e}")
+            compressor = None
+
+        if compressor is not None:
             # ContextualCompressionRetriever로 최종 검색기 완성
-            # 1차 검색기(MultiQuery)가 문서를 찾아오면, 압축기(Cohere Rerank)가 순위를 재정렬
+            # 1차 검색기가 문서를 찾아오면, 압축기(Rerank)가 순위를 재정렬
             final_retriever = ContextualCompressionRetriever(
                 base_compressor=compressor, 
-                base_retriever=multiquery_retriever
+                base_retriever=first_stage_retriever
             )
             
-            print("[DEBUG] Cohere Rerank가 활성화된 고급 RAG 시스템이 초기화되었습니다.")
+            print(f"[DEBUG] {first_stage_name} + {reranker_kind} Rerank가 활성화된 고급 RAG 시스템이 초기화되었습니다.")
         else:
-            # Cohere API 키가 없으면 기본 MultiQuery RAG 사용
-            final_retriever = multiquery_retriever
-            print("[DEBUG] 기본 MultiQuery RAG 시스템이 초기화되었습니다.")
+            # 리랭커가 없으면 1차 검색 결과를 그대로 사용
+            final_retriever = first_stage_retriever
+            print(f"[DEBUG] {first_stage_name} 기본 RAG 시스템이 초기화되었습니다.")
         
-        # 6. QA 체인 생성 (최종 검색기 사용)
-        qa_chain = RetrievalQA.from_chain_type(
-            llm=llm, 
-            retriever=final_retriever, 
-            return_source_documents=True
+        # 7. 검색 결과 정리 (신뢰도는 리랭크 관련도, 리랭커가 없으면 1차 검색 코사인 유사도)
+        def documents_to_results(source_documents):
+            results = []
+            for doc in source_documents:
+                # '답변: ' 이후의 내용만 추출
+                content = doc.page_content
+                if '답변: ' in content:
+                    answer_part = content.split('답변: ', 1)[1]
+                else:
+                    answer_part = content
+
+                score = document_score(doc)
+                # 관련도가 너무 낮은 문서는 답으로 내놓지 않음
+                if 'relevance_score' in doc.metadata:
+                    if score < RAG_MIN_RERANK_SCORE:
+                        continue
+                elif score is not None and score < RAG_NOT_FOUND_SIMILARITY:
+                    continue
+
+                results.append({
+                    'answer': answer_part, 
+                    'confidence': score if score is not None else 0.5,
+                    'source': f"문서 {len(results) + 1}"
+                })
+            return results
+
+        not_found_result = {
+            'answer': "죄송합니다. 관련된 정보를 찾을 수 없습니다.", 
+            'confidence': 0.1,
+            'source': "시스템"
+        }
+
+        def error_result(e):
+            print(f"[ERROR] RAG 답변 생성 중 오류: {e}")
+            return {
+                'results': [{
+                    'answer': f"답변 생성 중 오류가 발생했습니다: {str(e)}", 
+                    'confidence': 0.0,
+                    'source': "오류"
+                }]
+            }
+
+        # 7-1. LLM 요약 답변 (검색만으로 답이 정해지므로 문서가 없거나 사용자가 요약을 요청할 때만 호출)
+        summary_prompt = PromptTemplate.from_template(
+            "다음 학교 정보를 참고하여 질문에 짧고 정확하게 답하세요. "
+            "정보에 없는 내용은 모른다고 답하세요.\n\n{context}\n\n질문: {question}\n답변:"
         )
+        summary_chain = summary_prompt | llm | StrOutputParser()
 
-        # 7. 답변 생성 함수 정의 (Cohere Rerank 결과 반영)
-        def get_rag_answer(question):
+        def summary_inputs(question, results):
+            context = "\n\n".join(r['answer'] for r in results if r.get('source') not in ("시스템", "오류"))
+            return {'context': context, 'question': question}
+
+        def run_rag_chain(question):
+            """검색 전용 전체 파이프라인 (1차 검색 + Rerank, 답변 생성 LLM 호출 없음)"""
             try:
-                response = qa_chain.invoke({"query": question})
-                results = []
-                
-                # 소스 문서가 있는지 확인하고 처리
-                if response.get('source_documents'):
-                    for i, doc in enumerate(response['source_documents']):
-                        # '답변: ' 이후의 내용만 추출
-                        content = doc.page_content
-                        if '답변: ' in content:
-                            answer_part = content.split('답변: ', 1)[1]
-                        else:
-                            answer_part = content
-                        
-                        # Cohere Rerank가 적용된 경우 순위에 따른 신뢰도 차등 적용
-                        if cohere_api_key:
-                            confidence = max(0.95 - (i * 0.1), 0.5)  # 첫 번째: 0.95, 두 번째: 0.85, ...
-                        else:
-                            confidence = 0.85  # 기본 신뢰도
-                            
-                        results.append({
-                            'answer': answer_part, 
-                            'confidence': confidence,
-                            'source': f"문서 {i+1}"
-                        })
-                
-                # 만약 소스 문서가 없다면, 최종 결과(result)라도 사용
-                if not results and response.get('result'):
-                     results.append({
-                         'answer': response.get('result'), 
-                         'confidence': 0.3,
-                         'source': "LLM 직접 생성"
-                     })
-                
-                # 그래도 결과가 없다면 최종 실패 메시지
-                if not results:
-                     results.append({
-                         'answer': "죄송합니다. 관련된 정보를 찾을 수 없습니다.", 
-                         'confidence': 0.1,
-                         'source': "시스템"
-                     })
+                source_documents = final_retriever.invoke(question)
+            except Exception as e:
+                return error_result(e)
 
+            results = documents_to_results(source_documents)
+            if results:
                 return {'results': results}
-                
+            if source_documents:
+                # 문서는 있었지만 모두 관련도 기준 미만
+                return {'results': [dict(not_found_result)]}
+
+            # 소스 문서가 없을 때만 LLM이 직접 답변 생성
+            try:
+                generated = summary_chain.invoke({'context': "", 'question': question}).strip()
             except Exception as e:
-                print(f"[ERROR] RAG 답변 생성 중 오류: {e}")
+                return error_result(e)
+            if generated:
+                return {'results': [{'answer': generated, 'confidence': 0.3, 'source': "LLM 직접 생성"}]}
+            return {'results': [dict(not_found_result)]}
+
+        # 8. 단계별 검색 라우터 (전체 파이프라인은 싼 단계가 확신하지 못할 때만 실행)
+        #    keyword 단계 엔진은 RAG_ENGINE이 어휘 엔진(lite/tfidf/v2)일 때만 따름 (기본 lite, 만들지 못하면 lite로 대체)
+        try:
+            lexical_retriever = get_lexical_retriever(RAG_CSV_PATH)
+        except Exception as e:
+            print(f"[ERROR] 검색 엔진 생성 실패 (lite로 대체): {e}")
+            lexical_retriever = get_retriever("lite", RAG_CSV_PATH)
+        rag_pipeline_info.update({
+            'reranker': reranker_kind if compressor is not None else "none",
+            'first_stage': first_stage_name,
+            'lexical_engine': lexical_retriever.effective_method,
+        })
+        router = TieredRetrievalRouter(
+            lexical_engine=lexical_retriever,
+            vectorstore=vectorstore,
+            keyword_threshold=keyword_threshold_for(lexical_retriever.effective_method),
+            full_pipeline=run_rag_chain,
+            dense_threshold=RAG_DENSE_ACCEPT_SIMILARITY,
+            not_found_threshold=RAG_NOT_FOUND_SIMILARITY,
+            fetch_k=3 * FETCH_FACTOR,
+            query_rewriter=lambda question: rewrite_query(question, RAG_CSV_PATH)
+        )
+        # 이름/반/역할 직접 조회용 교직원 명부
+        staff_directory = get_staff_directory(RAG_CSV_PATH)
+
+        # 9. 결과 캐시를 앞에 둔 검색 함수 (같은/비슷한 질문은 체인을 다시 돌리지 않음)
+        def retrieve(question):
+            cached = rag_result_cache.get(question)
+            if cached is not None:
+                cached['cache'] = 'hit'
+                return cached
+
+            # CSV 질문과 똑같은 질문은 그 행으로 바로 답함 (명부 조회보다 먼저)
+            exact = router.match_exact(question)
+            if exact is not None:
+                exact['cache'] = 'miss'
+                return exact
+
+            # "1-2 선생님", "노주영 선생님 업무", "8401" 같은 직접 조회와 "3학년 담임 선생님들" 같은 목록 질문은
+            # 임베딩/LLM 없이 명부에서 바로 답함 (목록은 top_n 제한 없이 전체를 표로)
+            start = time.perf_counter()
+            directory_results = staff_directory.lookup(question)
+            if directory_results:
                 return {
-                    'results': [{
-                        'answer': f"답변 생성 중 오류가 발생했습니다: {str(e)}", 
-                        'confidence': 0.0,
-                        'source': "오류"
-                    }]
+                    'results': directory_results,
+                    'tier': 'directory',
+                    'timings': {'directory': (time.perf_counter() - start) * 1000},
+                    'cache': 'miss'
                 }
 
-        # 8. UI에서 호출할 초기화 함수
+            # 질문 임베딩은 공유 임베딩 캐시를 거치므로 이후 벡터 검색에서 다시 계산되지 않음
+            try:
+                query_vector = embeddings.embed_query(question)
+            except Exception as e:
+                print(f"[ERROR] 질문 임베딩 실패 (의미 캐시 건너뜀): {e}")
+                query_vector = None
+
+            if query_vector is not None:
+                similar = rag_semantic_cache.lookup(question, query_vector)
+                if similar is not None:
+                    similar['cache'] = 'semantic_hit'
+                    return similar
+
+            # 싼 검색(완전 일치 -> 키워드 -> 벡터)으로 확실하면 전체 파이프라인을 건너뜀
+            result = router.answer(question)
+            # 오류 결과는 캐시하지 않음
+            if result['results'] and result['results'][0].get('source') != "오류":
+                rag_result_cache.put(question, result)
+                if query_vector is not None:
+                    rag_semantic_cache.add(question, query_vector, result)
+            result['cache'] = 'miss'
+            return result
+
+        # 검색 결과를 바로 돌려주고, summarize=True일 때만 LLM 요약 답변을 붙임
+        #   stream=True : 결과 딕셔너리의 'stream'에 요약 토큰 제너레이터 (읽기 시작할 때 LLM 호출)
+        #   stream=False: 'summary'에 요약 문자열
+        def get_rag_answer(question, stream=False, summarize=False):
+            result = retrieve(question)
+            result['stream'] = None
+            has_answer = result['results'] and result['results'][0].get('source') not in ("시스템", "오류", "LLM 직접 생성")
+            if not (summarize and has_answer):
+                return result
+
+            inputs = summary_inputs(question, result['results'])
+            if stream:
+                result['stream'] = summary_chain.stream(inputs)
+            else:
+                start = time.perf_counter()
+                try:
+                    result['summary'] = summary_chain.invoke(inputs)
+                except Exception as e:
+                    print(f"[ERROR] 요약 답변 생성 실패: {e}")
+                    result['summary'] = None
+                result.setdefault('timings', {})['summary'] = (time.perf_counter() - start) * 1000
+            return result
+
+        # 10. UI에서 호출할 초기화 함수
         def initialize_rag():
             pass # @st.cache_resource 덕분에 이미 로드됨
 